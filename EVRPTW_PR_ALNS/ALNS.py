@@ -1,24 +1,60 @@
-from EVRPTW_PR_ALNS.file_reader import get_parameters
-from EVRPTW_PR_ALNS.helper_function import Helper
+from EVRPTW_PR_ALNS.file_reader import MATRIX_VIEWS, get_parameters
+from EVRPTW_PR_ALNS.context import InstanceContext
+from EVRPTW_PR_ALNS.route_cache import RouteCache
+from EVRPTW_PR_ALNS.solution import Solution
+from EVRPTW_PR_ALNS.island import ElitePool, Island
+from EVRPTW_PR_ALNS.telemetry import OperatorProfiler, RunResult
 from EVRPTW_PR_ALNS.Initial import Heuristic
 from EVRPTW_PR_ALNS._algorithms.CR import CustomerRemoval
 from EVRPTW_PR_ALNS._algorithms.CI import CustomerInsertion
 from EVRPTW_PR_ALNS._algorithms.SR import StationRemoval
 from EVRPTW_PR_ALNS._algorithms.SI import StationInsertion
-from random import random, choices
+from random import random, choices, seed as random_seed
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from multiprocessing import Manager
 from math import log, exp
 from time import time
+import os
+import numpy as np
+
+# the ALNS instance of a worker process, built once by the pool initializer
+_worker_alns = None
+# entries of the parameters owned by one process, every worker builds its own
+PROCESS_LOCAL = ("route_cache", "repair_cache", "solve_counts", "gurobi_env")
 
 
 class ALNS:
-    def __init__(self, file: str):
-        self.parameters = get_parameters(file)
-        self.helper = Helper(self.parameters)
-        self.cr = CustomerRemoval(self.parameters)
-        self.ci = CustomerInsertion(self.parameters)
-        self.sr = StationRemoval(self.parameters)
-        self.si = StationInsertion(self.parameters)
-        self.initial = Heuristic(self.parameters)
+    def __init__(
+            self, file: str, backend: str = "label", cache_size: int = 200000, parameters=None, granular=None
+    ):
+        """
+        Take the instance file to initiate the solver
+        :param file: txt instance file
+        :param backend: feasibility backend, see MIPCheck.backends
+        :param cache_size: maximum number of entries of the shared route cache
+        :param parameters: already parsed parameters of the file, copied instead of reading the file again
+        :param granular: number of nearest neighbours the insertion operators evaluate a client next to, True for a
+        number adapted to the instance size, None to evaluate every position
+        """
+        self.file = file
+        self.backend = backend
+        self.cache_size = cache_size
+        self.granular = granular
+        self.parameters = get_parameters(file) if parameters is None else dict(parameters)
+        # feasibility backend and route cache shared by every checker, see MIPCheck.backends
+        self.parameters["backend"] = backend
+        self.parameters["route_cache"] = RouteCache(cache_size)
+        self.parameters["repair_cache"] = RouteCache(max(1, cache_size // 4))
+        self.parameters["granular"] = granular
+        # one context, checker and helper for every operator
+        self.context = InstanceContext(self.parameters)
+        self.helper = self.context.helper
+        self.cr = CustomerRemoval(self.context)
+        self.ci = CustomerInsertion(self.context)
+        self.sr = StationRemoval(self.context)
+        self.si = StationInsertion(self.context)
+        self.initial = Heuristic(self.context)
 
         # self, sigma1 = 25, sigma2 = 20, sigma3 = 21, pho = 0.25, epsilon = 0.9994, mu = 0.4, N = 25000, Nc = 200, \
         #     Ns = 5500, NRR = 2000, NSR = 60, nRR = 1250
@@ -29,27 +65,46 @@ class ALNS:
 
     def run(
             self, sigma1=25, sigma2=20, sigma3=21, rho=0.25, epsilon=0.9994, mu=0.4, N=2500, Nc=200,
-            Ns=400, NRR=200, NSR=100, nRR=50
+            Ns=400, NRR=200, NSR=100, nRR=50, seed=None, verbose=True, island=None, report_file=None,
+            time_limit=None, max_no_improve=None, target=None
     ):
+        # termination: after N iterations, or earlier once time_limit seconds passed since the call (the initial
+        # solution included), once max_no_improve iterations did not improve the best solution, or once the best
+        # solution reaches target (vehicles, distance)
+        # the criterion which fired is given as stop_reason of the result
+        # seed both random streams for a reproducible run, the operators use the module level generators
+        if seed is not None:
+            random_seed(seed)
+            np.random.seed(seed)
+
+        # create the list and dict of the functions
+        normal_cr_function_dict = self.normal_cr_function_dict()
+        route_cr_function_dict = self.route_cr_function_dict()
+        ci_function_dict = self.ci_function_dict()
+        sr_function_dict = self.sr_function_dict()
+        si_function_dict = self.si_function_dict()
+
+        # the time limit also covers the construction of the initial solution
+        deadline = time() + time_limit if time_limit is not None else None
+
         # initiate _algorithms, initial solution and helper functions
-        helper = Helper(self.parameters)
+        helper = self.helper
+        profiler = OperatorProfiler(helper.checker.solves, {
+            "normal_cr": normal_cr_function_dict, "route_cr": route_cr_function_dict, "ci": ci_function_dict,
+            "sr": sr_function_dict, "si": si_function_dict
+        })
+        # the insertion checks of the evaluators do not go through the route cache, they are counted by the checker
+        insertion_checks = helper.checker.labels.insertion_checks
 
         # get the initial solution using the heuristic
-        initial_solution = self.initial.initial_solution()
+        initial_solution = Solution(self.initial.initial_solution(), helper)
 
         # get the initial temperature
-        T = 0.01 * mu * self.helper.total_distance_list(initial_solution) / log(2)
+        T = 0.01 * mu * initial_solution.distance / log(2)
 
         # create the performance metrics
         distance_iteration = []
 
-        # create the list and dict of the functions
-        normal_cr_function_dict = self.normal_cr_function_dict()
-        route_cr_function_dict = self.route_cr_function_dict()
-        ci_function_dict = self.ci_function_dict()
-        sr_function_dict = self.sr_function_dict()
-        si_function_dict = self.si_function_dict()
-
         normal_cr_list = [key for key, value in normal_cr_function_dict.items()]
         route_cr_list = [key for key, value in route_cr_function_dict.items()]
         ci_list = [key for key, value in ci_function_dict.items()]
@@ -77,12 +132,16 @@ class ALNS:
         # start the process, first to define some parameters
         best_solution = initial_solution
         prev_solution = initial_solution
+        last_improvement = 0
 
         # this is the process of ALNS
         start_time = time()
+        stop_reason = "iterations"
+        i = 0
 
         for i in range(1, N + 1):
-            print(i)
+            if verbose:
+                print(i)
             # this is for stations
             if i % NSR == 0:
                 # choose the station removal and station insertion
@@ -97,44 +156,45 @@ class ALNS:
                 score_si[si_algo][2] += 1
 
                 # destroy and repair
-                destroy = sr_function_dict[sr_algo](prev_solution)
-                repair = []
-                for route in destroy:
-                    repair.append(si_function_dict[si_algo](route))
+                # the operators edit copies of the solution, its records and position index go along
+                destroy = profiler.call("sr", sr_algo, sr_function_dict[sr_algo], prev_solution)
+                repair = profiler.call("si", si_algo, destroy.apply, si_function_dict[si_algo])
 
                 # test first whether the repair is feasible or not
-                if helper.feasible(repair):
+                if repair.feasible():
                     # the best one has been found, update the current prev and best, and the score
                     if (
                             len(repair) < len(best_solution) or (
-                            len(repair) == len(best_solution) and helper.total_distance_list(
-                        repair) < helper.total_distance_list(best_solution))
+                            len(repair) == len(best_solution) and repair.distance < best_solution.distance)
                     ):
                         prev_solution = repair
                         best_solution = repair
+                        last_improvement = i
                         score_sr[sr_algo][1] += sigma1
                         score_si[si_algo][1] += sigma1
 
                     # if this one is better than previous but not the best
                     elif (
-                            len(repair) == len(prev_solution) and helper.total_distance_list(
-                        repair) < helper.total_distance_list(prev_solution)
+                            len(repair) == len(prev_solution) and repair.distance < prev_solution.distance
                     ):
                         prev_solution = repair
                         score_sr[sr_algo][1] += sigma2
                         score_si[si_algo][1] += sigma2
 
                     elif (
-                            len(repair) == len(prev_solution) and helper.total_distance_list(
-                        repair) > helper.total_distance_list(prev_solution)
+                            len(repair) == len(prev_solution) and repair.distance > prev_solution.distance
                     ):
-                        prob = exp(-(helper.total_distance_list(repair) - helper.total_distance_list(prev_solution))/T)
+                        prob = exp(-(repair.distance - prev_solution.distance)/T)
                         # accept the solution and update the score
                         if random() <= prob:
                             prev_solution = repair
                             score_sr[sr_algo][1] += sigma3
                             score_si[si_algo][1] += sigma3
 
+                profiler.outcome(
+                    [("sr", sr_algo), ("si", si_algo)], prev_solution is repair, best_solution is repair
+                )
+
             elif i % NRR == 0:
                 # this is for route removal
                 for _ in range(nRR):
@@ -149,43 +209,52 @@ class ALNS:
                     score_ci[ci_algo][2] += 1
 
                     # destroy and repair
-                    destroy = route_cr_function_dict[route_cr_algo](prev_solution)
-                    repair = ci_function_dict[ci_algo](destroy, self.cr.removal)
+                    destroy = profiler.call(
+                        "route_cr", route_cr_algo, route_cr_function_dict[route_cr_algo], prev_solution
+                    )
+                    repair = profiler.call("ci", ci_algo, ci_function_dict[ci_algo], destroy, self.cr.removal)
 
                     # test first whether the repair is feasible or not
-                    if helper.feasible(repair):
+                    if repair.feasible():
                         # the best one has been found, update the current prev and best, and the score
                         if (
                                 len(repair) < len(best_solution) or (
-                                len(repair) == len(best_solution) and helper.total_distance_list(
-                            repair) < helper.total_distance_list(best_solution))
+                                len(repair) == len(best_solution) and repair.distance < best_solution.distance)
                         ):
                             prev_solution = repair
                             best_solution = repair
+                            last_improvement = i
                             score_route_cr[route_cr_algo][1] += sigma1
                             score_ci[ci_algo][1] += sigma1
 
                         # if this one is better than previous but not the best
                         elif (
-                                len(repair) == len(prev_solution) and helper.total_distance_list(
-                            repair) < helper.total_distance_list(prev_solution)
+                                len(repair) == len(prev_solution) and repair.distance < prev_solution.distance
                         ):
                             prev_solution = repair
                             score_route_cr[route_cr_algo][1] += sigma2
                             score_ci[ci_algo][1] += sigma2
 
                         elif (
-                                len(repair) == len(prev_solution) and helper.total_distance_list(
-                            repair) > helper.total_distance_list(prev_solution)
+                                len(repair) == len(prev_solution) and repair.distance > prev_solution.distance
                         ):
-                            prob = exp(
-                                -(helper.total_distance_list(repair) - helper.total_distance_list(prev_solution)) / T)
+                            prob = exp(-(repair.distance - prev_solution.distance) / T)
                             # accept the solution and update the score
                             if random() <= prob:
                                 prev_solution = repair
                                 score_route_cr[route_cr_algo][1] += sigma3
                                 score_ci[ci_algo][1] += sigma3
 
+                    profiler.outcome(
+                        [("route_cr", route_cr_algo), ("ci", ci_algo)], prev_solution is repair,
+                        best_solution is repair
+                    )
+
+                    # one route removal iteration runs nRR passes, the deadline and the target are checked between
+                    if deadline is not None and time() >= deadline or target is not None and (
+                            len(best_solution), best_solution.distance) <= tuple(target):
+                        break
+
             else:
 
                 # this is for the customer removal and insertion
@@ -201,43 +270,47 @@ class ALNS:
                 score_ci[ci_algo][2] += 1
 
                 # destroy and repair
-                destroy = normal_cr_function_dict[normal_cr_algo](prev_solution)
-                repair = ci_function_dict[ci_algo](destroy, self.cr.removal)
+                destroy = profiler.call(
+                    "normal_cr", normal_cr_algo, normal_cr_function_dict[normal_cr_algo], prev_solution
+                )
+                repair = profiler.call("ci", ci_algo, ci_function_dict[ci_algo], destroy, self.cr.removal)
 
                 # test first whether the repair is feasible or not
-                if helper.feasible(repair):
+                if repair.feasible():
                     # the best one has been found, update the current prev and best, and the score
                     if (
                             len(repair) < len(best_solution) or (
-                            len(repair) == len(best_solution) and helper.total_distance_list(
-                        repair) < helper.total_distance_list(best_solution))
+                            len(repair) == len(best_solution) and repair.distance < best_solution.distance)
                     ):
                         prev_solution = repair
                         best_solution = repair
+                        last_improvement = i
                         score_normal_cr[normal_cr_algo][1] += sigma1
                         score_ci[ci_algo][1] += sigma1
 
                     # if this one is better than previous but not the best
                     elif (
-                            len(repair) == len(prev_solution) and helper.total_distance_list(
-                        repair) < helper.total_distance_list(prev_solution)
+                            len(repair) == len(prev_solution) and repair.distance < prev_solution.distance
                     ):
                         prev_solution = repair
                         score_normal_cr[normal_cr_algo][1] += sigma2
                         score_ci[ci_algo][1] += sigma2
 
                     elif (
-                            len(repair) == len(prev_solution) and helper.total_distance_list(
-                        repair) > helper.total_distance_list(prev_solution)
+                            len(repair) == len(prev_solution) and repair.distance > prev_solution.distance
                     ):
-                        prob = exp(
-                            -(helper.total_distance_list(repair) - helper.total_distance_list(prev_solution)) / T)
+                        prob = exp(-(repair.distance - prev_solution.distance) / T)
                         # accept the solution and update the score
                         if random() <= prob:
                             prev_solution = repair
                             score_normal_cr[normal_cr_algo][1] += sigma3
                             score_ci[ci_algo][1] += sigma3
 
+                profiler.outcome(
+                    [("normal_cr", normal_cr_algo), ("ci", ci_algo)], prev_solution is repair,
+                    best_solution is repair
+                )
+
             # end the removal and insertion operation, try to update the weights
             if i % Nc == 0:
                 # update the weights of the customers
@@ -285,18 +358,121 @@ class ALNS:
 
             T = T * epsilon
 
+            # cooperative mode, share the best solution and restart a stagnating search from a better elite one
+            if island is not None and i % island.interval == 0:
+                island.publish(best_solution)
+                if i - max(last_improvement, island.last_adoption) >= island.patience:
+                    elite = island.adopt(prev_solution)
+                    if elite is not None:
+                        prev_solution = Solution(elite, helper)
+                        island.last_adoption = i
+                        if (len(prev_solution), prev_solution.distance) < (len(best_solution), best_solution.distance):
+                            best_solution = prev_solution
+                            last_improvement = i
+
             if ["D0", "D0_end"] in best_solution:
                 best_solution.remove(["D0", "D0_end"])
 
             if ["D0", "D0_end"] in prev_solution:
                 prev_solution.remove(["D0", "D0_end"])
 
+            # check the early termination criteria
+            if target is not None and (len(best_solution), best_solution.distance) <= tuple(target):
+                stop_reason = "target"
+            elif max_no_improve is not None and i - last_improvement >= max_no_improve:
+                stop_reason = "max_no_improve"
+            elif deadline is not None and time() >= deadline:
+                stop_reason = "time_limit"
+            else:
+                continue
+            break
+
         end_time = time()
 
         duration = end_time - start_time
 
-        return helper.total_distance_list(best_solution), len(best_solution), helper.total_distance_list(
-            initial_solution), len(initial_solution), duration, best_solution
+        report = profiler.report(
+            iterations=i, stop_reason=stop_reason, duration=duration, distance=best_solution.distance,
+            vehicles=len(best_solution), insertion_checks=helper.checker.labels.insertion_checks - insertion_checks,
+            route_cache=self.parameters["route_cache"].stats(), repair_cache=self.parameters["repair_cache"].stats()
+        )
+        if report_file is not None:
+            OperatorProfiler.write(report, report_file)
+
+        return RunResult(
+            best_solution.distance, len(best_solution), initial_solution.distance, len(initial_solution), duration,
+            best_solution.routes, report, stop_reason
+        )
+
+    def run_parallel(self, workers=None, seeds=None, cooperative=False, interval=50, patience=200, **kwargs):
+        """
+        This is the function to run independent searches in a process pool and keep the best one
+        Each worker process gets a copy of the parsed parameters, its own route cache and its own seeded random
+        streams. Without cooperation the searches do not share any state, with it they form an island model: every
+        interval iterations a search publishes its best solution to a shared elite pool, and a search without a new
+        best solution for patience iterations continues from a better elite solution of another search
+        :param workers: number of worker processes, defaults to the number of seeds or the number of cpus
+        :param seeds: one seed per search, defaults to 0, 1, ..., workers - 1
+        :param cooperative: true to exchange elite solutions between the searches
+        :param interval: number of iterations between two exchanges, cooperative mode only
+        :param patience: number of iterations without improvement before adopting an elite solution
+        :param kwargs: the arguments of run, for example N
+        :return: the result of run for the best solution, fewer vehicles first then shorter distance, with the wall
+        time of the whole pool as duration, and the list of the statistics of every search
+        """
+        if seeds is None:
+            seeds = list(range(workers or os.cpu_count() or 1))
+        seeds = list(seeds)
+        workers = min(workers or os.cpu_count() or 1, len(seeds))
+        kwargs.setdefault("verbose", False)
+
+        with Manager() if cooperative else nullcontext() as manager:
+            elite_pool = ElitePool(manager, len(seeds), interval, patience) if cooperative else None
+
+            start_time = time()
+            if workers == 1:
+                # no pool for a single worker, same wall time as run
+                results = [
+                    self.run_statistics(seed, kwargs, elite_pool, worker) for worker, seed in enumerate(seeds)
+                ]
+            else:
+                with ProcessPoolExecutor(
+                        max_workers=workers, initializer=_initiate_worker,
+                        initargs=(self.file, self.backend, self.cache_size, self.granular, {
+                            key: value for key, value in self.parameters.items()
+                            if key not in PROCESS_LOCAL and key not in MATRIX_VIEWS
+                        })
+                ) as pool:
+                    # the index of a search is its id in the elite pool, the seeds may repeat or be None
+                    results = list(pool.map(
+                        _run_worker, seeds, [kwargs] * len(seeds), [elite_pool] * len(seeds), range(len(seeds))
+                    ))
+            duration = time() - start_time
+
+        statistics = [statistic for result, statistic in results]
+        best = min(results, key=lambda result: (result[0][1], result[0][0]))[0]
+        return best._replace(duration=duration), statistics
+
+    def run_statistics(self, seed, kwargs, elite_pool=None, worker=0):
+        """
+        This is the function to run one seeded search and collect its statistics
+        :param seed: seed of the random streams of this search
+        :param kwargs: the arguments of run
+        :param elite_pool: ElitePool of the cooperative mode, None for an independent search
+        :param worker: index of the search, its id in the elite pool
+        :return: the result of run and the dict of statistics of the search
+        """
+        island = Island(elite_pool, worker, self.parameters) if elite_pool is not None else None
+        result = self.run(seed=seed, island=island, **kwargs)
+        statistics = {"seed": seed, "worker": worker, "pid": os.getpid(), "distance": result[0], "vehicles": result[1],
+                      "initial_distance": result[2], "initial_vehicles": result[3], "duration": result[4],
+                      "stop_reason": result.stop_reason,
+                      "route_cache": self.parameters["route_cache"].stats(),
+                      "repair_cache": self.parameters["repair_cache"].stats(), "report": result.report}
+        if island is not None:
+            statistics["published"] = island.published
+            statistics["adopted"] = island.adopted
+        return result, statistics
 
     def normal_cr_function_dict(self):
         return {"r": self.cr.random_removal,
@@ -345,7 +521,32 @@ class ALNS:
     def si_function_dict(self):
         return {"gsi": self.si.greedy_station_insertion,
                 "gsic": self.si.greedy_station_insertion_comparison,
-                "bsi": self.si.best_station_insertion}
+                "bsi": self.si.best_station_insertion,
+                "dpsi": self.si.dynamic_station_insertion}
         #"gsisn": self.si.greedy_station_insertion_sn,
         # "gsica": self.si.greedy_station_insertion_comparison_all,
         #"bsisn": self.si.best_station_insertion_sn}
+
+
+def _initiate_worker(file, backend, cache_size, granular, parameters):
+    """
+    Void function, build the ALNS instance of a worker process from the parameters parsed by the parent
+    """
+    global _worker_alns
+    parameters = {key: value for key, value in parameters.items() if key not in PROCESS_LOCAL}
+    # the matrices come as the arc views, mapped again from the cache files when the parent had them mapped
+    for matrix, view in MATRIX_VIEWS.items():
+        parameters[matrix] = parameters[view].matrix
+    _worker_alns = ALNS(file, backend, cache_size, parameters=parameters, granular=granular)
+
+
+def _run_worker(seed, kwargs, elite_pool=None, worker=0):
+    """
+    This is the function to run one seeded search in a worker process
+    :param seed: seed of the random streams of this search
+    :param kwargs: the arguments of run
+    :param elite_pool: ElitePool of the cooperative mode, None for an independent search
+    :param worker: index of the search, its id in the elite pool
+    :return: the result of run and the dict of statistics of the search
+    """
+    return _worker_alns.run_statistics(seed, kwargs, elite_pool, worker)
@@ -1,37 +1,40 @@
 import string
-from EVRPTW_PR_ALNS.mip_check import MIPCheck
+from EVRPTW_PR_ALNS.context import InstanceContext
 from EVRPTW_PR_ALNS._algorithms.SI import StationInsertion
-from EVRPTW_PR_ALNS.helper_function import Helper
 
 
 class Heuristic:
-    def __init__(self, parameters):
+    def __init__(self, context):
         """
         Take the parameter to initiate a helper instance
-        :param parameters: parameter dict of a graph instance
+        :param context: InstanceContext of the instance, or its parameter dict
         """
-        self.parameters = parameters
-        self.checker = MIPCheck(self.parameters)
-        self.SI = StationInsertion(self.parameters)
-        self.helper = Helper(self.parameters)
-        self.clients = self.parameters["clients"]
-        self.stations = self.parameters["stations"]
-        self.all_nodes = self.parameters["all_nodes"]
-        self.depot_start = self.parameters["depot_start"]
-        self.depot_end = self.parameters["depot_end"]
-        self.demand = self.parameters["demand"]
-        self.ready_time = self.parameters["ready_time"]
-        self.due_date = self.parameters["due_date"]
-        self.service_time = self.parameters["service_time"]
-        self.arcs = self.parameters["arcs"]
-        self.times = self.parameters["times"]
-        self.final_data = self.parameters["final_data"]
-        self.original_stations = self.parameters["original_stations"]
-        self.Q = self.parameters["Q"]
-        self.C = self.parameters["C"]
-        self.g = self.parameters["g"]
-        self.h = self.parameters["h"]
-        self.v = self.parameters["v"]
+        context = InstanceContext.of(context)
+        self.context = context
+        self.parameters = context.parameters
+        self.checker = context.checker
+        self.SI = StationInsertion(context)
+        self.helper = context.helper
+        self.clients = context.clients
+        self.stations = context.stations
+        self.all_nodes = context.all_nodes
+        self.depot_start = context.depot_start
+        self.depot_end = context.depot_end
+        self.demand = context.demand
+        self.ready_time = context.ready_time
+        self.due_date = context.due_date
+        self.service_time = context.service_time
+        self.arcs = context.arcs
+        self.node_index = context.node_index
+        self.times = context.times
+        self.final_data = context.final_data
+        self.original_stations = context.original_stations
+        self.client_set = context.client_set
+        self.Q = context.Q
+        self.C = context.C
+        self.g = context.g
+        self.h = context.h
+        self.v = context.v
 
     def initial_solution(self):
         """
@@ -61,16 +64,20 @@ class Heuristic:
             distance_record = min_distance
 
             # for this part, we must find the smallest feasible if there is any
+            # the detours are computed on integer node ids through the rows of the distance matrix
+            rows = self.arcs.rows
+            route_ids = [self.node_index[node] for node in current_route]
+            evaluator = self.helper.insertion_evaluator(current_route)
             for client in removal:
-                for i in range(1, len(current_route)):
+                client_id = self.node_index[client]
+                for i in self.helper.insertion_positions(current_route, client):
                     # calculate the difference, trying to find the best one
-                    difference = self.arcs[current_route[i], client] + self.arcs[current_route[i - 1], client] - \
-                                 self.arcs[
-                                     current_route[i], current_route[i - 1]]
+                    difference = rows[route_ids[i]][client_id] + rows[route_ids[i - 1]][client_id] - \
+                                 rows[route_ids[i]][route_ids[i - 1]]
                     if difference < min_distance:
                         # find a smaller one, but check the feasibility first
                         # if feasible, we update the recorders
-                        if self.helper.feasible_route(current_route[:i] + [client] + current_route[i:]):
+                        if evaluator.feasible(i, client):
                             min_distance = difference
                             best_insertion = client
                             index_insertion = i
@@ -87,7 +94,7 @@ class Heuristic:
                 # create the candidates and then compare the total distance if feasible
                 candidates = []
                 for client in removal:
-                    for i in range(1, len(current_route)):
+                    for i in self.helper.insertion_positions(current_route, client):
                         new_route = current_route[:i] + [client] + current_route[i:]
                         # keep new route with time and cargo constraint, and use greedy station insertion to repair
                         if self.helper.cargo_check(new_route) and self.checker.time(new_route) and not self.checker.energy(
@@ -105,7 +112,7 @@ class Heuristic:
                         )
                         routes[-1] = add_route
                         for client in add_route:
-                            if client in self.clients and client not in current_route:
+                            if client in self.client_set and client not in current_route:
                                 removal.remove(client)
                     else:
                         if current_route != ["D0", "D0_end"]:
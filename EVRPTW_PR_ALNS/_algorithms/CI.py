@@ -1,21 +1,25 @@
-from EVRPTW_PR_ALNS.mip_check import MIPCheck
-from EVRPTW_PR_ALNS.helper_function import Helper
+from EVRPTW_PR_ALNS.context import InstanceContext
 from EVRPTW_PR_ALNS._algorithms.SI import StationInsertion
+from EVRPTW_PR_ALNS.solution import insert_node, node_positions
 import string
 
 
 class CustomerInsertion:
-    def __init__(self, parameters):
-        self.parameters = parameters
-        self.Q = self.parameters["Q"]
-        self.depot_start = self.parameters["depot_start"]
-        self.original_stations = self.parameters["original_stations"]
-        self.clients = self.parameters["clients"]
-        self.arcs = self.parameters["arcs"]
-        self.h = self.parameters["h"]
-        self.checker = MIPCheck(self.parameters)
-        self.helper = Helper(self.parameters)
-        self.SI = StationInsertion(self.parameters)
+    def __init__(self, context):
+        context = InstanceContext.of(context)
+        self.context = context
+        self.parameters = context.parameters
+        self.Q = context.Q
+        self.depot_start = context.depot_start
+        self.original_stations = context.original_stations
+        self.client_set = context.client_set
+        self.clients = context.clients
+        self.arcs = context.arcs
+        self.node_index = context.node_index
+        self.h = context.h
+        self.checker = context.checker
+        self.helper = context.helper
+        self.SI = StationInsertion(context)
 
     def greedy_customer_insertion(self, routes, removal):
         """
@@ -40,16 +44,20 @@ class CustomerInsertion:
             distance_record = min_distance
 
             # for this part, we must find the smallest feasible if there is any
+            # the detours are computed on integer node ids through the rows of the distance matrix
+            rows = self.arcs.rows
+            route_ids = [self.node_index[node] for node in current_route]
+            evaluator = self.helper.insertion_evaluator(current_route)
             for client in removal:
-                for i in range(1, len(current_route)):
+                client_id = self.node_index[client]
+                for i in self.helper.insertion_positions(current_route, client):
                     # calculate the difference, trying to find the best one
-                    difference = self.arcs[current_route[i], client] + self.arcs[current_route[i - 1], client] - \
-                                 self.arcs[
-                                     current_route[i], current_route[i - 1]]
+                    difference = rows[route_ids[i]][client_id] + rows[route_ids[i - 1]][client_id] - \
+                                 rows[route_ids[i]][route_ids[i - 1]]
                     if difference < min_distance:
                         # find a smaller one, but check the feasibility first
                         # if feasible, we update the recorders
-                        if self.helper.feasible_route(current_route[:i] + [client] + current_route[i:]):
+                        if evaluator.feasible(i, client):
                             min_distance = difference
                             best_insertion = client
                             index_insertion = i
@@ -57,10 +65,9 @@ class CustomerInsertion:
             # after this smaller search, check if the recorder has updated
             # if yes, then we find a smaller feasible customer that can be added to the route and update the current
             if min_distance < distance_record:
-                new_route = current_route[:index_insertion] + [best_insertion] + current_route[index_insertion:]
                 # if there is customer that can be inserted, we update the current route and un-change the index
                 # remove the best client from the removal list
-                routes[route_index] = new_route
+                insert_node(routes, route_index, index_insertion, best_insertion)
                 removal.remove(best_insertion)
             # if after the search, there is no customer can be added to the route
             # we loop again to find the customer with a station
@@ -68,7 +75,7 @@ class CustomerInsertion:
                 # create the candidates and then compare the total distance if feasible
                 candidates = []
                 for client in removal:
-                    for i in range(1, len(current_route)):
+                    for i in self.helper.insertion_positions(current_route, client):
                         new_route = current_route[:i] + [client] + current_route[i:]
                         # keep new route with time and cargo constraint, and use greedy station insertion to repair
                         if self.helper.cargo_check(new_route) and self.checker.time(
@@ -88,9 +95,9 @@ class CustomerInsertion:
                         )
                         # if after repair some can be in, we update the route, removal list and un-change the index
                         routes[route_index] = add_route
-                        for client in add_route:
-                            if client in self.clients and client not in current_route:
-                                removal.remove(client)
+                        # the clients new to the route are the ones of the removal list now in the position index
+                        positions = node_positions(routes)
+                        removal[:] = [client for client in removal if client not in positions]
                     else:
                         # if the SI can not repair the route:
                         # if this is not the last route in the routes solution, we update to the next route
@@ -140,29 +147,34 @@ class CustomerInsertion:
             # initiate the current route
             current_route = routes[route_index]
 
-            # store all the feasible new route after customer insertion
+            # store all the feasible insertions as (detour, position), only the chosen route is built
+            # the detour ranks the insertions like the distance of the new routes
+            rows = self.arcs.rows
+            route_ids = [self.node_index[node] for node in current_route]
+            evaluator = self.helper.insertion_evaluator(current_route)
             customers_dict = {}
             for client in removal:
-                customer_routes = []
-                for i in range(1, len(current_route)):
-                    new_route = current_route[:i] + [client] + current_route[i:]
-                    if self.helper.feasible_route(new_route):
-                        customer_routes.append(new_route)
-                if len(customer_routes) >= k:
-                    sorted_routes = sorted(customer_routes, key=self.helper.distance_one_route)
-                    customers_dict[client] = sorted_routes
+                client_id = self.node_index[client]
+                customer_insertions = []
+                for i in self.helper.insertion_positions(current_route, client):
+                    if evaluator.feasible(i, client):
+                        detour = rows[route_ids[i]][client_id] + rows[route_ids[i - 1]][client_id] - \
+                                 rows[route_ids[i]][route_ids[i - 1]]
+                        customer_insertions.append((detour, i))
+                if len(customer_insertions) >= k:
+                    customers_dict[client] = sorted(customer_insertions, key=lambda insertion: insertion[0])
 
             # test if the dict is empty
             if customers_dict:
                 # if not empty, we can do the insertion
                 best_customer = max(
                     customers_dict,
-                    key=lambda customer: abs(self.helper.distance_one_route(
-                        customers_dict[customer][k - 1]) - self.helper.distance_one_route(customers_dict[customer][0]))
+                    key=lambda customer: abs(customers_dict[customer][k - 1][0] - customers_dict[customer][0][0])
                 )
 
                 # we insert the best customer, update the removal list
-                routes[route_index] = customers_dict[best_customer][0]
+                position = customers_dict[best_customer][0][1]
+                insert_node(routes, route_index, position, best_customer)
                 removal.remove(best_customer)
             else:
                 # calculate the best customer with time and cargo constraints
@@ -173,16 +185,17 @@ class CustomerInsertion:
                 distance_record = min_distance
 
                 # for this part, we must find the smallest feasible if there is any
+                # the detours and the evaluator of the current route are the ones prepared above
                 for client in removal:
-                    for i in range(1, len(current_route)):
+                    client_id = self.node_index[client]
+                    for i in self.helper.insertion_positions(current_route, client):
                         # calculate the difference, trying to find the best one
-                        difference = self.arcs[current_route[i], client] + self.arcs[current_route[i - 1], client] - \
-                                     self.arcs[
-                                         current_route[i], current_route[i - 1]]
+                        difference = rows[route_ids[i]][client_id] + rows[route_ids[i - 1]][client_id] - \
+                                     rows[route_ids[i]][route_ids[i - 1]]
                         if difference < min_distance:
                             # find a smaller one, but check the feasibility first
                             # if feasible, we update the recorders
-                            if self.helper.feasible_route(current_route[:i] + [client] + current_route[i:]):
+                            if evaluator.feasible(i, client):
                                 min_distance = difference
                                 best_insertion = client
                                 index_insertion = i
@@ -190,10 +203,9 @@ class CustomerInsertion:
                 # after this smaller search, check if the recorder has updated
                 # if yes, then we find a smaller feasible customer that can be added to the route and update the current
                 if min_distance < distance_record:
-                    new_route = current_route[:index_insertion] + [best_insertion] + current_route[index_insertion:]
                     # if there is customer that can be inserted, we update the current route and un-change the index
                     # remove the best client from the removal list
-                    routes[route_index] = new_route
+                    insert_node(routes, route_index, index_insertion, best_insertion)
                     removal.remove(best_insertion)
                 # if after the search, there is no customer can be added to the route
                 # we loop again to find the customer with a station
@@ -201,7 +213,7 @@ class CustomerInsertion:
                     # create the candidates and then compare the total distance if feasible
                     candidates = []
                     for client in removal:
-                        for i in range(1, len(current_route)):
+                        for i in self.helper.insertion_positions(current_route, client):
                             new_route = current_route[:i] + [client] + current_route[i:]
                             # keep new route with time and cargo constraint, and use greedy station insertion to repair
                             if self.helper.cargo_check(new_route) and self.checker.time(
@@ -221,9 +233,9 @@ class CustomerInsertion:
                             )
                             # if after repair some can be in, we update the route, removal list and un-change the index
                             routes[route_index] = add_route
-                            for client in add_route:
-                                if client in self.clients and client not in current_route:
-                                    removal.remove(client)
+                            # the clients new to the route are the ones of the removal list now in the position index
+                            positions = node_positions(routes)
+                            removal[:] = [client for client in removal if client not in positions]
                         else:
                             # if the SI can not repair the route:
                             # if this is not the last route in the routes solution, we update to the next route
@@ -273,29 +285,34 @@ class CustomerInsertion:
             # initiate the current route
             current_route = routes[route_index]
 
-            # store all the feasible new route after customer insertion
+            # store all the feasible insertions as (detour, position), only the chosen route is built
+            # the detour ranks the insertions like the distance of the new routes
+            rows = self.arcs.rows
+            route_ids = [self.node_index[node] for node in current_route]
+            evaluator = self.helper.insertion_evaluator(current_route)
             customers_dict = {}
             for client in removal:
-                customer_routes = []
-                for i in range(1, len(current_route)):
-                    new_route = current_route[:i] + [client] + current_route[i:]
-                    if self.helper.feasible_route(new_route):
-                        customer_routes.append(new_route)
-                if len(customer_routes) >= k:
-                    sorted_routes = sorted(customer_routes, key=self.helper.distance_one_route)
-                    customers_dict[client] = sorted_routes
+                client_id = self.node_index[client]
+                customer_insertions = []
+                for i in self.helper.insertion_positions(current_route, client):
+                    if evaluator.feasible(i, client):
+                        detour = rows[route_ids[i]][client_id] + rows[route_ids[i - 1]][client_id] - \
+                                 rows[route_ids[i]][route_ids[i - 1]]
+                        customer_insertions.append((detour, i))
+                if len(customer_insertions) >= k:
+                    customers_dict[client] = sorted(customer_insertions, key=lambda insertion: insertion[0])
 
             # test if the dict is empty
             if customers_dict:
                 # if not empty, we can do the insertion
                 best_customer = max(
                     customers_dict,
-                    key=lambda customer: abs(self.helper.distance_one_route(
-                        customers_dict[customer][k - 1]) - self.helper.distance_one_route(customers_dict[customer][0]))
+                    key=lambda customer: abs(customers_dict[customer][k - 1][0] - customers_dict[customer][0][0])
                 )
 
                 # we insert the best customer, update the removal list
-                routes[route_index] = customers_dict[best_customer][0]
+                position = customers_dict[best_customer][0][1]
+                insert_node(routes, route_index, position, best_customer)
                 removal.remove(best_customer)
             else:
                 # calculate the best customer with time and cargo constraints
@@ -306,16 +323,17 @@ class CustomerInsertion:
                 distance_record = min_distance
 
                 # for this part, we must find the smallest feasible if there is any
+                # the detours and the evaluator of the current route are the ones prepared above
                 for client in removal:
-                    for i in range(1, len(current_route)):
+                    client_id = self.node_index[client]
+                    for i in self.helper.insertion_positions(current_route, client):
                         # calculate the difference, trying to find the best one
-                        difference = self.arcs[current_route[i], client] + self.arcs[current_route[i - 1], client] - \
-                                     self.arcs[
-                                         current_route[i], current_route[i - 1]]
+                        difference = rows[route_ids[i]][client_id] + rows[route_ids[i - 1]][client_id] - \
+                                     rows[route_ids[i]][route_ids[i - 1]]
                         if difference < min_distance:
                             # find a smaller one, but check the feasibility first
                             # if feasible, we update the recorders
-                            if self.helper.feasible_route(current_route[:i] + [client] + current_route[i:]):
+                            if evaluator.feasible(i, client):
                                 min_distance = difference
                                 best_insertion = client
                                 index_insertion = i
@@ -323,10 +341,9 @@ class CustomerInsertion:
                 # after this smaller search, check if the recorder has updated
                 # if yes, then we find a smaller feasible customer that can be added to the route and update the current
                 if min_distance < distance_record:
-                    new_route = current_route[:index_insertion] + [best_insertion] + current_route[index_insertion:]
                     # if there is customer that can be inserted, we update the current route and un-change the index
                     # remove the best client from the removal list
-                    routes[route_index] = new_route
+                    insert_node(routes, route_index, index_insertion, best_insertion)
                     removal.remove(best_insertion)
                 # if after the search, there is no customer can be added to the route
                 # we loop again to find the customer with a station
@@ -334,7 +351,7 @@ class CustomerInsertion:
                     # create the candidates and then compare the total distance if feasible
                     candidates = []
                     for client in removal:
-                        for i in range(1, len(current_route)):
+                        for i in self.helper.insertion_positions(current_route, client):
                             new_route = current_route[:i] + [client] + current_route[i:]
                             # keep new route with time and cargo constraint, and use greedy station insertion to repair
                             if self.helper.cargo_check(new_route) and self.checker.time(
@@ -354,9 +371,9 @@ class CustomerInsertion:
                             )
                             # if after repair some can be in, we update the route, removal list and un-change the index
                             routes[route_index] = add_route
-                            for client in add_route:
-                                if client in self.clients and client not in current_route:
-                                    removal.remove(client)
+                            # the clients new to the route are the ones of the removal list now in the position index
+                            positions = node_positions(routes)
+                            removal[:] = [client for client in removal if client not in positions]
                         else:
                             # if the SI can not repair the route:
                             # if this is not the last route in the routes solution, we update to the next route
@@ -1,39 +1,41 @@
-from EVRPTW_PR_ALNS.mip_check import MIPCheck
-from EVRPTW_PR_ALNS.helper_function import Helper
+from EVRPTW_PR_ALNS.context import InstanceContext
+from EVRPTW_PR_ALNS.solution import Solution, copy_routes, node_positions, remove_nodes
 from math import ceil, floor
 from random import uniform, sample, random
-from copy import deepcopy
-import numpy as np
 
 
 class CustomerRemoval:
-    def __init__(self, parameters):
+    def __init__(self, context):
         """
         This is a constructor to create a customer removal object
-        :param parameters: parameters got from a file reader from an instance
+        :param context: InstanceContext of the instance, or its parameter dict
         """
-        self.parameters = parameters
-        self.checker = MIPCheck(self.parameters)
-        self.helper = Helper(self.parameters)
-        self.clients = self.parameters["clients"]
-        self.stations = self.parameters["stations"]
-        self.all_nodes = self.parameters["all_nodes"]
-        self.depot_start = self.parameters["depot_start"]
-        self.depot_end = self.parameters["depot_end"]
-        self.demand = self.parameters["demand"]
-        self.ready_time = self.parameters["ready_time"]
-        self.due_date = self.parameters["due_date"]
-        self.service_time = self.parameters["service_time"]
-        self.arcs = self.parameters["arcs"]
-        self.times = self.parameters["times"]
-        self.final_data = self.parameters["final_data"]
-        self.original_stations = self.parameters["original_stations"]
-        self.locations = self.parameters["locations"]
-        self.Q = self.parameters["Q"]
-        self.C = self.parameters["C"]
-        self.g = self.parameters["g"]
-        self.h = self.parameters["h"]
-        self.v = self.parameters["v"]
+        context = InstanceContext.of(context)
+        self.context = context
+        self.parameters = context.parameters
+        self.checker = context.checker
+        self.helper = context.helper
+        self.clients = context.clients
+        self.stations = context.stations
+        self.all_nodes = context.all_nodes
+        self.depot_start = context.depot_start
+        self.depot_end = context.depot_end
+        self.demand = context.demand
+        self.ready_time = context.ready_time
+        self.due_date = context.due_date
+        self.service_time = context.service_time
+        self.arcs = context.arcs
+        self.times = context.times
+        self.final_data = context.final_data
+        self.original_stations = context.original_stations
+        self.client_set = context.client_set
+        self.original_station_set = context.original_station_set
+        self.locations = context.locations
+        self.Q = context.Q
+        self.C = context.C
+        self.g = context.g
+        self.h = context.h
+        self.v = context.v
         # define the tuned parameters before start the _algorithms
         self.removal_lower = int(min(0.1 * len(self.clients), 30))
         self.removal_upper = int(min(0.4 * len(self.clients), 60))
@@ -45,14 +47,50 @@ class CustomerRemoval:
         self.phi4 = 0.25
         self.routes_number_lower = 0.1
         self.mr = 0.3
-        self.increment = 5
+        # zones of the zone removal, 5 along each axis, and their clients
+        self.zone_grid = context.zone_grid
         self.removal = []
+        self.marked = set()
 
     def reset_removal(self):
         """
         Void function, reset the removal list
         """
         self.removal = []
+        self.marked = set()
+
+    def mark(self, *clients):
+        """
+        Void function, add clients to the removal list, the marked set keeps the membership test constant time
+        :param clients: clients to be removed
+        """
+        self.removal.extend(clients)
+        self.marked.update(clients)
+
+    def remove_clients(self, routes, neighbour=0):
+        """
+        This is the function to remove the clients of the removal list, the edits go to a copy of the routes
+        :param routes: routes of the solution, not changed
+        :param neighbour: -1 to also remove the original station right before a removed client, 1 right after, 0 none
+        :return: the copy, the routes without removed client are the same list objects as in the argument, a Solution
+        keeps its position index up to date
+        """
+        # locate each removed client with the position index instead of scanning every route
+        positions = node_positions(routes)
+        removed = {}
+        for client in self.marked:
+            if client in positions:
+                i, j = positions[client]
+                indexes = removed.setdefault(i, set())
+                indexes.add(j)
+                if neighbour and routes[i][j + neighbour] in self.original_station_set:
+                    indexes.add(j + neighbour)
+
+        # rebuild only the touched routes, share the others
+        edited = copy_routes(routes)
+        for i, indexes in removed.items():
+            remove_nodes(edited, i, indexes)
+        return edited
 
     def random_removal(self, routes):
         """
@@ -65,18 +103,9 @@ class CustomerRemoval:
         # uniformly choose a gamma as the number of clients to be removed
         gamma = ceil(uniform(self.removal_lower, self.removal_upper))
         # use sample to update the removal list, containing the customers to be removed
-        self.removal = sample(self.clients, gamma)
-        # deep copy the routes for list change
-        routes_removal = deepcopy(routes)
-
-        # traverse the feasible solution row by row
-        # for each route in the routes, for each client in removal list, if the client in, remove
-        for i in range(len(routes)):
-            for client in self.removal:
-                if client in routes[i]:
-                    routes_removal[i].remove(client)
-        # return the routes after removing all the clients
-        return routes_removal
+        self.mark(*sample(self.clients, gamma))
+        # copy on write, only the routes of the removed clients are rebuilt
+        return self.remove_clients(routes)
 
     def random_removal_prev(self, routes):
         """
@@ -89,22 +118,9 @@ class CustomerRemoval:
         # uniformly choose a gamma as the number of clients to be removed
         gamma = ceil(uniform(self.removal_lower, self.removal_upper))
         # use sample to update the removal list, containing the customers to be removed
-        self.removal = sample(self.clients, gamma)
-
-        new_routes = []
-
-        for i in range(len(routes)):
-            arr = np.array(routes[i])
-            remove_index = []
-            for j in range(len(routes[i])):
-                if routes[i][j] in self.removal:
-                    remove_index.append(j)
-                    if routes[i][j - 1] in self.original_stations:
-                        remove_index.append(j - 1)
-            new_arr = np.delete(arr, remove_index)
-            new_route = new_arr.tolist()
-            new_routes.append(new_route)
-        return new_routes
+        self.mark(*sample(self.clients, gamma))
+
+        return self.remove_clients(routes, neighbour=-1)
 
     def random_removal_next(self, routes):
         # reset the removal list to be empty again
@@ -112,22 +128,9 @@ class CustomerRemoval:
         # uniformly choose a gamma as the number of clients to be removed
         gamma = ceil(uniform(self.removal_lower, self.removal_upper))
         # use sample to update the removal list, containing the customers to be removed
-        self.removal = sample(self.clients, gamma)
-
-        new_routes = []
-
-        for i in range(len(routes)):
-            arr = np.array(routes[i])
-            remove_index = []
-            for j in range(len(routes[i])):
-                if routes[i][j] in self.removal:
-                    remove_index.append(j)
-                    if routes[i][j + 1] in self.original_stations:
-                        remove_index.append(j + 1)
-            new_arr = np.delete(arr, remove_index)
-            new_route = new_arr.tolist()
-            new_routes.append(new_route)
-        return new_routes
+        self.mark(*sample(self.clients, gamma))
+
+        return self.remove_clients(routes, neighbour=1)
 
     def worst_distance_removal(self, routes):
         # reset the removal list to be empty again
@@ -140,7 +143,7 @@ class CustomerRemoval:
 
         for route in routes:
             for i in range(len(route)):
-                if route[i] in self.clients:
+                if route[i] in self.client_set:
                     distance_cost[route[i]] = self.arcs[route[i], route[i - 1]] + self.arcs[route[i], route[i + 1]]
 
         # sort the dict according to the descending order
@@ -152,22 +155,13 @@ class CustomerRemoval:
             random_num = random()
             index = floor((random_num ** self.worst_removal_factor) * gamma)
             # check if the customer corresponding the index is in the removal list or not
-            if sorted_customers[index] in self.removal:
+            if sorted_customers[index] in self.marked:
                 continue
             else:
-                self.removal.append(sorted_customers[index])
+                self.mark(sorted_customers[index])
 
         # after get the removal list, we can remove the customers, same procedure as the random removal
-        routes_removal = deepcopy(routes)
-
-        # traverse the feasible solution row by row
-        # for each route in the routes, for each client in removal list, if the client in, remove
-        for i in range(len(routes)):
-            for client in self.removal:
-                if client in routes[i]:
-                    routes_removal[i].remove(client)
-        # return the routes after removing all the clients
-        return routes_removal
+        return self.remove_clients(routes)
 
     def worst_distance_removal_prev(self, routes):
         # reset the removal list to be empty again
@@ -180,7 +174,7 @@ class CustomerRemoval:
 
         for route in routes:
             for i in range(len(route)):
-                if route[i] in self.clients:
+                if route[i] in self.client_set:
                     distance_cost[route[i]] = self.arcs[route[i], route[i - 1]] + self.arcs[route[i], route[i + 1]]
 
         # sort the dict according to the descending order
@@ -192,25 +186,12 @@ class CustomerRemoval:
             random_num = random()
             index = floor((random_num ** self.worst_removal_factor) * gamma)
             # check if the customer corresponding the index is in the removal list or not
-            if sorted_customers[index] in self.removal:
+            if sorted_customers[index] in self.marked:
                 continue
             else:
-                self.removal.append(sorted_customers[index])
-
-        new_routes = []
-
-        for i in range(len(routes)):
-            arr = np.array(routes[i])
-            remove_index = []
-            for j in range(len(routes[i])):
-                if routes[i][j] in self.removal:
-                    remove_index.append(j)
-                    if routes[i][j - 1] in self.original_stations:
-                        remove_index.append(j - 1)
-            new_arr = np.delete(arr, remove_index)
-            new_route = new_arr.tolist()
-            new_routes.append(new_route)
-        return new_routes
+                self.mark(sorted_customers[index])
+
+        return self.remove_clients(routes, neighbour=-1)
 
     def worst_distance_removal_next(self, routes):
         # reset the removal list to be empty again
@@ -223,7 +204,7 @@ class CustomerRemoval:
 
         for route in routes:
             for i in range(len(route)):
-                if route[i] in self.clients:
+                if route[i] in self.client_set:
                     distance_cost[route[i]] = self.arcs[route[i], route[i - 1]] + self.arcs[route[i], route[i + 1]]
 
         # sort the dict according to the descending order
@@ -235,25 +216,12 @@ class CustomerRemoval:
             random_num = random()
             index = floor((random_num ** self.worst_removal_factor) * gamma)
             # check if the customer corresponding the index is in the removal list or not
-            if sorted_customers[index] in self.removal:
+            if sorted_customers[index] in self.marked:
                 continue
             else:
-                self.removal.append(sorted_customers[index])
-
-        new_routes = []
-
-        for i in range(len(routes)):
-            arr = np.array(routes[i])
-            remove_index = []
-            for j in range(len(routes[i])):
-                if routes[i][j] in self.removal:
-                    remove_index.append(j)
-                    if routes[i][j + 1] in self.original_stations:
-                        remove_index.append(j + 1)
-            new_arr = np.delete(arr, remove_index)
-            new_route = new_arr.tolist()
-            new_routes.append(new_route)
-        return new_routes
+                self.mark(sorted_customers[index])
+
+        return self.remove_clients(routes, neighbour=1)
 
     def worst_time_removal(self, routes):
         # reset the removal list to be empty again
@@ -266,9 +234,9 @@ class CustomerRemoval:
 
         for route in routes:
             # for each route, extract the one to one corresponding arrival time
-            arrival_time = self.checker.time_extractor(route)
+            arrival_time = self.checker.feasible_schedule(route).arrival_times
             for i in range(len(route)):
-                if route[i] in self.clients:
+                if route[i] in self.client_set:
                     time_cost[route[i]] = abs(arrival_time[i] - self.ready_time[route[i]])
 
         # sort the dict according to the descending order
@@ -280,22 +248,13 @@ class CustomerRemoval:
             random_num = random()
             index = floor((random_num ** self.worst_removal_factor) * gamma)
             # check if the customer corresponding the index is in the removal list or not
-            if sorted_customers[index] in self.removal:
+            if sorted_customers[index] in self.marked:
                 continue
             else:
-                self.removal.append(sorted_customers[index])
+                self.mark(sorted_customers[index])
 
         # after get the removal list, we can remove the customers, same procedure as the random removal
-        routes_removal = deepcopy(routes)
-
-        # traverse the feasible solution row by row
-        # for each route in the routes, for each client in removal list, if the client in, remove
-        for i in range(len(routes)):
-            for client in self.removal:
-                if client in routes[i]:
-                    routes_removal[i].remove(client)
-        # return the routes after removing all the clients
-        return routes_removal
+        return self.remove_clients(routes)
 
     def worst_time_removal_prev(self, routes):
         # reset the removal list to be empty again
@@ -308,9 +267,9 @@ class CustomerRemoval:
 
         for route in routes:
             # for each route, extract the one to one corresponding arrival time
-            arrival_time = self.checker.time_extractor(route)
+            arrival_time = self.checker.feasible_schedule(route).arrival_times
             for i in range(len(route)):
-                if route[i] in self.clients:
+                if route[i] in self.client_set:
                     time_cost[route[i]] = abs(arrival_time[i] - self.ready_time[route[i]])
 
         # sort the dict according to the descending order
@@ -322,25 +281,12 @@ class CustomerRemoval:
             random_num = random()
             index = floor((random_num ** self.worst_removal_factor) * gamma)
             # check if the customer corresponding the index is in the removal list or not
-            if sorted_customers[index] in self.removal:
+            if sorted_customers[index] in self.marked:
                 continue
             else:
-                self.removal.append(sorted_customers[index])
-
-        new_routes = []
-
-        for i in range(len(routes)):
-            arr = np.array(routes[i])
-            remove_index = []
-            for j in range(len(routes[i])):
-                if routes[i][j] in self.removal:
-                    remove_index.append(j)
-                    if routes[i][j - 1] in self.original_stations:
-                        remove_index.append(j - 1)
-            new_arr = np.delete(arr, remove_index)
-            new_route = new_arr.tolist()
-            new_routes.append(new_route)
-        return new_routes
+                self.mark(sorted_customers[index])
+
+        return self.remove_clients(routes, neighbour=-1)
 
     def worst_time_removal_next(self, routes):
         # reset the removal list to be empty again
@@ -353,9 +299,9 @@ class CustomerRemoval:
 
         for route in routes:
             # for each route, extract the one to one corresponding arrival time
-            arrival_time = self.checker.time_extractor(route)
+            arrival_time = self.checker.feasible_schedule(route).arrival_times
             for i in range(len(route)):
-                if route[i] in self.clients:
+                if route[i] in self.client_set:
                     time_cost[route[i]] = abs(arrival_time[i] - self.ready_time[route[i]])
 
         # sort the dict according to the descending order
@@ -367,25 +313,12 @@ class CustomerRemoval:
             random_num = random()
             index = floor((random_num ** self.worst_removal_factor) * gamma)
             # check if the customer corresponding the index is in the removal list or not
-            if sorted_customers[index] in self.removal:
+            if sorted_customers[index] in self.marked:
                 continue
             else:
-                self.removal.append(sorted_customers[index])
-
-        new_routes = []
-
-        for i in range(len(routes)):
-            arr = np.array(routes[i])
-            remove_index = []
-            for j in range(len(routes[i])):
-                if routes[i][j] in self.removal:
-                    remove_index.append(j)
-                    if routes[i][j + 1] in self.original_stations:
-                        remove_index.append(j + 1)
-            new_arr = np.delete(arr, remove_index)
-            new_route = new_arr.tolist()
-            new_routes.append(new_route)
-        return new_routes
+                self.mark(sorted_customers[index])
+
+        return self.remove_clients(routes, neighbour=1)
 
     def worst_energy_removal(self, routes):
         # reset the removal list to be empty again
@@ -398,9 +331,9 @@ class CustomerRemoval:
 
         for route in routes:
             # for each route, extract the one to one corresponding arrival time
-            departure_energy = self.checker.energy_extractor(route)
+            departure_energy = self.checker.feasible_schedule(route).arrival_energy
             for i in range(len(route)):
-                if route[i] in self.clients:
+                if route[i] in self.client_set:
                     energy_cost[route[i]] = departure_energy[i]
 
         # sort the dict according to the increasing order, since when the smaller is the energy, more is the cost
@@ -412,22 +345,13 @@ class CustomerRemoval:
             random_num = random()
             index = floor((random_num ** self.worst_removal_factor) * gamma)
             # check if the customer corresponding the index is in the removal list or not
-            if sorted_customers[index] in self.removal:
+            if sorted_customers[index] in self.marked:
                 continue
             else:
-                self.removal.append(sorted_customers[index])
+                self.mark(sorted_customers[index])
 
         # after get the removal list, we can remove the customers, same procedure as the random removal
-        routes_removal = deepcopy(routes)
-
-        # traverse the feasible solution row by row
-        # for each route in the routes, for each client in removal list, if the client in, remove
-        for i in range(len(routes)):
-            for client in self.removal:
-                if client in routes[i]:
-                    routes_removal[i].remove(client)
-        # return the routes after removing all the clients
-        return routes_removal
+        return self.remove_clients(routes)
 
     def worst_energy_removal_prev(self, routes):
         # reset the removal list to be empty again
@@ -440,9 +364,9 @@ class CustomerRemoval:
 
         for route in routes:
             # for each route, extract the one to one corresponding arrival time
-            departure_energy = self.checker.energy_extractor(route)
+            departure_energy = self.checker.feasible_schedule(route).arrival_energy
             for i in range(len(route)):
-                if route[i] in self.clients:
+                if route[i] in self.client_set:
                     energy_cost[route[i]] = departure_energy[i]
 
         # sort the dict according to the increasing order, since when the smaller is the energy, more is the cost
@@ -454,25 +378,12 @@ class CustomerRemoval:
             random_num = random()
             index = floor((random_num ** self.worst_removal_factor) * gamma)
             # check if the customer corresponding the index is in the removal list or not
-            if sorted_customers[index] in self.removal:
+            if sorted_customers[index] in self.marked:
                 continue
             else:
-                self.removal.append(sorted_customers[index])
-
-        new_routes = []
-
-        for i in range(len(routes)):
-            arr = np.array(routes[i])
-            remove_index = []
-            for j in range(len(routes[i])):
-                if routes[i][j] in self.removal:
-                    remove_index.append(j)
-                    if routes[i][j - 1] in self.original_stations:
-                        remove_index.append(j - 1)
-            new_arr = np.delete(arr, remove_index)
-            new_route = new_arr.tolist()
-            new_routes.append(new_route)
-        return new_routes
+                self.mark(sorted_customers[index])
+
+        return self.remove_clients(routes, neighbour=-1)
 
     def worst_energy_removal_next(self, routes):
         # reset the removal list to be empty again
@@ -485,9 +396,9 @@ class CustomerRemoval:
 
         for route in routes:
             # for each route, extract the one to one corresponding arrival time
-            departure_energy = self.checker.energy_extractor(route)
+            departure_energy = self.checker.feasible_schedule(route).arrival_energy
             for i in range(len(route)):
-                if route[i] in self.clients:
+                if route[i] in self.client_set:
                     energy_cost[route[i]] = departure_energy[i]
 
         # sort the dict according to the increasing order, since when the smaller is the energy, more is the cost
@@ -499,25 +410,12 @@ class CustomerRemoval:
             random_num = random()
             index = floor((random_num ** self.worst_removal_factor) * gamma)
             # check if the customer corresponding the index is in the removal list or not
-            if sorted_customers[index] in self.removal:
+            if sorted_customers[index] in self.marked:
                 continue
             else:
-                self.removal.append(sorted_customers[index])
-
-        new_routes = []
-
-        for i in range(len(routes)):
-            arr = np.array(routes[i])
-            remove_index = []
-            for j in range(len(routes[i])):
-                if routes[i][j] in self.removal:
-                    remove_index.append(j)
-                    if routes[i][j + 1] in self.original_stations:
-                        remove_index.append(j + 1)
-            new_arr = np.delete(arr, remove_index)
-            new_route = new_arr.tolist()
-            new_routes.append(new_route)
-        return new_routes
+                self.mark(sorted_customers[index])
+
+        return self.remove_clients(routes, neighbour=1)
 
     def shaw_removal(self, routes, phi1=0.5, phi2=13, phi3=0.15, phi4=0.25):
         """
@@ -532,7 +430,7 @@ class CustomerRemoval:
 
         # choose a customer randomly from the clients using the random sample method
         # and update the self removal list
-        self.removal = sample(self.clients, 1)
+        self.mark(*sample(self.clients, 1))
         chosen = self.removal[0]
 
         # create a similarity dict to contain all the relatedness between the chosen and the other customers
@@ -540,17 +438,18 @@ class CustomerRemoval:
 
         # first traverse each route in the solution and check if the customer and the chosen one are in the same route
         # for each route in the solution
-        for route in routes:
+        chosen_route = node_positions(routes).get(chosen, (None,))[0]
+        for i, route in enumerate(routes):
             # for each node in the route if the node is a client, check if the chosen one is also in
             # also check if they are the same node, if yes, nothing to operate
             for node in route:
-                if node in self.clients and chosen in route and node != chosen:
+                if node in self.client_set and i == chosen_route and node != chosen:
                     similarity[node] = (
                             phi1 * self.arcs[node, chosen] + phi2 * abs(
                         self.ready_time[node] - self.ready_time[chosen]) - phi3 + phi4 * abs(
                         self.demand[node] - self.demand[chosen])
                     )
-                if node in self.clients and chosen not in route:
+                if node in self.client_set and i != chosen_route:
                     similarity[node] = (
                             phi1 * self.arcs[node, chosen] + phi2 * abs(
                         self.ready_time[node] - self.ready_time[chosen]) + phi3 + phi4 * abs(
@@ -566,22 +465,13 @@ class CustomerRemoval:
             random_num = random()
             index = floor((random_num ** self.shaw_removal_factor) * gamma)
             # check if the customer corresponding the index is in the removal list or not
-            if sorted_customers[index] in self.removal:
+            if sorted_customers[index] in self.marked:
                 continue
             else:
-                self.removal.append(sorted_customers[index])
+                self.mark(sorted_customers[index])
 
         # after get the removal list, we can remove the customers, same procedure as the random removal
-        routes_removal = deepcopy(routes)
-
-        # traverse the feasible solution row by row
-        # for each route in the routes, for each client in removal list, if the client in, remove
-        for i in range(len(routes)):
-            for client in self.removal:
-                if client in routes[i]:
-                    routes_removal[i].remove(client)
-        # return the routes after removing all the clients
-        return routes_removal
+        return self.remove_clients(routes)
 
     def shaw_removal_prev(self, routes, phi1=0.5, phi2=13, phi3=0.15, phi4=0.25):
         # reset the removal list to empty again
@@ -591,7 +481,7 @@ class CustomerRemoval:
 
         # choose a customer randomly from the clients using the random sample method
         # and update the self removal list
-        self.removal = sample(self.clients, 1)
+        self.mark(*sample(self.clients, 1))
         chosen = self.removal[0]
 
         # create a similarity dict to contain all the relatedness between the chosen and the other customers
@@ -599,17 +489,18 @@ class CustomerRemoval:
 
         # first traverse each route in the solution and check if the customer and the chosen one are in the same route
         # for each route in the solution
-        for route in routes:
+        chosen_route = node_positions(routes).get(chosen, (None,))[0]
+        for i, route in enumerate(routes):
             # for each node in the route if the node is a client, check if the chosen one is also in
             # also check if they are the same node, if yes, nothing to operate
             for node in route:
-                if node in self.clients and chosen in route and node != chosen:
+                if node in self.client_set and i == chosen_route and node != chosen:
                     similarity[node] = (
                             phi1 * self.arcs[node, chosen] + phi2 * abs(
                         self.ready_time[node] - self.ready_time[chosen]) - phi3 + phi4 * abs(
                         self.demand[node] - self.demand[chosen])
                     )
-                if node in self.clients and chosen not in route:
+                if node in self.client_set and i != chosen_route:
                     similarity[node] = (
                             phi1 * self.arcs[node, chosen] + phi2 * abs(
                         self.ready_time[node] - self.ready_time[chosen]) + phi3 + phi4 * abs(
@@ -625,25 +516,12 @@ class CustomerRemoval:
             random_num = random()
             index = floor((random_num ** self.shaw_removal_factor) * gamma)
             # check if the customer corresponding the index is in the removal list or not
-            if sorted_customers[index] in self.removal:
+            if sorted_customers[index] in self.marked:
                 continue
             else:
-                self.removal.append(sorted_customers[index])
-
-        new_routes = []
-
-        for i in range(len(routes)):
-            arr = np.array(routes[i])
-            remove_index = []
-            for j in range(len(routes[i])):
-                if routes[i][j] in self.removal:
-                    remove_index.append(j)
-                    if routes[i][j - 1] in self.original_stations:
-                        remove_index.append(j - 1)
-            new_arr = np.delete(arr, remove_index)
-            new_route = new_arr.tolist()
-            new_routes.append(new_route)
-        return new_routes
+                self.mark(sorted_customers[index])
+
+        return self.remove_clients(routes, neighbour=-1)
 
     def shaw_removal_next(self, routes, phi1=0.5, phi2=13, phi3=0.15, phi4=0.25):
         # reset the removal list to empty again
@@ -653,7 +531,7 @@ class CustomerRemoval:
 
         # choose a customer randomly from the clients using the random sample method
         # and update the self removal list
-        self.removal = sample(self.clients, 1)
+        self.mark(*sample(self.clients, 1))
         chosen = self.removal[0]
 
         # create a similarity dict to contain all the relatedness between the chosen and the other customers
@@ -661,17 +539,18 @@ class CustomerRemoval:
 
         # first traverse each route in the solution and check if the customer and the chosen one are in the same route
         # for each route in the solution
-        for route in routes:
+        chosen_route = node_positions(routes).get(chosen, (None,))[0]
+        for i, route in enumerate(routes):
             # for each node in the route if the node is a client, check if the chosen one is also in
             # also check if they are the same node, if yes, nothing to operate
             for node in route:
-                if node in self.clients and chosen in route and node != chosen:
+                if node in self.client_set and i == chosen_route and node != chosen:
                     similarity[node] = (
                             phi1 * self.arcs[node, chosen] + phi2 * abs(
                         self.ready_time[node] - self.ready_time[chosen]) - phi3 + phi4 * abs(
                         self.demand[node] - self.demand[chosen])
                     )
-                if node in self.clients and chosen not in route:
+                if node in self.client_set and i != chosen_route:
                     similarity[node] = (
                             phi1 * self.arcs[node, chosen] + phi2 * abs(
                         self.ready_time[node] - self.ready_time[chosen]) + phi3 + phi4 * abs(
@@ -687,25 +566,12 @@ class CustomerRemoval:
             random_num = random()
             index = floor((random_num ** self.shaw_removal_factor) * gamma)
             # check if the customer corresponding the index is in the removal list or not
-            if sorted_customers[index] in self.removal:
+            if sorted_customers[index] in self.marked:
                 continue
             else:
-                self.removal.append(sorted_customers[index])
-
-        new_routes = []
-
-        for i in range(len(routes)):
-            arr = np.array(routes[i])
-            remove_index = []
-            for j in range(len(routes[i])):
-                if routes[i][j] in self.removal:
-                    remove_index.append(j)
-                    if routes[i][j + 1] in self.original_stations:
-                        remove_index.append(j + 1)
-            new_arr = np.delete(arr, remove_index)
-            new_route = new_arr.tolist()
-            new_routes.append(new_route)
-        return new_routes
+                self.mark(sorted_customers[index])
+
+        return self.remove_clients(routes, neighbour=1)
 
     def proximity_removal(self, routes):
         """
@@ -743,6 +609,20 @@ class CustomerRemoval:
     def demand_removal_next(self, routes):
         return self.shaw_removal_next(routes, phi1=0, phi2=0, phi3=0, phi4=1)
 
+    def zone_clients(self, routes):
+        """
+        This is the function to choose a random zone with clients in the routes
+        :param routes: routes of the solution
+        :return: the clients of the zone in the routes, ordered by route and position
+        """
+        positions = node_positions(routes)
+        # a random order of the occupied zones, the first one with a routed client is chosen
+        for index in sample(self.zone_grid.occupied, len(self.zone_grid.occupied)):
+            clients = [client for client in self.zone_grid.clients(index) if client in positions]
+            if clients:
+                return sorted(clients, key=positions.get)
+        return []
+
     def zone_removal(self, routes):
         """
         This is the function to remove a bunch of customers in the same zone
@@ -750,145 +630,29 @@ class CustomerRemoval:
         # reset the removal list
         self.reset_removal()
 
-        # find the bound of the all the graph (not only customers, but all nodes)
-        x_lower = min(values[0] for location, values in self.locations.items())
-        x_upper = max(values[0] for location, values in self.locations.items())
-        y_lower = min(values[1] for location, values in self.locations.items())
-        y_upper = max(values[1] for location, values in self.locations.items())
-
-        # split into smaller zones based on the coordinates
-        # first decide the increments
-        x_increment = (ceil(x_upper) - floor(x_lower)) / self.increment
-        y_increment = (ceil(y_upper) - floor(y_lower)) / self.increment
-
-        zones = []
-
-        for i in range(floor(x_lower), ceil(x_upper), ceil(x_increment)):
-            for j in range(floor(y_lower), ceil(y_upper), ceil(y_increment)):
-                zones.append((i, i + x_increment, j, j + y_increment))
-
-        # randomly select a zone and remove the customers inside, if the zone has no customer, continue to next
-        while not self.removal:
-            removal_zone = sample(zones, 1)
-
-            for route in routes:
-                for node in route:
-                    if (
-                            node in self.clients and removal_zone[0][0] <= self.locations[node][0] <= removal_zone[0][
-                        1] and
-                            removal_zone[0][2] <= self.locations[node][1] <= removal_zone[0][3]
-                    ):
-                        self.removal.append(node)
+        # randomly select a zone among the ones with clients, and remove its clients in the order of the routes
+        self.mark(*self.zone_clients(routes))
 
         # after get the removal list, we can remove the customers, same procedure as the random removal
-        routes_removal = deepcopy(routes)
-
-        # traverse the feasible solution row by row
-        # for each route in the routes, for each client in removal list, if the client in, remove
-        for i in range(len(routes)):
-            for client in self.removal:
-                if client in routes[i]:
-                    routes_removal[i].remove(client)
-        # return the routes after removing all the clients
-        return routes_removal
+        return self.remove_clients(routes)
 
     def zone_removal_prev(self, routes):
         # reset the removal list
         self.reset_removal()
 
-        # find the bound of the all the graph (not only customers, but all nodes)
-        x_lower = min(values[0] for location, values in self.locations.items())
-        x_upper = max(values[0] for location, values in self.locations.items())
-        y_lower = min(values[1] for location, values in self.locations.items())
-        y_upper = max(values[1] for location, values in self.locations.items())
-
-        # split into smaller zones based on the coordinates
-        # first decide the increments
-        x_increment = (ceil(x_upper) - floor(x_lower)) / self.increment
-        y_increment = (ceil(y_upper) - floor(y_lower)) / self.increment
-
-        zones = []
-
-        for i in range(floor(x_lower), ceil(x_upper), ceil(x_increment)):
-            for j in range(floor(y_lower), ceil(y_upper), ceil(y_increment)):
-                zones.append((i, i + x_increment, j, j + y_increment))
-
-        # randomly select a zone and remove the customers inside, if the zone has no customer, continue to next
-        while not self.removal:
-            removal_zone = sample(zones, 1)
-
-            for route in routes:
-                for node in route:
-                    if (
-                            node in self.clients and removal_zone[0][0] <= self.locations[node][0] <= removal_zone[0][
-                        1] and
-                            removal_zone[0][2] <= self.locations[node][1] <= removal_zone[0][3]
-                    ):
-                        self.removal.append(node)
-
-        new_routes = []
-
-        for i in range(len(routes)):
-            arr = np.array(routes[i])
-            remove_index = []
-            for j in range(len(routes[i])):
-                if routes[i][j] in self.removal:
-                    remove_index.append(j)
-                    if routes[i][j - 1] in self.original_stations:
-                        remove_index.append(j - 1)
-            new_arr = np.delete(arr, remove_index)
-            new_route = new_arr.tolist()
-            new_routes.append(new_route)
-        return new_routes
+        # randomly select a zone among the ones with clients, and remove its clients in the order of the routes
+        self.mark(*self.zone_clients(routes))
+
+        return self.remove_clients(routes, neighbour=-1)
 
     def zone_removal_next(self, routes):
         # reset the removal list
         self.reset_removal()
 
-        # find the bound of the all the graph (not only customers, but all nodes)
-        x_lower = min(values[0] for location, values in self.locations.items())
-        x_upper = max(values[0] for location, values in self.locations.items())
-        y_lower = min(values[1] for location, values in self.locations.items())
-        y_upper = max(values[1] for location, values in self.locations.items())
-
-        # split into smaller zones based on the coordinates
-        # first decide the increments
-        x_increment = (ceil(x_upper) - floor(x_lower)) / self.increment
-        y_increment = (ceil(y_upper) - floor(y_lower)) / self.increment
-
-        zones = []
-
-        for i in range(floor(x_lower), ceil(x_upper), ceil(x_increment)):
-            for j in range(floor(y_lower), ceil(y_upper), ceil(y_increment)):
-                zones.append((i, i + x_increment, j, j + y_increment))
-
-        # randomly select a zone and remove the customers inside, if the zone has no customer, continue to next
-        while not self.removal:
-            removal_zone = sample(zones, 1)
-
-            for route in routes:
-                for node in route:
-                    if (
-                            node in self.clients and removal_zone[0][0] <= self.locations[node][0] <= removal_zone[0][
-                        1] and
-                            removal_zone[0][2] <= self.locations[node][1] <= removal_zone[0][3]
-                    ):
-                        self.removal.append(node)
-
-        new_routes = []
-
-        for i in range(len(routes)):
-            arr = np.array(routes[i])
-            remove_index = []
-            for j in range(len(routes[i])):
-                if routes[i][j] in self.removal:
-                    remove_index.append(j)
-                    if routes[i][j + 1] in self.original_stations:
-                        remove_index.append(j + 1)
-            new_arr = np.delete(arr, remove_index)
-            new_route = new_arr.tolist()
-            new_routes.append(new_route)
-        return new_routes
+        # randomly select a zone among the ones with clients, and remove its clients in the order of the routes
+        self.mark(*self.zone_clients(routes))
+
+        return self.remove_clients(routes, neighbour=1)
 
     def random_route_removal_RRR(self, routes):
         """
@@ -905,11 +669,11 @@ class CustomerRemoval:
         # update the removal list of clients
         for route in routes_removed:
             for node in route:
-                if node in self.clients:
-                    self.removal.append(node)
+                if node in self.client_set:
+                    self.mark(node)
 
-        # remove the routes to be removed
-        routes_copy = deepcopy(routes)
+        # remove the routes to be removed, the other route lists are shared
+        routes_copy = copy_routes(routes)
         for route in routes_removed:
             routes_copy.remove(route)
 
@@ -926,13 +690,16 @@ class CustomerRemoval:
         omega = ceil(uniform(self.routes_number_lower * len(routes), self.mr * len(routes)))
 
         # sort the routes according to the increasing order of the number of clients
-        sorted_routes = sorted(routes, key=lambda route: sum(node in self.clients for node in route))
+        sorted_routes = sorted(routes, key=lambda route: sum(node in self.client_set for node in route))
         routes_removed = sorted_routes[:omega]
 
         # update the removal list of clients
         for route in routes_removed:
             for node in route:
-                if node in self.clients:
-                    self.removal.append(node)
+                if node in self.client_set:
+                    self.mark(node)
 
+        # the routes are in a new order, a solution gets a new position index
+        if isinstance(routes, Solution):
+            return Solution(sorted_routes[omega:], self.helper, routes)
         return sorted_routes[omega:]
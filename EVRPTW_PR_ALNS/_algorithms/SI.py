@@ -1,24 +1,64 @@
-from EVRPTW_PR_ALNS.mip_check import MIPCheck
-from EVRPTW_PR_ALNS.helper_function import Helper
+from EVRPTW_PR_ALNS.context import InstanceContext
+from EVRPTW_PR_ALNS.file_reader import DEPOT_END
+from EVRPTW_PR_ALNS.route_cache import RouteCache
+from functools import wraps
+
+
+def memoized(repair):
+    """
+    Decorator of the station insertion methods, the repair of a route already seen is answered from the repair cache
+    :param repair: method of StationInsertion taking a route and returning the repaired route or the argument
+    :return: the method going through the cache, keyed by the method name, the backend and the route fingerprint
+    """
+    @wraps(repair)
+    def lookup(self, route):
+        key = (repair.__name__, self.checker.backend, RouteCache.fingerprint(route))
+        # stored as a tuple, every caller gets its own list
+        return list(self.repairs.lookup(key, lambda: tuple(repair(self, route))))
+    return lookup
 
 
 class StationInsertion:
-    def __init__(self, parameters):
+    def __init__(self, context):
         """
         Collection of station insertion _algorithms
-        :param parameters: parameters of a graph instance
+        :param context: InstanceContext of the instance, or its parameter dict
         """
-        self.parameters = parameters
-        self.Q = self.parameters["Q"]
-        self.depot_start = self.parameters["depot_start"]
-        self.original_stations = self.parameters["original_stations"]
-        self.clients = self.parameters["clients"]
-        self.arcs = self.parameters["arcs"]
-        self.h = self.parameters["h"]
-        self.checker = MIPCheck(self.parameters)
-        self.helper = Helper(self.parameters)
+        context = InstanceContext.of(context)
+        self.context = context
+        self.parameters = context.parameters
+        self.Q = context.Q
+        self.depot_start = context.depot_start
+        self.original_stations = context.original_stations
+        self.client_set = context.client_set
+        self.original_station_set = context.original_station_set
+        self.recharge_set = context.recharge_set
+        self.station_table = context.station_table
+        self.node_index = context.node_index
+        # repaired routes of every station insertion method, shared by the StationInsertion of the context
+        self.repairs = context.repair_cache
+        self.clients = context.clients
+        self.arcs = context.arcs
+        self.h = context.h
+        self.checker = context.checker
+        self.helper = context.helper
+
+    def station_insertion(self, route, position):
+        """
+        This is the function to insert at a position the station of least detour which makes the route feasible
+        :param route: list of nodes
+        :param position: index of the station in the new route, between route[position - 1] and route[position]
+        :return: the new route, None if no station insertion at this position is feasible
+        """
+        # the stations come by increasing detour, so the first feasible new route is the one of min distance
+        for station in self.station_table.candidates(route[position - 1], route[position]):
+            new_route = route[:position] + [station] + route[position:]
+            if self.checker.time_energy(new_route):
+                return new_route
+        return None
 
     # find the first negative customer, backward until reaches a station or depot_start
+    @memoized
     def greedy_station_insertion(self, route):
         """
         This is the function to repair the route using station insertion
@@ -36,7 +76,7 @@ class StationInsertion:
 
         arrival_energy = self.Q
         for i in range(len(route)):
-            if route[i] in self.depot_start + self.original_stations:
+            if route[i] in self.recharge_set:
                 arrival_energy = self.Q
             else:
                 arrival_energy -= self.h * self.arcs[route[i - 1], route[i]]
@@ -49,21 +89,13 @@ class StationInsertion:
                     # check if in this arc the predecessor is depot_start or station, if yes return infeasible route
                     # in theory this will never happen because of assumption one station is sufficient to any
                     # will never happen that after one station or depot_station, the customer arrival energy is negative
-                    if route[i - k - 1] in self.depot_start + self.original_stations:
+                    if route[i - k - 1] in self.recharge_set:
                         return route
                     # else we get all possible station insertion at this arc and see whether there is feasible
                     else:
-                        # here we don't directly use min since if there is no feasible, the min will give warning
-                        candidates = []
-                        for station in self.original_stations:
-                            candidates.append(route[:i - k] + [station] + route[i - k:])
-
-                        # check whether there is feasible, if there is, find the best insertion
-                        if any(self.checker.time_energy(candidate) for candidate in candidates):
-                            new_route = min(
-                                candidates, key=lambda candidate: self.helper.distance_one_route(
-                                    candidate) if self.checker.time_energy(candidate) else float("inf")
-                            )
+                        # the best feasible insertion at this arc, if there is one
+                        new_route = self.station_insertion(route, i - k)
+                        if new_route is not None:
                             return new_route
                         # if there is no feasible station insertion at this arc, continue to the previous arc
                         else:
@@ -73,6 +105,7 @@ class StationInsertion:
         return route
 
     # find the first negative customer, compare two arcs, if neither feasible use GSI / GSI-sn instead
+    @memoized
     def greedy_station_insertion_comparison(self, route):
         """
         Compare the arc leading to the negative customer and the previous arc
@@ -87,7 +120,7 @@ class StationInsertion:
 
         arrival_energy = self.Q
         for i in range(len(route)):
-            if route[i] in self.depot_start + self.original_stations:
+            if route[i] in self.recharge_set:
                 arrival_energy = self.Q
             else:
                 arrival_energy -= self.h * self.arcs[route[i - 1], route[i]]
@@ -101,22 +134,12 @@ class StationInsertion:
                 # or there should not be any depot_start or stations in the three nodes
 
                 # if we cannot compare because impossible to insert in either arc, we use GSI above
-                if not (i >= 2 and route[i - 1] in self.clients and route[i - 2] in self.clients):
+                if not (i >= 2 and route[i - 1] in self.client_set and route[i - 2] in self.client_set):
                     return self.greedy_station_insertion(route)
                 # else, we find the two minimum at the two arcs
                 else:
-                    insertion1 = min(
-                        self.original_stations,
-                        key=lambda station: self.arcs[station, route[i - 1]] + self.arcs[
-                            station, route[i]] -
-                                            self.arcs[route[i - 1], route[i]]
-                    )
-                    insertion2 = min(
-                        self.original_stations,
-                        key=lambda station: self.arcs[station, route[i - 2]] + self.arcs[
-                            station, route[i - 1]] -
-                                            self.arcs[route[i - 2], route[i - 1]]
-                    )
+                    insertion1 = self.station_table.nearest(route[i - 1], route[i])
+                    insertion2 = self.station_table.nearest(route[i - 2], route[i - 1])
                     new_route1 = route[:i] + [insertion1] + route[i:]
                     new_route2 = route[:i - 1] + [insertion2] + route[i - 1:]
 
@@ -141,6 +164,7 @@ class StationInsertion:
         return route
 
     # find the first negative node, compare all arcs, if infeasible use GSI / GSI-sn instead
+    @memoized
     def greedy_station_insertion_comparison_all(self, route):
         """
         General and improved form of greedy_station_insertion_comparison
@@ -159,7 +183,7 @@ class StationInsertion:
             else:
                 arrival_energy = departure_energy - self.h * self.arcs[route[i - 1], route[i]]
 
-            if route[i] in self.depot_start + self.original_stations:
+            if route[i] in self.recharge_set:
                 departure_energy = self.Q
             else:
                 departure_energy = arrival_energy
@@ -171,11 +195,7 @@ class StationInsertion:
                 candidates = []
                 for k in range(i):
                     # for each arc, we find the min on this arc, without making sure this is the feasible one
-                    best_insertion = min(
-                        self.original_stations,
-                        key=lambda insertion: self.arcs[route[i-k], insertion] + self.arcs[route[i-k-1], insertion] -
-                                              self.arcs[route[i-k], route[i-k-1]]
-                    )
+                    best_insertion = self.station_table.nearest(route[i - k - 1], route[i - k])
                     candidates.append(route[:i-k] + [best_insertion] + route[i-k:])
                 if any(self.helper.feasible_route(candidate) for candidate in candidates):
                     return min(candidates, key=lambda candidate: self.helper.distance_one_route(candidate))
@@ -186,6 +206,7 @@ class StationInsertion:
         return route
 
     # find the first negative customer, backwards until reaches a station or depot_start, find the min feasible
+    @memoized
     def best_station_insertion(self, route):
         """
         Strong version of greedy insertion algorithm
@@ -202,7 +223,7 @@ class StationInsertion:
 
         arrival_energy = self.Q
         for i in range(len(route)):
-            if route[i] in self.depot_start + self.original_stations:
+            if route[i] in self.recharge_set:
                 arrival_energy = self.Q
             else:
                 arrival_energy -= self.h * self.arcs[route[i - 1], route[i]]
@@ -216,21 +237,13 @@ class StationInsertion:
                 for k in range(i):
                     # from the definition above, the index must be larger or equal to 1, no need to check
                     # we traverse the arcs until we reach a station or the depot_start
-                    if route[i - k - 1] in self.depot_start + self.original_stations:
+                    if route[i - k - 1] in self.recharge_set:
                         break
                     # else we get the min feasible distance on this arc
                     else:
-                        # create the list to contain all routes after station insertion
-                        all_feasible = []
-                        for station in self.original_stations:
-                            all_feasible.append(route[:i - k] + [station] + route[i - k:])
-                        # check if there is feasible or not
-                        # if there is feasible, we find the min
-                        if any(self.checker.time_energy(new_route) for new_route in all_feasible):
-                            candidate = min(
-                                all_feasible, key=lambda candidate: self.helper.distance_one_route(
-                                    candidate) if self.checker.time_energy(candidate) else float("inf")
-                            )
+                        # the min feasible distance on this arc, if there is feasible
+                        candidate = self.station_insertion(route, i - k)
+                        if candidate is not None:
                             candidates.append(candidate)
                         # if there is no feasible, we continue to the next arc
                         else:
@@ -245,6 +258,7 @@ class StationInsertion:
         return route
 
     # find the first negative node, backwards until the start, more general way to get a feasible and include more
+    @memoized
     def greedy_station_insertion_sn(self, route):
         """
         This is the function to repair the route using station insertion finding the first negative including stations
@@ -265,7 +279,7 @@ class StationInsertion:
             else:
                 arrival_energy = departure_energy - self.h * self.arcs[route[i - 1], route[i]]
 
-            if route[i] in self.depot_start + self.original_stations:
+            if route[i] in self.recharge_set:
                 departure_energy = self.Q
             else:
                 departure_energy = arrival_energy
@@ -275,16 +289,9 @@ class StationInsertion:
                 # start the insertion process
                 # track the current arc and prepare to track all arcs before a station or depot_start
                 for k in range(i):
-                    candidates = []
-                    for station in self.original_stations:
-                        candidates.append(route[:i - k] + [station] + route[i - k:])
-
-                    # check whether there is feasible, if there is, find the best insertion
-                    if any(self.checker.time_energy(candidate) for candidate in candidates):
-                        new_route = min(
-                            candidates, key=lambda candidate: self.helper.distance_one_route(
-                                candidate) if self.checker.time_energy(candidate) else float("inf")
-                        )
+                    # the best feasible insertion at this arc, if there is one
+                    new_route = self.station_insertion(route, i - k)
+                    if new_route is not None:
                         return new_route
                     # if there is no feasible station insertion at this arc, continue to the previous arc
                     else:
@@ -294,6 +301,7 @@ class StationInsertion:
         return route
 
     # find the first negative node, backwards until the start, find the min feasible throughout all arcs searched
+    @memoized
     def best_station_insertion_sn(self, route):
         """
         This is the modified version of the best station insertion, find the first negative and backwards until start
@@ -314,7 +322,7 @@ class StationInsertion:
             else:
                 arrival_energy = departure_energy - self.h * self.arcs[route[i - 1], route[i]]
 
-            if route[i] in self.depot_start + self.original_stations:
+            if route[i] in self.recharge_set:
                 departure_energy = self.Q
             else:
                 departure_energy = arrival_energy
@@ -327,17 +335,9 @@ class StationInsertion:
                 # this is for traverse all arcs
                 for k in range(i):
 
-                    # create the list to contain all routes after station insertion
-                    all_feasible = []
-                    for station in self.original_stations:
-                        all_feasible.append(route[:i - k] + [station] + route[i - k:])
-                    # check if there is feasible or not
-                    # if there is feasible, we find the min
-                    if any(self.checker.time_energy(new_route) for new_route in all_feasible):
-                        candidate = min(
-                            all_feasible, key=lambda candidate: self.helper.distance_one_route(
-                                candidate) if self.checker.time_energy(candidate) else float("inf")
-                        )
+                    # the min feasible distance on this arc, if there is feasible
+                    candidate = self.station_insertion(route, i - k)
+                    if candidate is not None:
                         candidates.append(candidate)
                     # if there is no feasible, we continue to the next arc
                     else:
@@ -351,6 +351,67 @@ class StationInsertion:
                 break
             return route
 
+    # dynamic programming over all arcs, the feasible station insertions of least total detour
+    @memoized
+    def dynamic_station_insertion(self, route):
+        """
+        This is the function to repair the route with the set of station insertions of least total detour, any number
+        of stations, at most one per arc of the route. The labels of the route are extended arc by arc, directly or
+        through each station of the arc, and only the states which no other state beats in detour, number of stations
+        and label are kept, so the repair is exact without solving any LP
+        :param route: list of nodes, its nodes and their order are kept
+        :return: the repaired route or the argument if no station insertion makes it feasible
+        """
+
+        if self.helper.feasible_route(route):
+            return route
+
+        labels = self.checker.labels
+        ids = labels.ids(route)
+        rows = self.arcs.rows
+        start = labels.start_label(ids[0])
+        if start is None:
+            return route
+
+        # a state is (detour, number of stations, label, inserted stations as (position, station))
+        states = [(0.0, 0, start, ())]
+        for k in range(len(ids) - 1):
+            i, j = ids[k], ids[k + 1]
+            if labels.node_type[i] == DEPOT_END:
+                break
+            extended = []
+            for detour, count, label, inserted in states:
+                direct = labels.extend(label, i, j)
+                if direct is not None:
+                    extended.append((detour, count, direct, inserted))
+                for station in self.station_table.candidates(route[k], route[k + 1]):
+                    s = self.node_index[station]
+                    at_station = labels.extend(label, i, s)
+                    if at_station is None:
+                        continue
+                    after = labels.extend(at_station, s, j)
+                    if after is not None:
+                        extended.append((
+                            detour + rows[i][s] + rows[s][j] - rows[i][j], count + 1, after,
+                            inserted + ((k + 1, station),)
+                        ))
+
+            # by increasing detour, a state is kept unless a kept one has no more stations and a dominating label
+            extended.sort(key=lambda state: (state[0], state[1]))
+            states = []
+            for state in extended:
+                if not any(kept[1] <= state[1] and labels.dominates(kept[2], state[2]) for kept in states):
+                    states.append(state)
+            if not states:
+                return route
+
+        # the first state has the least detour, insert its stations from the last one so the positions hold
+        new_route = route[:]
+        for position, station in reversed(states[0][3]):
+            new_route.insert(position, station)
+        return new_route
+
+    @memoized
     def supplement_station_insertion(self, route):
         """
         This is a station insertion function to perfectly repair a route
@@ -384,29 +445,19 @@ class StationInsertion:
                     else:
                         arrival_energy = departure_energy - self.h * self.arcs[route[i - 1], route[i]]
 
-                    if route[i] in self.depot_start + self.original_stations:
+                    if route[i] in self.recharge_set:
                         departure_energy = self.Q
                     else:
                         departure_energy = arrival_energy
 
                     if arrival_energy < 0:
                         # if the insertion location is right after depot_start or before the depot_end
+                        # S0 is not searched there
                         if route_copy[i] == "D0_end" or route_copy[i-1] == "D0":
-                            stations_search = self.original_stations[:]
-                            if "S0" in self.original_stations:
-                                stations_search.remove("S0")
-                            insertion = min(
-                                stations_search,
-                                key=lambda station: self.arcs[route[i], station] + self.arcs[route[i - 1], station] -
-                                                    self.arcs[route[i], route[i - 1]]
-                            )
+                            insertion = self.station_table.nearest(route[i - 1], route[i], exclude=("S0",))
                             route = route[:i] + [insertion] + route[i:]
                         else:
-                            insertion = min(
-                                self.original_stations,
-                                key=lambda station: self.arcs[route[i], station] + self.arcs[route[i - 1], station] -
-                                                    self.arcs[route[i], route[i - 1]]
-                            )
+                            insertion = self.station_table.nearest(route[i - 1], route[i])
                             route = route[:i] + [insertion] + route[i:]
                         # we find the first negative, so break the loop
                         break
@@ -1,40 +1,62 @@
-from EVRPTW_PR_ALNS.mip_check import MIPCheck
-from EVRPTW_PR_ALNS.helper_function import Helper
+from EVRPTW_PR_ALNS.context import InstanceContext
+from EVRPTW_PR_ALNS.solution import copy_routes, remove_nodes
 from math import ceil
 from random import uniform, sample
 
 
 class StationRemoval():
-    def __init__(self, parameters):
+    def __init__(self, context):
         """
         This is a constructor to create a station removal object
-        :param parameters: parameters got from a file reader from an instance
+        :param context: InstanceContext of the instance, or its parameter dict
         """
-        self.parameters = parameters
-        self.checker = MIPCheck(self.parameters)
-        self.helper = Helper(self.parameters)
-        self.clients = self.parameters["clients"]
-        self.stations = self.parameters["stations"]
-        self.all_nodes = self.parameters["all_nodes"]
-        self.depot_start = self.parameters["depot_start"]
-        self.depot_end = self.parameters["depot_end"]
-        self.demand = self.parameters["demand"]
-        self.ready_time = self.parameters["ready_time"]
-        self.due_date = self.parameters["due_date"]
-        self.service_time = self.parameters["service_time"]
-        self.arcs = self.parameters["arcs"]
-        self.times = self.parameters["times"]
-        self.final_data = self.parameters["final_data"]
-        self.original_stations = self.parameters["original_stations"]
-        self.Q = self.parameters["Q"]
-        self.C = self.parameters["C"]
-        self.g = self.parameters["g"]
-        self.h = self.parameters["h"]
-        self.v = self.parameters["v"]
+        context = InstanceContext.of(context)
+        self.context = context
+        self.parameters = context.parameters
+        self.checker = context.checker
+        self.helper = context.helper
+        self.clients = context.clients
+        self.stations = context.stations
+        self.all_nodes = context.all_nodes
+        self.depot_start = context.depot_start
+        self.depot_end = context.depot_end
+        self.demand = context.demand
+        self.ready_time = context.ready_time
+        self.due_date = context.due_date
+        self.service_time = context.service_time
+        self.arcs = context.arcs
+        self.times = context.times
+        self.final_data = context.final_data
+        self.original_stations = context.original_stations
+        self.original_station_set = context.original_station_set
+        self.Q = context.Q
+        self.C = context.C
+        self.g = context.g
+        self.h = context.h
+        self.v = context.v
         # define the tuned parameters before start the _algorithms
         self.lower = 0.1
         self.upper = 0.4
 
+    def remove_stations(self, routes, removal_stations):
+        """
+        This is the function to remove the stations at the given indices, the edits go to a copy of the routes
+        :param routes: routes of the solution, not changed
+        :param removal_stations: (route index, position) of the stations to be removed
+        :return: the copy, the routes without removed station are the same list objects as in the argument, a Solution
+        shifts the positions of the clients after the removed stations in its index
+        """
+        # mark the positions to be removed route by route, a set each instead of scanning the list of indices
+        removed = {}
+        for i, j in removal_stations:
+            removed.setdefault(i, set()).add(j)
+
+        # rebuild only the touched routes, share the others
+        edited = copy_routes(routes)
+        for i, indexes in removed.items():
+            remove_nodes(edited, i, indexes)
+        return edited
+
     def random_removal(self, routes):
         """
         This is the function to randomly remove some stations in routes
@@ -46,7 +68,7 @@ class StationRemoval():
         counter_stations = 0
         for route in routes:
             for node in route:
-                if node in self.original_stations:
+                if node in self.original_station_set:
                     counter_stations += 1
 
         # get the upper and lower
@@ -58,24 +80,14 @@ class StationRemoval():
         index_stations = []
         for i in range(len(routes)):
             for j in range(len(routes[i])):
-                if routes[i][j] in self.original_stations:
+                if routes[i][j] in self.original_station_set:
                     index_stations.append((i, j))
 
         # sample to get random removed stations indices
         removal_stations = sample(index_stations, sigma)
 
         # then we remove the stations
-        new_routes = []
-        for i in range(len(routes)):
-            new_route = []
-            for j in range(len(routes[i])):
-                if (i, j) in removal_stations:
-                    continue
-                else:
-                    new_route.append(routes[i][j])
-            new_routes.append(new_route)
-
-        return new_routes
+        return self.remove_stations(routes, removal_stations)
 
     def worst_distance_removal(self, routes):
         """
@@ -86,7 +98,7 @@ class StationRemoval():
         counter_stations = 0
         for route in routes:
             for node in route:
-                if node in self.original_stations:
+                if node in self.original_station_set:
                     counter_stations += 1
 
         # get the upper and lower
@@ -98,7 +110,7 @@ class StationRemoval():
         distance_stations = {}
         for i in range(len(routes)):
             for j in range(len(routes[i])):
-                if routes[i][j] in self.original_stations:
+                if routes[i][j] in self.original_station_set:
                     distance_stations[(i,j)] = (self.arcs[routes[i][j-1], routes[i][j]] +
                                                 self.arcs[routes[i][j+1], routes[i][j]])
 
@@ -109,17 +121,7 @@ class StationRemoval():
         removal_stations = sorted_stations[:sigma+1]
 
         # then we remove the stations
-        new_routes = []
-        for i in range(len(routes)):
-            new_route = []
-            for j in range(len(routes[i])):
-                if (i, j) in removal_stations:
-                    continue
-                else:
-                    new_route.append(routes[i][j])
-            new_routes.append(new_route)
-
-        return new_routes
+        return self.remove_stations(routes, removal_stations)
 
     def worst_charge_removal(self, routes):
         """
@@ -130,7 +132,7 @@ class StationRemoval():
         counter_stations = 0
         for route in routes:
             for node in route:
-                if node in self.original_stations:
+                if node in self.original_station_set:
                     counter_stations += 1
 
         # get the upper and lower
@@ -141,9 +143,9 @@ class StationRemoval():
         # create a dict to contain all arrival energy of the stations
         energy_cost = {}
         for i in range(len(routes)):
-            arrival_energy = self.checker.energy_extractor(routes[i])
+            arrival_energy = self.checker.feasible_schedule(routes[i]).arrival_energy
             for j in range(len(routes[i])):
-                if routes[i][j] in self.original_stations:
+                if routes[i][j] in self.original_station_set:
                     energy_cost[(i, j)] = arrival_energy[j]
 
         # sorted the stations from high arrival energy to low, since high energy arrival means high cost
@@ -153,17 +155,7 @@ class StationRemoval():
         removal_stations = sorted_stations[:sigma + 1]
 
         # then we remove the stations
-        new_routes = []
-        for i in range(len(routes)):
-            new_route = []
-            for j in range(len(routes[i])):
-                if (i, j) in removal_stations:
-                    continue
-                else:
-                    new_route.append(routes[i][j])
-            new_routes.append(new_route)
-
-        return new_routes
+        return self.remove_stations(routes, removal_stations)
 
     def full_removal(self, routes):
         """
@@ -174,7 +166,7 @@ class StationRemoval():
         counter_stations = 0
         for route in routes:
             for node in route:
-                if node in self.original_stations:
+                if node in self.original_station_set:
                     counter_stations += 1
 
         # get the upper and lower
@@ -185,33 +177,15 @@ class StationRemoval():
         # create a list to store the index of all full recharge stations
         removal_stations = []
         for i in range(len(routes)):
-            departure_energy = self.checker.energy_extractor_departure(routes[i])
+            departure_energy = self.checker.feasible_schedule(routes[i]).departure_energy
             for j in range(len(routes[i])):
-                if routes[i][j] in self.original_stations:
+                if routes[i][j] in self.original_station_set:
                     if departure_energy[j] == self.Q:
                         removal_stations.append((i, j))
 
         # then we remove the stations
         # first we test if the number of the full charge stations is greater than sigma
         # if smaller or equal, we remove them all, otherwise we randomly remove sigma
-        new_routes = []
         if len(removal_stations) <= sigma:
-            for i in range(len(routes)):
-                new_route = []
-                for j in range(len(routes[i])):
-                    if (i, j) in removal_stations:
-                        continue
-                    else:
-                        new_route.append(routes[i][j])
-                new_routes.append(new_route)
-        else:
-            new_removal_stations = sample(removal_stations, sigma)
-            for i in range(len(routes)):
-                new_route = []
-                for j in range(len(routes[i])):
-                    if (i, j) in new_removal_stations:
-                        continue
-                    else:
-                        new_route.append(routes[i][j])
-                new_routes.append(new_route)
-        return new_routes
+            return self.remove_stations(routes, removal_stations)
+        return self.remove_stations(routes, sample(removal_stations, sigma))
@@ -0,0 +1,187 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+"""
+This file contains the batch runner solving instances of _instances in a worker pool, it writes the result rows and
+the routes to an output folder given by the user as the jobs finish and skips the instances already in the results
+"""
+
+PACKAGE = os.path.dirname(os.path.abspath(__file__))
+SOLVERS = ("ALNS", "milp_model")
+# columns of the result files created by the runner, an existing file keeps its own header
+COLUMNS = {"ALNS": ["name", "distance", "vehicle", "distance2", "vehicle2", "duration"],
+           "milp_model": ["name", "distance", "vehicle", "solving time"]}
+PREFIXES = {"ALNS": "ALNS", "milp_model": "MILP"}
+
+
+def instance_group(name: str) -> str:
+    """
+    This is the function to get the size group of an instance, the suffix of the result files and route folders
+    :param name: instance name without extension, for example c101C10 or c101_21
+    :return: C5, C10, C15 for the small instances and C100 for the others
+    """
+    match = re.search(r"C(\d+)$", name)
+    return "C" + match.group(1) if match else "C100"
+
+
+def result_file(results_dir: str, solver: str, group: str) -> str:
+    """
+    This is the function to get the result file of a solver and a group
+    :param results_dir: folder of the result files
+    :param solver: ALNS or milp_model
+    :param group: size group of the instances
+    :return: path of the csv file
+    """
+    return os.path.join(results_dir, f"{PREFIXES[solver]}_{group}.csv")
+
+
+def read_header(file: str):
+    """
+    This is the function to get the header and the solved instance names of a result file
+    :param file: path of the csv file
+    :return: header list, None if the file is missing or has no name column, and the set of names in the first column
+    """
+    if not os.path.exists(file):
+        return None, set()
+    with open(file, newline='') as handle:
+        rows = list(csv.reader(handle))
+    header = rows[0] if rows and rows[0] and rows[0][0] == "name" else None
+    return header, {row[0] for row in rows if row}
+
+
+def check_result_file(file: str):
+    """
+    This is the function to check that the runner can append to a result file
+    :param file: path of the csv file
+    :return: true if the file is missing, empty or starts with a header of a name column, false otherwise
+    """
+    if not os.path.exists(file) or os.path.getsize(file) == 0:
+        return True
+    return read_header(file)[0] is not None
+
+
+def solve(file: str, solver: str, options: dict):
+    """
+    This is the function to solve one instance, run in a worker process
+    :param file: txt instance file
+    :param solver: ALNS or milp_model
+    :param options: arguments of ALNS.run
+    :return: dict of the result columns and the list of routes, None for the MILP which only gives the arcs
+    """
+    name = os.path.splitext(os.path.basename(file))[0]
+    if solver == "ALNS":
+        from EVRPTW_PR_ALNS.ALNS import ALNS
+        result = ALNS(file).run(verbose=False, **options)
+        row = {"name": name, "distance": result.distance, "vehicle": result.vehicles,
+               "distance2": result.initial_distance, "vehicle2": result.initial_vehicles,
+               "duration": result.duration}
+        return row, result.best_solution
+
+    from EVRPTW_PR_ALNS.mip_model import milp_model
+    distance, vehicles, solving_time = milp_model(file)
+    return {"name": name, "distance": distance, "vehicle": vehicles, "solving time": solving_time}, None
+
+
+def write_result(results_dir: str, routes_dir: str, solver: str, row: dict, routes):
+    """
+    Void function, append a result row to the result file of its group and write the routes, called in the parent
+    process only so that the files have a single writer
+    A file with an unknown header, for example the summary tables of the package, is never appended to
+    """
+    group = instance_group(row["name"])
+    file = result_file(results_dir, solver, group)
+    if not check_result_file(file):
+        raise ValueError(f"The header of {file} is not recognised, the row of {row['name']} is not written")
+    header, names = read_header(file)
+    new = not os.path.exists(file) or os.path.getsize(file) == 0
+    os.makedirs(results_dir, exist_ok=True)
+    with open(file, 'a', newline='') as handle:
+        writer = csv.writer(handle)
+        if new:
+            writer.writerow(COLUMNS[solver])
+        writer.writerow([row.get(column, "") for column in header or COLUMNS[solver]])
+
+    if routes is not None:
+        folder = os.path.join(routes_dir, group)
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, row["name"] + ".json"), 'w') as handle:
+            json.dump(routes, handle)
+
+
+def pending_instances(pattern: str, instances_dir: str, results_dir: str, solver: str):
+    """
+    This is the function to get the instances to solve, largest first, without the ones already in the results
+    :param pattern: glob of the instance files, relative to instances_dir
+    :param instances_dir: folder of the instances
+    :param results_dir: folder of the result files
+    :param solver: ALNS or milp_model
+    :return: list of instance files
+    """
+    files = sorted(glob.glob(os.path.join(instances_dir, pattern)))
+    solved = {}
+    pending = []
+    for file in files:
+        name = os.path.splitext(os.path.basename(file))[0]
+        group = instance_group(name)
+        if group not in solved:
+            solved[group] = read_header(result_file(results_dir, solver, group))[1]
+        if name not in solved[group]:
+            pending.append(file)
+    # the largest instances take the longest, start them first so the pool does not wait for them at the end
+    return sorted(pending, key=os.path.getsize, reverse=True)
+
+
+def main(argv=None):
+    """
+    Entry point of the evrptw-batch console script
+    :param argv: command line arguments, defaults to sys.argv
+    """
+    parser = argparse.ArgumentParser(description="Solve EVRPTW-PR instances in a worker pool")
+    parser.add_argument("pattern", nargs="?", default="*.txt", help="glob of the instance files, e.g. '*C10.txt'")
+    parser.add_argument("--solver", choices=SOLVERS, default="ALNS")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--instances-dir", default=os.path.join(PACKAGE, "_instances"))
+    parser.add_argument("--output-dir", required=True, help="folder of the result files and of the routes")
+    parser.add_argument("--results-dir", default=None, help="folder of the result files, default OUTPUT_DIR/results")
+    parser.add_argument("--routes-dir", default=None, help="folder of the routes, default OUTPUT_DIR/routes")
+    parser.add_argument("--iterations", type=int, default=None, help="N of ALNS.run")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--time-limit", type=float, default=None, help="time limit of ALNS.run in seconds")
+    args = parser.parse_args(argv)
+    results_dir = args.results_dir or os.path.join(args.output_dir, "results")
+    routes_dir = args.routes_dir or os.path.join(args.output_dir, "routes")
+
+    options = {"seed": args.seed, "time_limit": args.time_limit}
+    if args.iterations is not None:
+        options["N"] = args.iterations
+
+    files = pending_instances(args.pattern, args.instances_dir, results_dir, args.solver)
+    # refuse before solving anything if a result file to append to has a foreign layout
+    targets = {
+        result_file(results_dir, args.solver, instance_group(os.path.splitext(os.path.basename(file))[0]))
+        for file in files
+    }
+    unknown = sorted(file for file in targets if not check_result_file(file))
+    if unknown:
+        parser.error(f"the header of {', '.join(unknown)} is not recognised, choose another --output-dir")
+    print(f"{len(files)} instances to solve with {args.solver}")
+
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        jobs = {pool.submit(solve, file, args.solver, options): file for file in files}
+        for job in as_completed(jobs):
+            try:
+                row, routes = job.result()
+            except Exception as error:
+                print(f"{os.path.basename(jobs[job])} failed: {error!r}")
+                continue
+            write_result(results_dir, routes_dir, args.solver, row, routes)
+            print(f"{row['name']} distance {row['distance']} vehicles {row['vehicle']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import resource
+import sys
+from multiprocessing import Pool
+from EVRPTW_PR_ALNS.batch import PACKAGE, instance_group
+
+"""
+This file contains the benchmark of ALNS.run on representative instances, fixed seed and iterations, with the speed,
+the memory and the gap to the recorded results, and the comparison with a stored baseline
+"""
+
+# representative instances of the C5, C10, C15 and 100 customer sets, clustered, random and mixed
+INSTANCES = ["c101C5", "r105C5", "rc108C5", "c101C10", "r102C10", "rc108C10", "c103C15", "r105C15", "rc103C15",
+             "c101_21", "r101_21"]
+
+
+def read_reference(file: str):
+    """
+    This is the function to read the distance and vehicles of a result file
+    :param file: csv file of _results, with a name header or the two row header of the MILP comparison tables
+    :return: dict from the instance name to (distance, vehicles)
+    """
+    reference = {}
+    if not os.path.exists(file):
+        return reference
+    with open(file, newline='') as handle:
+        rows = list(csv.reader(handle))
+    # the columns after the name are the distance and the vehicles in both layouts
+    for row in rows:
+        try:
+            reference[row[0]] = (float(row[1]), int(float(row[2])))
+        except (IndexError, ValueError):
+            continue
+    return reference
+
+
+def gap(distance, vehicles, reference):
+    """
+    This is the function to get the gap of a result to a reference
+    :param distance: total distance of the result
+    :param vehicles: number of vehicles of the result
+    :param reference: (distance, vehicles) or None
+    :return: dict of the reference values, relative distance gap and vehicle difference, None without reference
+    """
+    if reference is None:
+        return None
+    return {"distance": reference[0], "vehicles": reference[1],
+            "distance_gap": (distance - reference[0]) / reference[0] if reference[0] else None,
+            "vehicle_gap": vehicles - reference[1]}
+
+
+def peak_rss() -> int:
+    """
+    This is the function to get the peak resident memory of the current process
+    :return: peak resident memory in bytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def benchmark_instance(name: str, iterations: int, seed: int, backend: str, results_dir: str):
+    """
+    This is the function to benchmark one instance, run in a fresh process so that the peak memory is its own
+    :param name: instance name without extension
+    :param iterations: N of ALNS.run
+    :param seed: seed of ALNS.run
+    :param backend: feasibility backend
+    :param results_dir: folder of the recorded results
+    :return: dict of the measures
+    """
+    from EVRPTW_PR_ALNS.ALNS import ALNS
+
+    alns = ALNS(os.path.join(PACKAGE, "_instances", name + ".txt"), backend=backend)
+    result = alns.run(N=iterations, seed=seed, verbose=False)
+    report = result.report
+    cache = report["route_cache"]
+    # feasibility checks: the route cache lookups plus the insertions answered by the evaluators without the cache
+    cached_checks = cache["hits"] + cache["misses"]
+    checks = cached_checks + report["insertion_checks"]
+    solves = sum(report["solves"].values())
+
+    group = instance_group(name)
+    return {
+        "distance": result.distance, "vehicles": result.vehicles, "wall_time": result.duration,
+        "iterations": report["iterations"], "iterations_per_second": report["iterations"] / result.duration,
+        "checks": checks, "checks_per_second": checks / result.duration,
+        "cached_checks": cached_checks, "insertion_checks": report["insertion_checks"],
+        "solves": solves, "solves_per_second": solves / result.duration,
+        "cache_hit_rate": cache["hit_rate"], "repair_hit_rate": report["repair_cache"]["hit_rate"],
+        "peak_rss": peak_rss(),
+        "gap_alns": gap(result.distance, result.vehicles,
+                        read_reference(os.path.join(results_dir, f"ALNS_{group}.csv")).get(name)),
+        "gap_milp": gap(result.distance, result.vehicles,
+                        read_reference(os.path.join(results_dir, f"MILP_{group}.csv")).get(name)),
+    }
+
+
+def run_benchmark(instances, iterations=100, seed=0, backend="label", results_dir=None):
+    """
+    This is the function to benchmark the instances one after the other, each in its own process
+    :param instances: list of instance names
+    :param iterations: N of ALNS.run
+    :param seed: seed of ALNS.run
+    :param backend: feasibility backend
+    :param results_dir: folder of the recorded results, defaults to _results
+    :return: dict with the settings and the measures of every instance
+    """
+    results_dir = results_dir or os.path.join(PACKAGE, "_results")
+    measures = {}
+    # one task per process, serial so that the timings do not compete for the cpus
+    with Pool(1, maxtasksperchild=1) as pool:
+        for name in instances:
+            measures[name] = pool.apply(benchmark_instance, (name, iterations, seed, backend, results_dir))
+            print(f"{name}: {measures[name]['wall_time']:.2f}s, {measures[name]['iterations_per_second']:.1f} it/s, "
+                  f"distance {measures[name]['distance']:.2f}, vehicles {measures[name]['vehicles']}")
+    return {"settings": {"iterations": iterations, "seed": seed, "backend": backend,
+                         "python": platform.python_version(), "machine": platform.machine()},
+            "instances": measures}
+
+
+def compare(current, baseline, tolerance=0.1, slack=0.05):
+    """
+    This is the function to find the regressions of a benchmark against a baseline
+    :param current: benchmark dict
+    :param baseline: benchmark dict stored before
+    :param tolerance: allowed relative slowdown of the wall time and increase of the peak memory
+    :param slack: allowed absolute slowdown in seconds, keeps the timer noise of the small instances out
+    :return: list of regression messages, empty if none
+    """
+    regressions = []
+    for name, measures in current["instances"].items():
+        reference = baseline["instances"].get(name)
+        if reference is None:
+            continue
+        if measures["wall_time"] > reference["wall_time"] * (1 + tolerance) + slack:
+            regressions.append(
+                f"{name}: wall time {measures['wall_time']:.2f}s, baseline {reference['wall_time']:.2f}s"
+            )
+        if measures["peak_rss"] > reference["peak_rss"] * (1 + tolerance):
+            regressions.append(f"{name}: peak memory {measures['peak_rss']}, baseline {reference['peak_rss']}")
+        if (measures["vehicles"], measures["distance"]) > (reference["vehicles"], reference["distance"] + 1e-6):
+            regressions.append(f"{name}: solution {measures['vehicles']} vehicles {measures['distance']:.2f}, "
+                               f"baseline {reference['vehicles']} vehicles {reference['distance']:.2f}")
+    return regressions
+
+
+def main(argv=None):
+    """
+    Entry point of the benchmark, writes the measures to a JSON file and exits with 1 on regressions to the baseline
+    :param argv: command line arguments, defaults to sys.argv
+    """
+    parser = argparse.ArgumentParser(description="Benchmark ALNS.run on representative instances")
+    parser.add_argument("instances", nargs="*", default=INSTANCES, help="instance names without extension")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", default="label")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", default=None, help="benchmark JSON file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    current = run_benchmark(args.instances, args.iterations, args.seed, args.backend)
+    with open(args.output, 'w') as handle:
+        json.dump(current, handle, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        if baseline["settings"] != current["settings"]:
+            print(f"warning, different settings: baseline {baseline['settings']}, current {current['settings']}")
+        regressions = compare(current, baseline, args.tolerance)
+        for regression in regressions:
+            print("regression", regression)
+        if regressions:
+            sys.exit(1)
+        print("no regression")
+
+
+if __name__ == "__main__":
+    main()
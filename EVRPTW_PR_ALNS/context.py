@@ -0,0 +1,103 @@
+from math import ceil, sqrt
+from EVRPTW_PR_ALNS.mip_check import MIPCheck
+from EVRPTW_PR_ALNS.helper_function import Helper
+from EVRPTW_PR_ALNS.route_cache import RouteCache
+from EVRPTW_PR_ALNS.spatial import ZoneGrid
+from EVRPTW_PR_ALNS.station_table import StationTable
+
+"""
+This file contains the instance context, the parsed instance with the feasibility checker and the helper, built once
+per solve and shared by every operator
+"""
+
+
+def granular_neighbours(parameters, k=None):
+    """
+    This is the function to get the granular neighbours of the nodes, their k nearest nodes by distance
+    :param parameters: parameter dict of a graph instance
+    :param k: number of nearest nodes kept per node, True for a number adapted to the instance, None for no lists
+    :return: dict from the node to the frozenset of its neighbours and the depots, None without k
+    """
+    if not k:
+        return None
+    names, rows = parameters["node_names"], parameters["arcs"].rows
+    if k is True:
+        # twice the square root of the number of nodes, at least 8
+        k = max(8, ceil(2 * sqrt(len(names))))
+    # the depots are neighbours of every node so that an empty route always has a candidate position
+    depots = parameters["depot_start"] + parameters["depot_end"]
+    neighbours = {}
+    for index, name in enumerate(names):
+        nearest = sorted((other for other in range(len(names)) if other != index), key=rows[index].__getitem__)[:k]
+        neighbours[name] = frozenset([names[other] for other in nearest] + depots)
+    return neighbours
+
+
+class InstanceContext:
+    def __init__(self, parameters):
+        """
+        Take the parameters to build the shared context of an instance, immutable once built
+        :param parameters: parameter dict of a graph instance
+
+        The matrices and node lists are the objects of the parameters, not copies, and the checker keeps its cache in
+        the parameters, so a context and the parameters it was built from answer the same
+        """
+        self.parameters = parameters
+        self.clients = parameters["clients"]
+        self.stations = parameters["stations"]
+        self.original_stations = parameters["original_stations"]
+        self.all_nodes = parameters["all_nodes"]
+        self.depot_start = parameters["depot_start"]
+        self.depot_end = parameters["depot_end"]
+        self.node_names = parameters["node_names"]
+        self.node_index = parameters["node_index"]
+        self.node_type = parameters["node_type"]
+        # sets of the node lists, for the membership tests, recharge_set is depot_start and the original stations
+        self.client_set = parameters["client_set"]
+        self.station_set = parameters["station_set"]
+        self.original_station_set = parameters["original_station_set"]
+        self.recharge_set = parameters["recharge_set"]
+        self.demand = parameters["demand"]
+        self.ready_time = parameters["ready_time"]
+        self.due_date = parameters["due_date"]
+        self.service_time = parameters["service_time"]
+        self.locations = parameters["locations"]
+        self.final_data = parameters["final_data"]
+        self.arcs = parameters["arcs"]
+        self.times = parameters["times"]
+        self.Q = parameters["Q"]
+        self.C = parameters["C"]
+        self.g = parameters["g"]
+        self.h = parameters["h"]
+        self.v = parameters["v"]
+
+        # granular neighbours of the insertion operators, None to evaluate every position
+        self.neighbours = granular_neighbours(parameters, parameters.get("granular"))
+
+        # stations of every arc ranked by detour, for the station insertion operators
+        self.station_table = StationTable(parameters)
+
+        # zones of the plane with the clients of each, for the geometric removal operators
+        self.zone_grid = ZoneGrid(parameters)
+
+        # one feasibility engine and one helper for the whole solve
+        self.checker = MIPCheck(parameters)
+        self.route_cache = self.checker.cache
+        # repaired routes of the station insertion operators, kept in the parameters like the route cache
+        self.repair_cache = parameters.setdefault("repair_cache", RouteCache(50000))
+        self.helper = Helper(self)
+        self.frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "frozen", False):
+            raise AttributeError(f"InstanceContext is immutable, cannot set {name}")
+        super().__setattr__(name, value)
+
+    @classmethod
+    def of(cls, context):
+        """
+        This is the function to get the context of an operator argument
+        :param context: InstanceContext, or a parameter dict for which a new context is built
+        :return: InstanceContext
+        """
+        return context if isinstance(context, cls) else cls(context)
@@ -1,26 +1,122 @@
 import string
+import os
+import hashlib
+import tempfile
+import zipfile
+from collections.abc import MutableMapping
 from typing import Any, Dict
 import pandas as pd
 import numpy as np
-import math
 import statistics
 
 """
 This file contains the functions that extract the parameters and check them for instances
 """
 
+# integer codes of the node types in the "node_type" array
+DEPOT_START = 0
+STATION = 1
+CLIENT = 2
+DEPOT_END = 3
 
-def get_parameters(file: string, num: int=0) -> Dict[string, Any]:
+# version of the layout of the cached instances, part of the cache key so that an old layout is never loaded
+CACHE_VERSION = 1
+
+# raw matrices of the parameters and the arc views over them, a worker process gets the views and takes the matrices
+# back from them, see ArcMatrix.__reduce__
+MATRIX_VIEWS = {"distance_matrix": "arcs", "time_matrix": "times"}
+
+
+class ArcMatrix(MutableMapping):
+    def __init__(self, matrix, node_index):
+        """
+        Name keyed view of a dense arc matrix, arcs[i, j] with node names as in the former dict of tuples
+        :param matrix: float64 numpy array indexed by the integer node ids
+        :param node_index: dict from node name to integer node id
+        """
+        self.matrix = matrix
+        self.node_index = node_index
+        # one memoryview per row for fast scalar lookups by integer ids in the hot loops, rows[i][j] is a python
+        # float read from the pages of the matrix, no copy, so a memory mapped matrix stays shared between processes
+        self.rows = [memoryview(row) for row in matrix]
+        # npy file of a memory mapped matrix, None for a matrix in memory
+        self.path = matrix.filename if isinstance(matrix, np.memmap) else None
+        self.modified = False
+
+    @classmethod
+    def load(cls, path, node_index):
+        """
+        This is the function to map the matrix of a cached instance again, in another process
+        :param path: npy file of the matrix
+        :param node_index: dict from node name to integer node id
+        :return: ArcMatrix over the pages of the file
+        """
+        return cls(np.load(path, mmap_mode="c"), node_index)
+
+    def __reduce__(self):
+        # a memory mapped matrix is sent as its file, so that the worker processes map the same pages whatever the
+        # start method, a matrix in memory or updated since it was mapped is sent as a copy
+        if self.path is not None and not self.modified:
+            return ArcMatrix.load, (self.path, self.node_index)
+        return ArcMatrix, (np.asarray(self.matrix), self.node_index)
+
+    def __getitem__(self, key):
+        i, j = key
+        return self.rows[self.node_index[i]][self.node_index[j]]
+
+    def __setitem__(self, key, value):
+        i, j = key
+        i, j = self.node_index[i], self.node_index[j]
+        self.matrix[i, j] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        raise TypeError("Arcs of a dense matrix can not be deleted")
+
+    def __iter__(self):
+        return ((i, j) for i in self.node_index for j in self.node_index)
+
+    def __len__(self):
+        return len(self.node_index) ** 2
+
+
+def get_parameters(file: string, num: int=0, cache: bool=True) -> Dict[string, Any]:
     """
     Extract parameters from the instance files
     :param file: txt instance file
     :param different_dummy: whether to use dummy with different ID from original charging stations
     :param num: number of dummy for each charging station
+    :param cache: whether to load and store the parsed instance in the binary cache beside the file
     :return: dict storing parameters
     """
+    if cache:
+        cached = load_cached_instance(file, num)
+        if cached is not None:
+            return build_parameters(*cached)
+
+    final_data, original_stations, scalars = read_instance(file, num)
+    distance_matrix, time_matrix = build_matrices(final_data, scalars["v"])
+
+    if cache:
+        save_cached_instance(file, num, final_data, original_stations, scalars, distance_matrix, time_matrix)
+        # use the mapped matrices of the new entry, the ones the worker processes share
+        cached = load_cached_instance(file, num)
+        if cached is not None:
+            return build_parameters(*cached)
+
+    return build_parameters(final_data, original_stations, scalars, distance_matrix, time_matrix)
+
+
+def read_instance(file: string, num: int=0):
+    """
+    Parse the text instance file
+    :param file: txt instance file
+    :param num: number of dummy for each charging station
+    :return: final_data array with a row per node, list of original stations and dict of the general parameters
+    """
 
     # get the data frame cleaning the parameter description sentences in the last 5 rows
-    df = pd.read_csv(file, sep='\s+')
+    df = pd.read_csv(file, sep=r'\s+')
     df_filtered = df.iloc[:-5]
 
     # convert the data frame to numpy array
@@ -31,20 +127,21 @@ def get_parameters(file: string, num: int=0) -> Dict[string, Any]:
     depot_copy[0] = "D0_end"
 
     # read lines from text and get the general parameters from last 5 rows
+    scalars = {}
     with open(file, 'r') as file:
         lines = file.readlines()
 
         for line in lines:
             if line.startswith('Q Vehicle fuel tank capacity'):
-                Q = float(line.split('/')[1])
+                scalars["Q"] = float(line.split('/')[1])
             elif line.startswith('C Vehicle load capacity'):
-                C = float(line.split('/')[1])
+                scalars["C"] = float(line.split('/')[1])
             elif line.startswith('g inverse refueling rate'):
-                g = float(line.split('/')[1])
+                scalars["g"] = float(line.split('/')[1])
             elif line.startswith('r fuel consumption rate'):
-                h = float(line.split('/')[1])
+                scalars["h"] = float(line.split('/')[1])
             elif line.startswith('v average Velocity'):
-                v = float(line.split('/')[1])
+                scalars["v"] = float(line.split('/')[1])
 
 
     # get the number of charging stations and the index of the final station
@@ -60,6 +157,37 @@ def get_parameters(file: string, num: int=0) -> Dict[string, Any]:
     # concatenate all the arrays
     final_data = np.vstack((original_data, depot_copy, replicate_stations))
 
+    return final_data, original_stations, scalars
+
+
+def build_matrices(final_data, v):
+    """
+    Compute the dense distance and time matrices indexed by the integer node ids, the rows of final_data
+    :param final_data: array with a row per node
+    :param v: average velocity
+    :return: distance matrix and time matrix
+    """
+    # pairwise euclidean distances in one vectorized call, same rounding as the scalar formula
+    coordinates = np.array([(float(row[2]), float(row[3])) for row in final_data], dtype=np.float64)
+    dx = coordinates[:, 0][:, None] - coordinates[:, 0][None, :]
+    dy = coordinates[:, 1][:, None] - coordinates[:, 1][None, :]
+    distance_matrix = np.sqrt(dx ** 2 + dy ** 2)
+    time_matrix = distance_matrix / v
+    return distance_matrix, time_matrix
+
+
+def build_parameters(final_data, original_stations, scalars, distance_matrix, time_matrix) -> Dict[string, Any]:
+    """
+    Assemble the parameter dict from the parsed instance and its matrices
+    :param final_data: array with a row per node
+    :param original_stations: list of the charging stations of the instance file
+    :param scalars: dict of Q, C, g, h and v
+    :param distance_matrix: dense distance matrix indexed by the integer node ids
+    :param time_matrix: dense time matrix indexed by the integer node ids
+    :return: dict storing parameters
+    """
+    Q, C, g, h, v = scalars["Q"], scalars["C"], scalars["g"], scalars["h"], scalars["v"]
+
     # extract the client, charging stations, depots and all nodes
     clients = [str(row[0]) for count, row in enumerate(final_data) if str(row[1]) == "c"]
     stations = [str(row[0]) for count, row in enumerate(final_data) if str(row[1]) == "f"]
@@ -73,8 +201,6 @@ def get_parameters(file: string, num: int=0) -> Dict[string, Any]:
     ready_time = {}
     due_date = {}
     service_time = {}
-    arcs = {}
-    times = {}
 
     for index, row in enumerate(final_data):
         locations[row[0]] = (float(row[2]), float(row[3]))
@@ -83,10 +209,20 @@ def get_parameters(file: string, num: int=0) -> Dict[string, Any]:
         due_date[row[0]] = float(row[6])
         service_time[row[0]] = float(row[7])
 
-    for key1, value1 in locations.items():
-        for key2, value2 in locations.items():
-            arcs[(key1, key2)] = math.sqrt((value1[0] - value2[0])**2 + ((value1[1] - value2[1]))**2)
-            times[(key1, key2)] = math.sqrt((value1[0] - value2[0])**2 + ((value1[1] - value2[1]))**2)/v
+    # integer node ids follow the rows of final_data, names are only kept for the API boundary
+    node_names = list(locations)
+    node_index = {name: index for index, name in enumerate(node_names)}
+    node_type = np.array([DEPOT_END if name in depot_end else DEPOT_START if row[1] == "d" else
+                          STATION if row[1] == "f" else CLIENT for name, row in zip(node_names, final_data)],
+                         dtype=np.int8)
+
+    # node type sets for the constant time membership tests of the operators and checkers
+    node_sets = {"client_set": frozenset(clients), "station_set": frozenset(stations),
+                 "original_station_set": frozenset(original_stations),
+                 "recharge_set": frozenset(depot_start + original_stations)}
+
+    arcs = ArcMatrix(distance_matrix, node_index)
+    times = ArcMatrix(time_matrix, node_index)
 
 
     travel_time_series = []
@@ -102,6 +238,85 @@ def get_parameters(file: string, num: int=0) -> Dict[string, Any]:
                   "demand": demand, "ready_time": ready_time, "due_date": due_date, "service_time": service_time,
                   "arcs": arcs, "times": times, "final_data": final_data, "original_stations": original_stations,
                   "locations": locations, "std": statistics.stdev(travel_time_series), "mean": statistics.mean(travel_time_series),
-                  "time_series": travel_time_series, "normal_times": normal_times}
+                  "time_series": travel_time_series, "normal_times": normal_times, "node_names": node_names,
+                  "node_index": node_index, "node_type": node_type, "distance_matrix": distance_matrix,
+                  "time_matrix": time_matrix, **node_sets}
 
     return parameters
+
+
+def cache_prefix(file: string, num: int=0) -> string:
+    """
+    Get the path prefix of the cached instance, in the __cache__ folder beside the file and keyed by content, num and
+    the cache version
+    :param file: txt instance file
+    :param num: number of dummy for each charging station
+    :return: path prefix shared by the cache files of this instance
+    """
+    with open(file, 'rb') as handle:
+        digest = hashlib.sha256(handle.read()).hexdigest()[:16]
+    folder, name = os.path.split(os.path.abspath(file))
+    return os.path.join(folder, "__cache__", f"{os.path.splitext(name)[0]}.n{num}.v{CACHE_VERSION}.{digest}")
+
+
+def load_cached_instance(file: string, num: int=0):
+    """
+    Load the parsed instance from the binary cache, the matrices are memory mapped copy-on-write so that several
+    worker processes share one copy of the pages until one of them updates the times
+    :param file: txt instance file
+    :param num: number of dummy for each charging station
+    :return: the arguments of build_parameters, or None if there is no valid cache
+    """
+    prefix = cache_prefix(file, num)
+    try:
+        with np.load(prefix + ".npz") as data:
+            names, types, values = data["names"], data["types"], data["values"]
+            original_stations = data["original_stations"].tolist()
+            scalars = dict(zip(("Q", "C", "g", "h", "v"), data["scalars"].tolist()))
+        distance_matrix = np.load(prefix + ".distance.npy", mmap_mode="c")
+        time_matrix = np.load(prefix + ".time.npy", mmap_mode="c")
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        return None
+
+    final_data = np.empty((len(names), 8), dtype=object)
+    final_data[:, 0] = names.tolist()
+    final_data[:, 1] = types.tolist()
+    for column in range(values.shape[1]):
+        final_data[:, column + 2] = values[:, column].tolist()
+    return final_data, original_stations, scalars, distance_matrix, time_matrix
+
+
+def save_cached_instance(file, num, final_data, original_stations, scalars, distance_matrix, time_matrix):
+    """
+    Void function, store the parsed instance in the binary cache, stale entries of the same file are removed
+    Failures are ignored, for example when the instances folder is read only
+    """
+    prefix = cache_prefix(file, num)
+    folder, key = os.path.split(prefix)
+    arrays = {
+        ".npz": lambda handle: np.savez(
+            handle, names=np.array([str(row[0]) for row in final_data]),
+            types=np.array([str(row[1]) for row in final_data]),
+            values=np.array([[float(value) for value in row[2:8]] for row in final_data], dtype=np.float64),
+            original_stations=np.array(original_stations),
+            scalars=np.array([scalars[name] for name in ("Q", "C", "g", "h", "v")], dtype=np.float64)),
+        ".distance.npy": lambda handle: np.save(handle, distance_matrix),
+        ".time.npy": lambda handle: np.save(handle, time_matrix),
+    }
+    try:
+        os.makedirs(folder, exist_ok=True)
+        # write to temporary files and rename, so concurrent workers never read a partial cache
+        # the npz is renamed last since it marks the entry as complete
+        for suffix in (".distance.npy", ".time.npy", ".npz"):
+            descriptor, temporary = tempfile.mkstemp(dir=folder, suffix=suffix)
+            with os.fdopen(descriptor, 'wb') as handle:
+                arrays[suffix](handle)
+            os.replace(temporary, prefix + suffix)
+
+        # split from the right, the file name of the instance may contain dots
+        stem, num_key = key.rsplit(".", 3)[:2]
+        for name in os.listdir(folder):
+            if name.startswith(f"{stem}.{num_key}.") and not name.startswith(key + "."):
+                os.remove(os.path.join(folder, name))
+    except OSError:
+        pass
@@ -1,33 +1,40 @@
 import string
-from EVRPTW_PR_ALNS.mip_check import MIPCheck
+from EVRPTW_PR_ALNS.label_check import InsertionEvaluator
 
 
 class Helper:
-    def __init__(self, parameters):
+    def __init__(self, context):
         """
         Take the parameter to initiate a helper instance
-        :param parameters: parameter dict of a graph instance
-        """
-        self.parameters = parameters
-        self.checker = MIPCheck(self.parameters)
-        self.clients = self.parameters["clients"]
-        self.stations = self.parameters["stations"]
-        self.all_nodes = self.parameters["all_nodes"]
-        self.depot_start = self.parameters["depot_start"]
-        self.depot_end = self.parameters["depot_end"]
-        self.demand = self.parameters["demand"]
-        self.ready_time = self.parameters["ready_time"]
-        self.due_date = self.parameters["due_date"]
-        self.service_time = self.parameters["service_time"]
-        self.arcs = self.parameters["arcs"]
-        self.times = self.parameters["times"]
-        self.final_data = self.parameters["final_data"]
-        self.original_stations = self.parameters["original_stations"]
-        self.Q = self.parameters["Q"]
-        self.C = self.parameters["C"]
-        self.g = self.parameters["g"]
-        self.h = self.parameters["h"]
-        self.v = self.parameters["v"]
+        :param context: InstanceContext of the instance, or a parameter dict for which the context is built
+        """
+        # imported here, the context module builds its own helper
+        from EVRPTW_PR_ALNS.context import InstanceContext
+        context = InstanceContext.of(context)
+        self.context = context
+        self.parameters = context.parameters
+        self.checker = context.checker
+        self.clients = context.clients
+        self.client_set = context.client_set
+        self.stations = context.stations
+        self.all_nodes = context.all_nodes
+        self.depot_start = context.depot_start
+        self.depot_end = context.depot_end
+        self.demand = context.demand
+        self.ready_time = context.ready_time
+        self.due_date = context.due_date
+        self.service_time = context.service_time
+        self.arcs = context.arcs
+        self.times = context.times
+        self.final_data = context.final_data
+        self.original_stations = context.original_stations
+        self.Q = context.Q
+        self.C = context.C
+        self.g = context.g
+        self.h = context.h
+        self.v = context.v
+        self.node_index = context.node_index
+        self.neighbours = context.neighbours
 
     def get_routes_dict(self, incidence_dict):
         """
@@ -95,12 +102,15 @@ class Helper:
         :param route: list of nodes
         :return: distance of a route
         """
+        # sum on integer ids through the python rows of the distance matrix, same order as the name lookups
+        rows = self.arcs.rows
+        node_index = self.node_index
         total_distance = 0
         for i in range(len(route)):
             if route[i] == "D0_end":
                 break
             else:
-                total_distance += self.arcs[route[i], route[i + 1]]
+                total_distance += rows[node_index[route[i]]][node_index[route[i + 1]]]
         return total_distance
 
     def cargo_check(self, route):
@@ -125,7 +135,32 @@ class Helper:
         :param route: list of nodes
         :return: true if route is feasible and false otherwise
         """
-        return self.checker.time_energy(route) and self.cargo_check(route) and self.depot_check(route)
+        return self.checker.cache.lookup(
+            ("feasible_route", self.checker.backend, tuple(route)),
+            lambda: self.checker.time_energy(route) and self.cargo_check(route) and self.depot_check(route)
+        )
+
+    def insertion_evaluator(self, route):
+        """
+        This is the function to prepare the incremental checks of client insertions into a route
+        :param route: list of nodes
+        :return: InsertionEvaluator, evaluator.feasible(i, client) is feasible_route(route[:i] + [client] + route[i:])
+        """
+        return InsertionEvaluator(
+            self.checker.labels, route, self.feasible_route, exact=self.checker.backend != "gurobi"
+        )
+
+    def insertion_positions(self, route, client):
+        """
+        This is the function to get the positions of a route where a client is evaluated by the insertion operators
+        :param route: list of nodes
+        :param client: the client to insert
+        :return: every position, or only the ones next to a granular neighbour of the client if the lists are built
+        """
+        if self.neighbours is None:
+            return range(1, len(route))
+        neighbours = self.neighbours[client]
+        return [i for i in range(1, len(route)) if route[i - 1] in neighbours or route[i] in neighbours]
 
     def feasible(self, routes):
         return all(self.feasible_route(route) for route in routes)
@@ -0,0 +1,116 @@
+import numpy as np
+from EVRPTW_PR_ALNS.file_reader import DEPOT_END
+
+"""
+This file contains the elite pool and the island handle of the cooperative parallel ALNS
+"""
+
+
+class ElitePool:
+    def __init__(self, manager, size=4, interval=50, patience=200):
+        """
+        Best solutions published by the searches, shared between processes through a multiprocessing manager
+        An entry is a tuple (vehicles, distance, worker, code), code being the compact encoding of the routes
+        :param manager: started multiprocessing manager, owns the shared list and lock
+        :param size: maximum number of elite solutions kept
+        :param interval: number of iterations between two exchanges of a search with the pool
+        :param patience: number of iterations without a new best solution before a search adopts an elite one
+        """
+        self.entries = manager.list()
+        self.lock = manager.Lock()
+        self.size = size
+        self.interval = interval
+        self.patience = patience
+
+    def publish(self, worker, vehicles, distance, code):
+        """
+        This is the function to offer the best solution of a worker, one entry per worker and only the best ones are
+        kept
+        :param worker: id of the publishing search
+        :param vehicles: number of routes
+        :param distance: total distance
+        :param code: encoded routes
+        :return: true if the solution entered the pool and false if it was rejected
+        """
+        with self.lock:
+            entries = list(self.entries)
+            for entry in entries:
+                if entry[2] == worker and entry[:2] <= (vehicles, distance):
+                    return False
+            new_entry = (vehicles, distance, worker, code)
+            entries = [entry for entry in entries if entry[2] != worker] + [new_entry]
+            entries.sort(key=lambda entry: entry[:2])
+            self.entries[:] = entries[:self.size]
+            return new_entry in entries[:self.size]
+
+    def best(self, exclude=None):
+        """
+        This is the function to get the best elite solution published by another worker
+        :param exclude: id of the asking search, its own entry is skipped
+        :return: tuple (vehicles, distance, worker, code), or None if there is no such entry
+        """
+        for entry in list(self.entries):
+            if entry[2] != exclude:
+                return entry
+        return None
+
+
+class Island:
+    def __init__(self, pool, worker, parameters):
+        """
+        Handle of one search in the cooperative mode of ALNS.run
+        :param pool: ElitePool shared by all the searches, also gives the exchange interval and patience
+        :param worker: id of this search in the pool, distinct for every search
+        :param parameters: parameter dict of the instance, for the route encoding
+        """
+        self.pool = pool
+        self.worker = worker
+        self.interval = pool.interval
+        self.patience = pool.patience
+        self.node_names = parameters["node_names"]
+        self.node_index = parameters["node_index"]
+        self.node_type = parameters["node_type"]
+        # number of solutions accepted by the pool, the rejected publications are not counted
+        self.published = 0
+        self.adopted = 0
+        # iteration of the last adoption, the search gets patience iterations again after adopting
+        self.last_adoption = 0
+
+    def encode(self, routes):
+        """
+        This is the function to encode routes as the bytes of their integer node ids, each route ends with D0_end
+        :param routes: list of routes
+        :return: bytes
+        """
+        node_index = self.node_index
+        return np.array([node_index[node] for route in routes for node in route], dtype=np.int32).tobytes()
+
+    def decode(self, code):
+        """
+        This is the function to decode the routes encoded by encode
+        :param code: bytes
+        :return: list of routes
+        """
+        ids = np.frombuffer(code, dtype=np.int32)
+        ends = np.flatnonzero(self.node_type[ids] == DEPOT_END) + 1
+        return [[self.node_names[node] for node in route] for route in np.split(ids, ends[:-1]) if len(route)]
+
+    def publish(self, solution):
+        """
+        Void function, publish the solution of this search to the elite pool
+        :param solution: Solution, usually the best one of the search
+        """
+        if self.pool.publish(self.worker, len(solution), solution.distance, self.encode(solution.routes)):
+            self.published += 1
+
+    def adopt(self, solution):
+        """
+        This is the function to get an elite solution of another search better than the given one
+        :param solution: Solution, the current solution of this search
+        :return: list of routes, or None if no elite solution is better
+        """
+        entry = self.pool.best(exclude=self.worker)
+        if entry is None or entry[:2] >= (len(solution), solution.distance):
+            return None
+        self.adopted += 1
+        return self.decode(entry[3])
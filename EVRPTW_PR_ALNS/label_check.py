@@ -0,0 +1,339 @@
+from EVRPTW_PR_ALNS.file_reader import CLIENT, STATION, DEPOT_END
+
+"""
+This file contains the forward labeling feasibility checker, a native replacement of the route LP models in MIPCheck
+"""
+
+
+class LabelCheck:
+    def __init__(self, parameters, tolerance=1e-6):
+        """
+        Take the parameter to initiate a labeling checker instance
+
+        A label at a node is a tuple (a, e, E): a is the earliest service start time, e is the maximum arrival energy
+        when starting at a, and E is the maximum arrival energy reachable by starting later (charging longer at the
+        previous station). Between a and E the energy grows with slope 1 / g, so one label describes the whole
+        time/energy trade-off of partial recharging and a single pass over the route is exact.
+        :param parameters: parameter dict of a graph instance
+        :param tolerance: absolute tolerance of the time window and energy comparisons, same order as the LP
+        """
+        self.parameters = parameters
+        self.clients = self.parameters["clients"]
+        self.stations = self.parameters["stations"]
+        self.depot_start = self.parameters["depot_start"]
+        self.depot_end = self.parameters["depot_end"]
+        self.ready_time = self.parameters["ready_time"]
+        self.due_date = self.parameters["due_date"]
+        self.service_time = self.parameters["service_time"]
+        self.arcs = self.parameters["arcs"]
+        self.times = self.parameters["normal_times"]
+        self.Q = self.parameters["Q"]
+        self.g = self.parameters["g"]
+        self.h = self.parameters["h"]
+        self.tolerance = tolerance
+        # node attributes by integer node id, the checks translate the route names once and then work on ids
+        self.node_index = self.parameters["node_index"]
+        node_names = self.parameters["node_names"]
+        self.node_type = self.parameters["node_type"].tolist()
+        self.ready = [self.ready_time[name] for name in node_names]
+        self.due = [self.due_date[name] for name in node_names]
+        self.service = [self.service_time[name] for name in node_names]
+        # number of insertions answered by the InsertionEvaluator without the route cache
+        self.insertion_checks = 0
+
+    def energy_at(self, label, t):
+        """
+        This is the function to get the maximum energy of a label when the service starts at time t
+        :param label: tuple (a, e, E)
+        :param t: service start time, not earlier than a
+        :return: the maximum energy level
+        """
+        a, e, E = label
+        if self.g <= 0:
+            return E
+        return min(E, e + (t - a) / self.g)
+
+    def start_label(self, node):
+        """
+        This is the function to create the label of the first node of a route, the vehicle starts with full energy
+        :param node: integer id of the first node
+        :return: the label, or None if the time window is empty
+        """
+        if self.ready[node] > self.due[node] + self.tolerance:
+            return None
+        return self.ready[node], self.Q, self.Q
+
+    def extend(self, label, i, j):
+        """
+        This is the function to extend the label of node i along the arc (i, j)
+        :param label: the label at node i
+        :param i: integer id of the current node
+        :param j: integer id of the next node
+        :return: the label at node j, or None if the extension is infeasible
+        """
+        a, e, E = label
+
+        # departure from node i: (earliest departure, energy at the earliest departure, maximum departure energy)
+        node_type = self.node_type[i]
+        if node_type == STATION:
+            # charging from the earliest start, the energy keeps growing with slope 1 / g until full
+            departure = (a, e, self.Q)
+        elif node_type == CLIENT:
+            # the service can start as late as the due date, the energy does not change
+            departure = (a + self.service[i], e, self.energy_at(label, self.due[i]))
+        else:
+            # the depot refills the energy without any time cost
+            departure = (a + self.service[i], self.Q, self.Q)
+
+        # arrival at node j, waiting until the ready time if too early
+        consumption = self.h * self.arcs.rows[i][j]
+        arrival = departure[0] + self.times.rows[i][j]
+        start = max(arrival, self.ready[j])
+        energy_cap = departure[2] - consumption
+        if energy_cap < -self.tolerance:
+            return None
+
+        energy = self.energy_at((arrival, departure[1], departure[2]), start) - consumption
+        if energy < 0:
+            # charge longer at the previous station, the start is delayed until the energy is non-negative
+            start = max(start, arrival + (consumption - departure[1]) * self.g)
+            energy = 0
+
+        if start > self.due[j] + self.tolerance:
+            return None
+        return start, min(energy, energy_cap), energy_cap
+
+    def ids(self, route):
+        """
+        This is the function to translate a route of node names to integer node ids
+        :param route: list of nodes
+        :return: list of integer node ids
+        """
+        node_index = self.node_index
+        return [node_index[node] for node in route]
+
+    def labels(self, route):
+        """
+        This is the function to get the labels of all nodes of a route until the depot_end
+        :param route: list of nodes
+        :return: list of labels, shorter than the route and ending with None if the route is infeasible
+        """
+        ids = self.ids(route)
+        label = self.start_label(ids[0])
+        labels = [label]
+        for index in range(len(ids) - 1):
+            if label is None or self.node_type[ids[index]] == DEPOT_END:
+                break
+            label = self.extend(label, ids[index], ids[index + 1])
+            labels.append(label)
+        return labels
+
+    def time_energy(self, route) -> bool:
+        """
+        This is the function to check one route time and energy constraints feasibility
+        :param route: the list of nodes, one route
+        :return: true if the route can be made feasible and false otherwise
+        """
+        return self.labels(route)[-1] is not None
+
+    def time(self, route) -> bool:
+        """
+        This is the function to check if the time constraint can be satisfied, charging takes no time
+        :param route: list of nodes which is a route
+        :return: true if time allowed and false otherwise
+        """
+        ids = self.ids(route)
+        times = self.times.rows
+        start = self.ready[ids[0]]
+        if start > self.due[ids[0]] + self.tolerance:
+            return False
+        for index in range(len(ids) - 1):
+            i = ids[index]
+            if self.node_type[i] == DEPOT_END:
+                break
+            j = ids[index + 1]
+            if self.node_type[i] == STATION:
+                start = max(start + times[i][j], self.ready[j])
+            else:
+                start = max(start + self.service[i] + times[i][j], self.ready[j])
+            if start > self.due[j] + self.tolerance:
+                return False
+        return True
+
+    def energy(self, route) -> bool:
+        """
+        This is the function to check only the energy constraint, charging is free and always full
+        :param route: list of nodes
+        :return: true if energy constraint can be satisfied and false otherwise
+        """
+        ids = self.ids(route)
+        arcs = self.arcs.rows
+        energy = self.Q
+        for index in range(len(ids) - 1):
+            i = ids[index]
+            if self.node_type[i] == DEPOT_END:
+                break
+            if self.node_type[i] != CLIENT:
+                energy = self.Q
+            energy -= self.h * arcs[i][ids[index + 1]]
+            if energy < -self.tolerance:
+                return False
+        return True
+
+    def schedule(self, route):
+        """
+        This is the function to get a feasible schedule of a route from its labels
+        The service start times and the required energies are chosen backward from the labels, earliest starts
+        first, then the energies are simulated forward, each station charging only up to the departure energy the
+        rest of the route needs, so a station is fully charged only when the route requires it
+        :param route: list of nodes
+        :return: tuple of lists (service start times, arrival energy, departure energy), None if infeasible
+        """
+        ids = self.ids(route)
+        labels = self.labels(route)
+        if labels[-1] is None:
+            return None
+        arcs = self.arcs.rows
+        last = len(labels) - 1
+
+        # nodes after the depot_end are not constrained, they take the bounds of the LP variables
+        start = [self.ready[node] for node in ids]
+        arrival = [0.0] * len(ids)
+        departure = [0.0] * len(ids)
+
+        # backward: latest useful departure and minimum energy required at each node
+        start[last] = labels[last][0]
+        required = 0.0
+        # departure energy needed from each station to complete the route
+        target = [0.0] * len(ids)
+        for k in range(last - 1, -1, -1):
+            a, e, E = labels[k]
+            need = required + self.h * arcs[ids[k]][ids[k + 1]]
+            node_type = self.node_type[ids[k]]
+            if node_type == CLIENT:
+                # start once the previous stations charged enough for the departure energy
+                start[k] = a if e >= need or self.g <= 0 else a + (need - e) * self.g
+                required = need
+            elif node_type == STATION:
+                # charging here or longer upstream takes the same time, so start early and charge what is missing
+                start[k] = a
+                target[k] = need
+                required = min(e, need)
+            else:
+                start[k] = a
+                required = 0.0
+
+        # forward: energies of the schedule, a station charges the missing energy of its departure target only
+        energy = self.Q
+        for k in range(last + 1):
+            arrival[k] = energy
+            node_type = self.node_type[ids[k]]
+            if k == last:
+                departure[k] = energy
+                break
+            if node_type == STATION:
+                departure[k] = min(self.Q, max(energy, target[k]))
+            elif node_type == CLIENT:
+                departure[k] = energy
+            else:
+                departure[k] = self.Q
+            energy = departure[k] - self.h * arcs[ids[k]][ids[k + 1]]
+        return start, arrival, departure
+
+    def dominates(self, label, other):
+        """
+        This is the function to check if a label is at least as good as another one at the same node
+        :param label: tuple (a, e, E)
+        :param other: tuple (a, e, E)
+        :return: true if label starts no later and has at least the energy of other at any start time
+        """
+        return label[0] <= other[0] and label[2] >= other[2] and self.energy_at(label, other[0]) >= other[1]
+
+
+class InsertionEvaluator:
+    def __init__(self, checker, route, fallback, exact=True):
+        """
+        Precompute the slacks of a route to check client insertions without building the new routes
+        :param checker: LabelCheck of the instance
+        :param route: list of nodes, the route the clients are inserted into
+        :param fallback: function checking the feasibility of a full route, used when the route can not be evaluated
+        :param exact: false to always use the fallback, for example with the LP backend
+        """
+        self.checker = checker
+        self.route = route
+        self.fallback = fallback
+        self.ids = checker.ids(route)
+        self.labels = checker.labels(route)
+        demand = checker.parameters["demand"]
+        self.load = sum(demand[node] for node in route)
+        self.demand = demand
+        self.C = checker.parameters["C"]
+
+        # incremental checks need a feasible route with the depot at both ends, otherwise use the fallback
+        self.exact = (
+                exact and len(self.labels) == len(self.ids) and self.labels[-1] is not None and
+                route[0] == "D0" and route[-1] == "D0_end" and route.count("D0") == 1 and route.count("D0_end") == 1
+        )
+        if not self.exact:
+            return
+
+        ids, arcs, times = self.ids, checker.arcs.rows, checker.times.rows
+
+        # backward latest service start of each node so that the rest of the route meets the time windows
+        # charging is taken as instantaneous, so this is a necessary condition
+        self.latest = [0.0] * len(ids)
+        self.latest[-1] = checker.due[ids[-1]]
+        for k in range(len(ids) - 2, -1, -1):
+            duration = 0 if checker.node_type[ids[k]] == STATION else checker.service[ids[k]]
+            self.latest[k] = min(checker.due[ids[k]], self.latest[k + 1] - duration - times[ids[k]][ids[k + 1]])
+
+        # energy consumed on the charging segment of each arc (k - 1, k), between two charging nodes
+        # a segment can not need more than a full battery, also a necessary condition
+        self.segment = [0.0] * len(ids)
+        start = 0
+        for k in range(1, len(ids)):
+            if k == len(ids) - 1 or checker.node_type[ids[k]] != CLIENT:
+                consumption = sum(checker.h * arcs[ids[m - 1]][ids[m]] for m in range(start + 1, k + 1))
+                for m in range(start + 1, k + 1):
+                    self.segment[m] = consumption
+                start = k
+
+    def feasible(self, position, client) -> bool:
+        """
+        This is the function to check if inserting a client before the given position keeps the route feasible
+        Same answer as checking route[:position] + [client] + route[position:] with Helper.feasible_route
+        :param position: index of the insertion, from 1 to len(route) - 1
+        :param client: the client to be inserted
+        :return: true if the new route is feasible and false otherwise
+        """
+        if not self.exact:
+            return self.fallback(self.route[:position] + [client] + self.route[position:])
+
+        checker, ids = self.checker, self.ids
+        checker.insertion_checks += 1
+        arcs, times = checker.arcs.rows, checker.times.rows
+        c, before, after = checker.node_index[client], ids[position - 1], ids[position]
+
+        # O(1) screens: cargo, energy of the charging segment and latest start at the client
+        if self.load + self.demand[client] > self.C:
+            return False
+        energy = self.segment[position] + checker.h * (arcs[before][c] + arcs[c][after] - arcs[before][after])
+        if energy > checker.Q + checker.tolerance:
+            return False
+        label = checker.extend(self.labels[position - 1], before, c)
+        if label is None:
+            return False
+        latest = min(checker.due[c], self.latest[position] - checker.service[c] - times[c][after])
+        if label[0] > latest + checker.tolerance:
+            return False
+
+        # exact check: propagate the new label until it is as good as the label of the original route
+        previous = c
+        for k in range(position, len(ids)):
+            label = checker.extend(label, previous, ids[k])
+            if label is None:
+                return False
+            if checker.dominates(label, self.labels[k]):
+                return True
+            previous = ids[k]
+        return True
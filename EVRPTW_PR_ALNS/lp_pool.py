@@ -0,0 +1,143 @@
+import gurobipy as gp
+from gurobipy import GRB
+
+"""
+This file contains the parametric route LP of MIPCheck, built once per route length and updated for each route
+"""
+
+
+def gurobi_env(parameters):
+    """
+    This is the function to get the Gurobi environment shared by the checkers built on the same parameters
+    :param parameters: parameter dict of a graph instance, the environment is kept in its "gurobi_env" entry
+    :return: gp.Env started with the output off, created on first use
+    """
+    env = parameters.get("gurobi_env")
+    if env is None:
+        # empty environment so that the output flag is off before the start, no license banner
+        env = gp.Env(empty=True)
+        env.setParam('OutputFlag', 0)
+        env.start()
+        parameters["gurobi_env"] = env
+    return env
+
+
+class RouteLP:
+    def __init__(self, length, Q, g, time=True, energy=True, env=None):
+        """
+        Build the route LP for routes of a given length, the rows are written in the general form
+        time row k:   t[k] - t[k + 1] + g * Y[k] - g * y[k] <= -travel time (- service time)
+        energy row k: y[k + 1] - y[k] - Y[k] <= -energy consumption
+        charge row k: y[k] - Y[k] <= 0
+        and load sets the coefficients, right hand sides and bounds of a route, so the model is the LP built for it
+        :param length: number of nodes of the routes
+        :param Q: battery capacity
+        :param g: inverse recharging rate
+        :param time: true to include the time rows
+        :param energy: true to include the energy and charge rows
+        :param env: Gurobi environment of the model, see gurobi_env
+        """
+        self.length = length
+        self.g = g
+        self.time = time
+        self.energy = energy
+        # the output flag is set as 0 in the environment
+        self.model = gp.Model("route_check_time_energy", env=env)
+
+        self.t = [self.model.addVar(lb=0, ub=GRB.INFINITY, vtype=GRB.CONTINUOUS) for _ in range(length)]
+        self.Y = [self.model.addVar(lb=0, ub=Q, vtype=GRB.CONTINUOUS) for _ in range(length)]
+        self.y = [self.model.addVar(lb=0, ub=Q, vtype=GRB.CONTINUOUS) for _ in range(length)]
+
+        # create objective function, for checking feasibility, objective is set as 0
+        self.model.setObjective(0, GRB.MINIMIZE)
+
+        # nonzero coefficients everywhere so that every coefficient of the rows exists in the matrix
+        # the charge rows of the clients are kept, the departure energy of a client is in no other row so they always
+        # hold, the same for all the charge rows without time rows
+        t, y, Y = self.t, self.y, self.Y
+        self.time_rows = [
+            self.model.addConstr(t[k] - t[k + 1] + Y[k] - y[k] <= 0) for k in range(length - 1)
+        ] if time else []
+        self.energy_rows = [
+            self.model.addConstr(y[k + 1] - y[k] - Y[k] <= 0) for k in range(length - 1)
+        ] if energy else []
+        self.charge_rows = [self.model.addConstr(y[k] - Y[k] <= 0) for k in range(length)] if energy else []
+
+        # rows after a depot_end in the middle of a route are switched off with zero coefficients
+        self.switched_off = set()
+
+    def load(self, route, checker):
+        """
+        Void function, set the model to the LP of a route
+        :param route: list of nodes, of the length of the model
+        :param checker: MIPCheck giving the instance data
+        """
+        model, t, y, Y = self.model, self.t, self.y, self.Y
+        stations, clients = checker.station_set, checker.client_set
+
+        model.setAttr("LB", t, [checker.ready_time[node] for node in route])
+        model.setAttr("UB", t, [checker.due_date[node] for node in route])
+
+        # the rows of the original model stop at the first depot_end
+        end = route.index("D0_end") if "D0_end" in route else len(route) - 1
+
+        time_rhs = [0.0] * len(self.time_rows)
+        energy_rhs = [0.0] * len(self.energy_rows)
+        for index in range(self.length - 1):
+            if index >= end:
+                self.switch_off(index)
+                continue
+            if index in self.switched_off:
+                self.switch_on(index)
+            node, following = route[index], route[index + 1]
+
+            # time row, the charging time at stations, the service time otherwise
+            if self.time:
+                charge = self.g if self.energy and node in stations else 0
+                duration = 0 if node in stations else checker.service_time[node]
+                time_rhs[index] = -checker.times[node, following] - duration
+                model.chgCoeff(self.time_rows[index], Y[index], charge)
+                model.chgCoeff(self.time_rows[index], y[index], -charge)
+
+            # energy row, from the arrival energy at clients and from the departure energy otherwise
+            if self.energy:
+                energy_rhs[index] = -checker.h * checker.arcs[node, following]
+                model.chgCoeff(self.energy_rows[index], y[index], -1 if node in clients else 0)
+                model.chgCoeff(self.energy_rows[index], Y[index], 0 if node in clients else -1)
+
+        if self.time:
+            model.setAttr("RHS", self.time_rows, time_rhs)
+        if self.energy:
+            model.setAttr("RHS", self.energy_rows, energy_rhs)
+
+    def switch_off(self, index):
+        """
+        Void function, remove the time and energy rows of the arc (index, index + 1) from the model
+        :param index: index of the arc in the route
+        """
+        if index in self.switched_off:
+            return
+        for row in self.time_rows[index:index + 1] + self.energy_rows[index:index + 1]:
+            for variable in (self.t[index], self.t[index + 1], self.y[index], self.y[index + 1], self.Y[index]):
+                self.model.chgCoeff(row, variable, 0)
+        self.switched_off.add(index)
+
+    def switch_on(self, index):
+        """
+        Void function, restore the route independent coefficients of the rows of the arc (index, index + 1)
+        :param index: index of the arc in the route
+        """
+        if self.time:
+            self.model.chgCoeff(self.time_rows[index], self.t[index], 1)
+            self.model.chgCoeff(self.time_rows[index], self.t[index + 1], -1)
+        if self.energy:
+            self.model.chgCoeff(self.energy_rows[index], self.y[index + 1], 1)
+        self.switched_off.discard(index)
+
+    def solve(self):
+        """
+        This is the function to solve the loaded LP
+        :return: true if optimal, which means feasible, and false otherwise
+        """
+        self.model.optimize()
+        return self.model.status == GRB.OPTIMAL
@@ -0,0 +1,279 @@
+import argparse
+import glob
+import json
+import os
+import random
+from time import perf_counter
+import numpy as np
+from EVRPTW_PR_ALNS.batch import PACKAGE, instance_group
+
+"""
+This file contains the micro-benchmark of the MIPCheck primitives, it replays a corpus of routes, the recorded routes
+of _route_scheduling and perturbations of them, through every primitive and backend, and the comparison of the station
+insertion operators on the recorded routes without their stations
+"""
+
+# the primitives, the checks are called without the route cache so that every call reaches the backend
+PRIMITIVES = {
+    "time_energy": lambda checker, route: checker.solve("time_energy", route),
+    "time": lambda checker, route: checker.solve("time", route),
+    "energy": lambda checker, route: checker.solve("energy", route),
+    # the extractors are slices of the schedule
+    "schedule": lambda checker, route: checker.solve_schedule(route),
+}
+
+
+def recorded_routes(name: str, routes_dir: str = None):
+    """
+    This is the function to get the recorded routes of an instance
+    :param name: instance name without extension
+    :param routes_dir: folder of the route files, defaults to _route_scheduling
+    :return: list of routes, empty if the instance has no route file
+    """
+    routes_dir = routes_dir or os.path.join(PACKAGE, "_route_scheduling")
+    file = os.path.join(routes_dir, instance_group(name), name + ".json")
+    if not os.path.exists(file):
+        return []
+    with open(file) as handle:
+        return json.load(handle)
+
+
+def perturb(route, parameters, generator):
+    """
+    This is the function to get a synthetic route close to a recorded one
+    :param route: list of nodes starting with D0 and ending with D0_end
+    :param parameters: parameter dict of the instance
+    :param generator: random.Random of the corpus
+    :return: route with two nodes swapped, a node removed, or a client or a station inserted
+    """
+    route = list(route)
+    interior = range(1, len(route) - 1)
+    move = generator.choice(["swap", "remove", "client", "station"] if len(interior) >= 2 else ["client", "station"])
+    if move == "swap":
+        i, j = generator.sample(interior, 2)
+        route[i], route[j] = route[j], route[i]
+    elif move == "remove":
+        del route[generator.choice(interior)]
+    else:
+        nodes = parameters["clients"] if move == "client" else parameters["original_stations"]
+        route.insert(generator.randint(1, len(route) - 1), generator.choice(nodes))
+    return route
+
+
+def build_corpus(name: str, parameters, perturbations: int = 5, seed: int = 0, routes_dir: str = None):
+    """
+    This is the function to build the route corpus of an instance
+    :param name: instance name without extension
+    :param parameters: parameter dict of the instance
+    :param perturbations: number of perturbed routes per recorded route
+    :param seed: seed of the perturbations
+    :param routes_dir: folder of the route files
+    :return: list of routes, the recorded ones first
+    """
+    generator = random.Random(seed)
+    routes = recorded_routes(name, routes_dir)
+    return routes + [perturb(route, parameters, generator) for route in routes for _ in range(perturbations)]
+
+
+def length_bucket(length: int, width: int = 4) -> str:
+    """
+    This is the function to get the route length bucket of the report
+    :param length: number of nodes of a route
+    :param width: number of lengths per bucket
+    :return: bucket label, for example 5-8
+    """
+    low = (length - 1) // width * width + 1
+    return f"{low}-{low + width - 1}"
+
+
+def time_primitive(function, checker, corpus, repeat: int = 3):
+    """
+    This is the function to time a primitive on every route of the corpus
+    :param function: primitive, function of the checker and the route
+    :param checker: MIPCheck with the backend to measure
+    :param corpus: list of routes
+    :param repeat: number of calls per route, each one is a latency sample
+    :return: list of the answers and dict from the length bucket to the latency samples in seconds
+    """
+    answers = []
+    latencies = {}
+    for route in corpus:
+        for _ in range(repeat):
+            start = perf_counter()
+            answer = function(checker, route)
+            latencies.setdefault(length_bucket(len(route)), []).append(perf_counter() - start)
+        answers.append(answer)
+    return answers, latencies
+
+
+def same_answer(answer, other) -> bool:
+    """
+    This is the function to compare the answers of two backends
+    :param answer: bool, RouteSchedule or None
+    :param other: bool, RouteSchedule or None
+    :return: true if the answers agree, schedules agree when both or none exist since a route has many schedules
+    """
+    if isinstance(answer, tuple) or isinstance(other, tuple):
+        return (answer is None) == (other is None)
+    return answer == other
+
+
+def run_repair_benchmark(instances, repairs=("bsi", "dpsi"), backend="label"):
+    """
+    This is the function to compare station insertion operators on the recorded routes without their stations
+    :param instances: list of instance names, the ones without recorded routes are skipped
+    :param repairs: list of keys of ALNS.si_function_dict
+    :param backend: feasibility backend, the route cache is cleared before every call
+    :return: dict with the settings and, by operator, the number of repaired routes, the mean distance of the routes
+    every operator repaired, and the latency statistics in microseconds
+    """
+    from EVRPTW_PR_ALNS.ALNS import ALNS
+
+    repaired = {repair: 0 for repair in repairs}
+    distances = {repair: [] for repair in repairs}
+    latencies = {repair: [] for repair in repairs}
+    routes = 0
+    for name in instances:
+        alns = ALNS(os.path.join(PACKAGE, "_instances", name + ".txt"), backend=backend)
+        functions, helper = alns.si_function_dict(), alns.helper
+        stations = alns.context.original_station_set
+        for route in recorded_routes(name):
+            route = [node for node in route if node not in stations]
+            if helper.feasible_route(route):
+                continue
+            routes += 1
+            results = {}
+            for repair in repairs:
+                alns.context.route_cache.clear()
+                start = perf_counter()
+                result = functions[repair](route)
+                latencies[repair].append(perf_counter() - start)
+                results[repair] = helper.distance_one_route(result) if helper.feasible_route(result) else None
+                repaired[repair] += results[repair] is not None
+            if all(result is not None for result in results.values()):
+                for repair in repairs:
+                    distances[repair].append(results[repair])
+
+    statistics = {}
+    for repair in repairs:
+        values = np.array(latencies[repair] or [0.0]) * 1e6
+        statistics[repair] = {
+            "repaired": repaired[repair],
+            "mean_distance": float(np.mean(distances[repair])) if distances[repair] else None,
+            "mean": float(values.mean()), "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95))
+        }
+    return {"settings": {"instances": list(instances), "repairs": list(repairs), "backend": backend, "routes": routes},
+            "repairs": statistics}
+
+
+def run_microbenchmark(instances, backends=("label", "gurobi"), primitives=None, perturbations=5, repeat=3, seed=0):
+    """
+    This is the function to replay the corpus of every instance through every primitive and backend
+    :param instances: list of instance names, the ones without recorded routes are skipped
+    :param backends: list of MIPCheck backends compared head to head on the same corpus
+    :param primitives: list of primitive names, defaults to all of PRIMITIVES
+    :param perturbations: number of perturbed routes per recorded route
+    :param repeat: number of calls per route
+    :param seed: seed of the perturbations
+    :return: dict with the settings, the latency statistics by primitive, backend and length bucket in microseconds,
+    and the number of routes on which each backend disagrees with the first one
+    """
+    from EVRPTW_PR_ALNS.file_reader import get_parameters
+    from EVRPTW_PR_ALNS.mip_check import MIPCheck
+
+    primitives = list(primitives or PRIMITIVES)
+    samples = {primitive: {backend: {} for backend in backends} for primitive in primitives}
+    mismatches = {primitive: {backend: 0 for backend in backends[1:]} for primitive in primitives}
+    routes = 0
+    for name in instances:
+        parameters = get_parameters(os.path.join(PACKAGE, "_instances", name + ".txt"))
+        corpus = build_corpus(name, parameters, perturbations, seed)
+        routes += len(corpus)
+        checkers = {backend: MIPCheck(parameters, backend) for backend in backends}
+        for primitive in primitives:
+            answers = {}
+            for backend in backends:
+                answers[backend], latencies = time_primitive(PRIMITIVES[primitive], checkers[backend], corpus, repeat)
+                for bucket, values in latencies.items():
+                    samples[primitive][backend].setdefault(bucket, []).extend(values)
+            for backend in backends[1:]:
+                mismatches[primitive][backend] += sum(
+                    not same_answer(answer, other) for answer, other in zip(answers[backends[0]], answers[backend])
+                )
+
+    statistics = {}
+    for primitive, by_backend in samples.items():
+        statistics[primitive] = {}
+        for backend, buckets in by_backend.items():
+            statistics[primitive][backend] = {}
+            for bucket in sorted(buckets, key=lambda label: int(label.split("-")[0])):
+                values = np.array(buckets[bucket]) * 1e6
+                statistics[primitive][backend][bucket] = {
+                    "calls": len(values), "mean": float(values.mean()), "p50": float(np.percentile(values, 50)),
+                    "p95": float(np.percentile(values, 95)), "p99": float(np.percentile(values, 99))
+                }
+    return {"settings": {"instances": list(instances), "backends": list(backends), "routes": routes,
+                         "perturbations": perturbations, "repeat": repeat, "seed": seed},
+            "latency_us": statistics, "mismatches": mismatches}
+
+
+def print_report(report):
+    """
+    Void function, print the latency table of a micro-benchmark report
+    """
+    backends = report["settings"]["backends"]
+    print(f"{report['settings']['routes']} routes, latency p50 / p95 in microseconds")
+    for primitive, by_backend in report["latency_us"].items():
+        print(primitive)
+        buckets = sorted({bucket for values in by_backend.values() for bucket in values},
+                         key=lambda label: int(label.split("-")[0]))
+        for bucket in buckets:
+            cells = []
+            for backend in backends:
+                values = by_backend[backend].get(bucket)
+                cells.append(f"{backend} {values['p50']:9.1f} / {values['p95']:9.1f}" if values else f"{backend} -")
+            print(f"  length {bucket:>7}: " + "   ".join(cells))
+        for backend, count in report["mismatches"][primitive].items():
+            if count:
+                print(f"  {backend} disagrees with {backends[0]} on {count} routes")
+
+
+def main(argv=None):
+    """
+    Entry point of the micro-benchmark, prints the latency table and writes the report to a JSON file
+    :param argv: command line arguments, defaults to sys.argv
+    """
+    parser = argparse.ArgumentParser(description="Micro-benchmark of the MIPCheck primitives")
+    parser.add_argument("instances", nargs="*", help="instance names, defaults to every instance with recorded routes")
+    parser.add_argument("--backends", nargs="+", default=["label", "gurobi"])
+    parser.add_argument("--primitives", nargs="+", choices=list(PRIMITIVES), default=None)
+    parser.add_argument("--perturbations", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="microbenchmark.json")
+    parser.add_argument("--repairs", nargs="+", default=None,
+                        help="compare these station insertion operators instead, e.g. bsi dpsi")
+    args = parser.parse_args(argv)
+
+    instances = args.instances or sorted(
+        os.path.splitext(os.path.basename(file))[0]
+        for file in glob.glob(os.path.join(PACKAGE, "_route_scheduling", "*", "*.json"))
+    )
+    if args.repairs:
+        report = run_repair_benchmark(instances, args.repairs, args.backends[0])
+        print(f"{report['settings']['routes']} routes without their stations, latency mean / p95 in microseconds")
+        for repair, values in report["repairs"].items():
+            print(f"  {repair:>6}: repaired {values['repaired']:5d}, mean distance {values['mean_distance']}, "
+                  f"latency {values['mean']:9.1f} / {values['p95']:9.1f}")
+    else:
+        report = run_microbenchmark(
+            instances, args.backends, args.primitives, args.perturbations, args.repeat, args.seed
+        )
+        print_report(report)
+    with open(args.output, 'w') as handle:
+        json.dump(report, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
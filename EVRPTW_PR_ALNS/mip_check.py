@@ -1,14 +1,38 @@
-import gurobipy as gp
-from gurobipy import GRB
 import numpy as np
 import random
+from collections import Counter, namedtuple
+from EVRPTW_PR_ALNS.label_check import LabelCheck
+from EVRPTW_PR_ALNS.route_cache import RouteCache
+
+# schedule of a feasible route, one value per node, service start times and energy levels
+RouteSchedule = namedtuple("RouteSchedule", ["arrival_times", "arrival_energy", "departure_energy", "recharge"])
 
 
 class MIPCheck:
-    def __init__(self, parameters):
+    # label: native forward labeling, gurobi: one LP per check, verify: both, raise if they disagree
+    backends = ("label", "gurobi", "verify")
+
+    def __init__(self, parameters, backend=None):
+        """
+        Take the parameter to initiate a checker instance
+        :param parameters: parameter dict of a graph instance
+        :param backend: feasibility backend, defaults to the "backend" entry of the parameters or label
+
+        The answers are memoized in the "route_cache" entry of the parameters, created on first use, so every
+        checker, helper and operator built on the same parameters shares one cache, the keys hold the backend so a
+        checker only reuses answers of its own backend, the LP backends share the Gurobi environment of the
+        "gurobi_env" entry in the same way, and gurobipy is only imported by them
+        """
+        if backend is None:
+            backend = parameters.get("backend", "label")
+        if backend not in self.backends:
+            raise ValueError(f"Unknown feasibility backend {backend}, choose from {self.backends}")
         self.parameters = parameters
+        self.backend = backend
         self.clients = self.parameters["clients"]
         self.stations = self.parameters["stations"]
+        self.client_set = self.parameters["client_set"]
+        self.station_set = self.parameters["station_set"]
         self.all_nodes = self.parameters["all_nodes"]
         self.depot_start = self.parameters["depot_start"]
         self.depot_end = self.parameters["depot_end"]
@@ -26,6 +50,12 @@ class MIPCheck:
         self.v = self.parameters["v"]
         self.std = self.parameters["std"]
         self.mean = self.parameters["mean"]
+        self.labels = LabelCheck(self.parameters)
+        # LP models by route length and constraint set, built on first use and reused by updating the route data
+        self.models = {}
+        self.cache = self.parameters.setdefault("route_cache", RouteCache())
+        # number of backend solves by check name, shared like the cache, the cache hits are not counted
+        self.solves = self.parameters.setdefault("solve_counts", Counter())
 
     def update_times(self, p, n):
         new_times = self.parameters["times"]
@@ -37,7 +67,40 @@ class MIPCheck:
                         if new_times[i,j] + stochastic > 0:
                             new_times[i,j] = new_times[i,j] + stochastic
         self.times = new_times
+        self.labels.times = new_times
+        # every cached answer depends on the travel times, and so do the cached station repairs
+        self.cache.clear()
+        if "repair_cache" in self.parameters:
+            self.parameters["repair_cache"].clear()
 
+    def dispatch(self, name, route) -> bool:
+        """
+        This is the function to answer a feasibility question with the selected backend
+        :param name: name of the check, time_energy, time or energy
+        :param route: the list of nodes, one route
+        :return: the answer of the backend
+        """
+        # the backend is part of the key, a checker never answers with the result of another backend
+        return self.cache.lookup(
+            (name, self.backend, RouteCache.fingerprint(route)), lambda: self.solve(name, route)
+        )
+
+    def solve(self, name, route) -> bool:
+        """
+        This is the function to answer a feasibility question with the selected backend, without the cache
+        :param name: name of the check, time_energy, time or energy
+        :param route: the list of nodes, one route
+        :return: the answer of the backend
+        """
+        self.solves[name] += 1
+        if self.backend == "gurobi":
+            return getattr(self, name + "_lp")(route)
+        result = getattr(self.labels, name)(route)
+        if self.backend == "verify":
+            expected = getattr(self, name + "_lp")(route)
+            if result != expected:
+                raise ValueError(f"Labeling {name} check gives {result} but the LP gives {expected} for {route}")
+        return result
 
     def time_energy(self, route) -> bool:
         """
@@ -45,352 +108,148 @@ class MIPCheck:
         :param route: the list of nodes, one route
         :return: true if the route can be made feasible and false otherwise
         """
-        # create the model first
-        model = gp.Model("route_check_time_energy")
+        return self.dispatch("time_energy", route)
 
-        # set the output flag as 0 to avoid outcome showing
-        model.setParam('OutputFlag', 0)
-
-        # create the decision variables, times and energy states
-        t = []
-        y = []
-        Y = []
-        for i in range(len(route)):
-            t.append(model.addVar(lb=self.ready_time[route[i]], ub=self.due_date[route[i]], vtype=GRB.CONTINUOUS))
-            Y.append(model.addVar(lb=0, ub=self.Q, vtype=GRB.CONTINUOUS))
-            y.append(model.addVar(lb=0, ub=self.Q, vtype=GRB.CONTINUOUS))
-
-        # create objective function, for checking feasibility, objective is set as 0
-        model.setObjective(0, GRB.MINIMIZE)
-
-        # create constraints to check the time and energy
-        # time constraints
-        for index in range(len(route)):
-            i = route[index]
-            if i == "D0_end":
-                break
-            else:
-                if i in self.stations:
-                    model.addConstr(
-                        t[index]+self.times[route[index], route[index+1]]+self.g*(Y[index]-y[index])<=t[index+1]
-                    )
-                else:
-                    model.addConstr(
-                        t[index]+self.times[route[index], route[index+1]]+self.service_time[route[index]]<=t[index+1]
-                    )
-
-        # energy constraints
-        for index in range(len(route)):
-            i = route[index]
-            if i == "D0_end":
-                break
-            else:
-                if i in self.clients:
-                    model.addConstr(y[index+1]<=y[index]-self.h*self.arcs[route[index], route[index+1]])
-                else:
-                    model.addConstr(y[index+1]<=Y[index]-self.h*self.arcs[route[index], route[index+1]])
-
-        # departure and arrival energy constraint
-        for i in range(len(route)):
-            if route[i] in self.stations + self.depot_start + self.depot_end:
-                model.addConstr(y[i] <= Y[i])
-
-        # solve the model and optimize
-        model.optimize()
-
-        if model.status == GRB.OPTIMAL:
-            return True
-        if model.status == GRB.INFEASIBLE or model.status == GRB.UNBOUNDED:
-            return False
-        return False
-
-    def time(self, route):
+    def time(self, route) -> bool:
         """
         This is the function to check if the time constraint can be satisfied
         :param route: list of nodes which is a route
         :return: true if time allowed and false otherwise
         """
-        # only care about the time, no energy, so only consider the energy state change at stations
-
-        # create the model first
-        model = gp.Model("route_check_time_energy")
+        return self.dispatch("time", route)
 
-        # set the output flag as 0 to avoid outcome showing
-        model.setParam('OutputFlag', 0)
-
-        # create the decision variables, times and energy states
-        t = []
-        y = []
-        Y = []
-        for i in range(len(route)):
-            t.append(model.addVar(lb=self.ready_time[route[i]], ub=self.due_date[route[i]], vtype=GRB.CONTINUOUS))
-            Y.append(model.addVar(lb=0, ub=self.Q, vtype=GRB.CONTINUOUS))
-            y.append(model.addVar(lb=0, ub=self.Q, vtype=GRB.CONTINUOUS))
-
-        # create objective function, for checking feasibility, objective is set as 0
-        model.setObjective(0, GRB.MINIMIZE)
-
-        # create constraints to check the time and energy
-        # time constraints
-        for index in range(len(route)):
-            i = route[index]
-            if i == "D0_end":
-                break
-            else:
-                if i in self.stations:
-                    model.addConstr(
-                        t[index] + self.times[route[index], route[index + 1]] <= t[
-                            index + 1]
-                    )
-                else:
-                    model.addConstr(
-                        t[index] + self.times[route[index], route[index + 1]] + self.service_time[route[index]] <= t[
-                            index + 1]
-                    )
-
-        # solve the model and optimize
-        model.optimize()
-
-        if model.status == GRB.OPTIMAL:
-            return True
-        if model.status == GRB.INFEASIBLE or model.status == GRB.UNBOUNDED:
-            return False
-        return False
-
-    def energy(self, route):
+    def energy(self, route) -> bool:
         """
         This is the function to check only the energy constraint
-        :param route: lsit of nodes
+        :param route: list of nodes
         :return: true if energy constraint can be satisfied and false otherwise
         """
-        # create the model first
-        model = gp.Model("route_check_time_energy")
-
-        # set the output flag as 0 to avoid outcome showing
-        model.setParam('OutputFlag', 0)
+        return self.dispatch("energy", route)
 
-        # create the decision variables, times and energy states
-        t = []
-        y = []
-        Y = []
-        for i in range(len(route)):
-            t.append(model.addVar(lb=self.ready_time[route[i]], ub=self.due_date[route[i]], vtype=GRB.CONTINUOUS))
-            Y.append(model.addVar(lb=0, ub=self.Q, vtype=GRB.CONTINUOUS))
-            y.append(model.addVar(lb=0, ub=self.Q, vtype=GRB.CONTINUOUS))
 
-        # create objective function, for checking feasibility, objective is set as 0
-        model.setObjective(0, GRB.MINIMIZE)
-
-        # create constraints to check the energy
+    def route_lp(self, route, time=True, energy=True):
+        """
+        This is the function to get the pooled LP of the route length, loaded with the route
+        :param route: list of nodes
+        :param time: true to include the time constraints
+        :param energy: true to include the energy constraints
+        :return: RouteLP ready to solve
+        """
+        key = (len(route), time, energy)
+        lp = self.models.get(key)
+        if lp is None:
+            # gurobipy is imported with the first LP, the label backend runs without it
+            from EVRPTW_PR_ALNS.lp_pool import RouteLP, gurobi_env
+            lp = self.models[key] = RouteLP(len(route), self.Q, self.g, time, energy, gurobi_env(self.parameters))
+        lp.load(route, self)
+        return lp
+
+    def time_energy_lp(self, route) -> bool:
+        """
+        This is the function to check one route time and energy constraints feasibility with an LP
+        :param route: the list of nodes, one route
+        :return: true if the route can be made feasible and false otherwise
+        """
+        return self.route_lp(route).solve()
 
-        # energy constraints
-        for index in range(len(route)):
-            i = route[index]
-            if i == "D0_end":
-                break
-            else:
-                if i in self.clients:
-                    model.addConstr(y[index + 1] <= y[index] - self.h * self.arcs[route[index], route[index + 1]])
-                else:
-                    model.addConstr(y[index + 1] <= Y[index] - self.h * self.arcs[route[index], route[index + 1]])
+    def time_lp(self, route):
+        """
+        This is the function to check if the time constraint can be satisfied with an LP
+        :param route: list of nodes which is a route
+        :return: true if time allowed and false otherwise
+        """
+        # only care about the time, no energy, so only consider the energy state change at stations
+        return self.route_lp(route, energy=False).solve()
 
-        # departure and arrival energy constraint
-        for i in range(len(route)):
-            if route[i] in self.stations + self.depot_start + self.depot_end:
-                model.addConstr(y[i] <= Y[i])
+    def energy_lp(self, route):
+        """
+        This is the function to check only the energy constraint with an LP
+        :param route: lsit of nodes
+        :return: true if energy constraint can be satisfied and false otherwise
+        """
+        return self.route_lp(route, time=False).solve()
 
-        # solve the model and optimize
-        model.optimize()
+    def schedule(self, route):
+        """
+        This is the function to get the arrival times, arrival energy, departure energy and recharge of a route
+        The schedule is computed once per route with the selected backend and shared through the route cache
+        :param route: list of nodes
+        :return: RouteSchedule, None if the route is not feasible
+        """
+        return self.cache.lookup(
+            ("schedule", self.backend, RouteCache.fingerprint(route)), lambda: self.solve_schedule(route)
+        )
 
-        if model.status == GRB.OPTIMAL:
-            return True
-        if model.status == GRB.INFEASIBLE or model.status == GRB.UNBOUNDED:
-            return False
-        return False
+    def solve_schedule(self, route):
+        """
+        This is the function to compute the schedule of a route with the selected backend, without the cache
+        The LP returns any feasible schedule (its objective is 0), the labeling one charges each station only up to the
+        energy the rest of the route needs, so a station is fully charged only when the route requires it
+        :param route: list of nodes
+        :return: RouteSchedule, None if the route is not feasible
+        """
+        self.solves["schedule"] += 1
+        if self.backend == "gurobi":
+            result = self.schedule_lp(route)
+        else:
+            result = self.labels.schedule(route)
+            if self.backend == "verify" and (result is None) != (self.schedule_lp(route) is None):
+                raise ValueError(f"Labeling and LP schedules disagree on the feasibility of {route}")
+        if result is None:
+            return None
+        start, arrival, departure = result
+        recharge = [
+            departure[i] - arrival[i] if route[i] in self.station_set else 0.0 for i in range(len(route))
+        ]
+        return RouteSchedule(tuple(start), tuple(arrival), tuple(departure), tuple(recharge))
+
+    def schedule_lp(self, route):
+        """
+        This is the function to get a feasible schedule of a route with one LP
+        :param route: list of nodes
+        :return: tuple of lists (service start times, arrival energy, departure energy), None if infeasible
+        """
+        lp = self.route_lp(route)
+        if not lp.solve():
+            return None
+        # for clients the departure energy variable is not constrained, the departure energy is the arrival energy
+        arrival = [energy.x for energy in lp.y]
+        return (
+            [time.x for time in lp.t], arrival,
+            [energy.x if route[i] not in self.client_set else arrival[i] for i, energy in enumerate(lp.Y)]
+        )
 
-    # notice: when using this function, the route must be feasible
     def time_extractor(self, route):
-        # create the model first
-        model = gp.Model("route_check_time_energy")
-
-        # set the output flag as 0 to avoid outcome showing
-        model.setParam('OutputFlag', 0)
-
-        # create the decision variables, times and energy states
-        t = []
-        y = []
-        Y = []
-        for i in range(len(route)):
-            t.append(model.addVar(lb=self.ready_time[route[i]], ub=self.due_date[route[i]], vtype=GRB.CONTINUOUS))
-            Y.append(model.addVar(lb=0, ub=self.Q, vtype=GRB.CONTINUOUS))
-            y.append(model.addVar(lb=0, ub=self.Q, vtype=GRB.CONTINUOUS))
-
-        # create objective function, for checking feasibility, objective is set as 0
-        model.setObjective(0, GRB.MINIMIZE)
-
-        # create constraints to check the time and energy
-        # time constraints
-        for index in range(len(route)):
-            i = route[index]
-            if i == "D0_end":
-                break
-            else:
-                if i in self.stations:
-                    model.addConstr(
-                        t[index] + self.times[route[index], route[index + 1]] + self.g * (Y[index] - y[index]) <= t[
-                            index + 1]
-                    )
-                else:
-                    model.addConstr(
-                        t[index] + self.times[route[index], route[index + 1]] + self.service_time[route[index]] <= t[
-                            index + 1]
-                    )
-
-        # energy constraints
-        for index in range(len(route)):
-            i = route[index]
-            if i == "D0_end":
-                break
-            else:
-                if i in self.clients:
-                    model.addConstr(y[index + 1] <= y[index] - self.h * self.arcs[route[index], route[index + 1]])
-                else:
-                    model.addConstr(y[index + 1] <= Y[index] - self.h * self.arcs[route[index], route[index + 1]])
-
-        # departure and arrival energy constraint
-        for i in range(len(route)):
-            if route[i] in self.stations + self.depot_start + self.depot_end:
-                model.addConstr(y[i] <= Y[i])
-
-        # solve the model and optimize
-        model.optimize()
-
-        if model.status == GRB.OPTIMAL:
-            return [time.x for time in t]
-        raise "This route is not feasible"
+        """
+        This is the function to get the service start times of a route
+        :param route: list of nodes
+        :return: list of times
+        """
+        return list(self.feasible_schedule(route).arrival_times)
 
     def energy_extractor(self, route):
-        # create the model first
-        model = gp.Model("route_check_time_energy")
-
-        # set the output flag as 0 to avoid outcome showing
-        model.setParam('OutputFlag', 0)
-
-        # create the decision variables, times and energy states
-        t = []
-        y = []
-        Y = []
-        for i in range(len(route)):
-            t.append(model.addVar(lb=self.ready_time[route[i]], ub=self.due_date[route[i]], vtype=GRB.CONTINUOUS))
-            Y.append(model.addVar(lb=0, ub=self.Q, vtype=GRB.CONTINUOUS))
-            y.append(model.addVar(lb=0, ub=self.Q, vtype=GRB.CONTINUOUS))
-
-        # create objective function, for checking feasibility, objective is set as 0
-        model.setObjective(0, GRB.MINIMIZE)
-
-        # create constraints to check the time and energy
-        # time constraints
-        for index in range(len(route)):
-            i = route[index]
-            if i == "D0_end":
-                break
-            else:
-                if i in self.stations:
-                    model.addConstr(
-                        t[index] + self.times[route[index], route[index + 1]] + self.g * (Y[index] - y[index]) <= t[
-                            index + 1]
-                    )
-                else:
-                    model.addConstr(
-                        t[index] + self.times[route[index], route[index + 1]] + self.service_time[route[index]] <= t[
-                            index + 1]
-                    )
-
-        # energy constraints
-        for index in range(len(route)):
-            i = route[index]
-            if i == "D0_end":
-                break
-            else:
-                if i in self.clients:
-                    model.addConstr(y[index + 1] <= y[index] - self.h * self.arcs[route[index], route[index + 1]])
-                else:
-                    model.addConstr(y[index + 1] <= Y[index] - self.h * self.arcs[route[index], route[index + 1]])
-
-        # departure and arrival energy constraint
-        for i in range(len(route)):
-            if route[i] in self.stations + self.depot_start + self.depot_end:
-                model.addConstr(y[i] <= Y[i])
-
-        # solve the model and optimize
-        model.optimize()
-
-        # here for clients the departure energy should use the arrival energy
-        # departure energy is the same as arrival energy
-        # and for clients the departure energy decision variable is not included in the constraints, so missing value
-        if model.status == GRB.OPTIMAL:
-            return [arrival_energy.x for arrival_energy in y]
-        raise "This route is not feasible"
+        """
+        This is the function to get the arrival energy of a route
+        :param route: list of nodes
+        :return: list of energy levels
+        """
+        return list(self.feasible_schedule(route).arrival_energy)
 
     def energy_extractor_departure(self, route):
-        # create the model first
-        model = gp.Model("route_check_time_energy")
-
-        # set the output flag as 0 to avoid outcome showing
-        model.setParam('OutputFlag', 0)
-
-        # create the decision variables, times and energy states
-        t = []
-        y = []
-        Y = []
-        for i in range(len(route)):
-            t.append(model.addVar(lb=self.ready_time[route[i]], ub=self.due_date[route[i]], vtype=GRB.CONTINUOUS))
-            Y.append(model.addVar(lb=0, ub=self.Q, vtype=GRB.CONTINUOUS))
-            y.append(model.addVar(lb=0, ub=self.Q, vtype=GRB.CONTINUOUS))
-
-        # create objective function, for checking feasibility, objective is set as 0
-        model.setObjective(0, GRB.MINIMIZE)
-
-        # create constraints to check the time and energy
-        # time constraints
-        for index in range(len(route)):
-            i = route[index]
-            if i == "D0_end":
-                break
-            else:
-                if i in self.stations:
-                    model.addConstr(
-                        t[index] + self.times[route[index], route[index + 1]] + self.g * (Y[index] - y[index]) <= t[
-                            index + 1]
-                    )
-                else:
-                    model.addConstr(
-                        t[index] + self.times[route[index], route[index + 1]] + self.service_time[route[index]] <= t[
-                            index + 1]
-                    )
-
-        # energy constraints
-        for index in range(len(route)):
-            i = route[index]
-            if i == "D0_end":
-                break
-            else:
-                if i in self.clients:
-                    model.addConstr(y[index + 1] <= y[index] - self.h * self.arcs[route[index], route[index + 1]])
-                else:
-                    model.addConstr(y[index + 1] <= Y[index] - self.h * self.arcs[route[index], route[index + 1]])
-
-        # departure and arrival energy constraint
-        for i in range(len(route)):
-            if route[i] in self.stations + self.depot_start + self.depot_end:
-                model.addConstr(y[i] <= Y[i])
-
-        # solve the model and optimize
-        model.optimize()
+        """
+        This is the function to get the departure energy of a route, the arrival energy for the clients
+        :param route: list of nodes
+        :return: list of energy levels
+        """
+        return list(self.feasible_schedule(route).departure_energy)
 
-        # here for clients the departure energy should use the arrival energy
-        # departure energy is the same as arrival energy
-        # and for clients the departure energy decision variable is not included in the constraints, so missing value
-        if model.status == GRB.OPTIMAL:
-            return [arrival_energy.x for arrival_energy in Y]
-        raise "This route is not feasible"
+    def feasible_schedule(self, route):
+        """
+        This is the function to get the schedule of a route which must be feasible
+        :param route: list of nodes
+        :return: RouteSchedule
+        """
+        schedule = self.schedule(route)
+        if schedule is None:
+            raise ValueError("This route is not feasible")
+        return schedule
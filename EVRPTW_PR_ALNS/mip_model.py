@@ -1,7 +1,7 @@
 import gurobipy as gp
 from gurobipy import GRB
 from EVRPTW_PR_ALNS.file_reader import get_parameters
-from EVRPTW_PR_ALNS.helper_function import Helper
+from EVRPTW_PR_ALNS.context import InstanceContext
 
 
 def milp_model(file):
@@ -161,7 +161,7 @@ def milp_model(file):
 
     # if optimal solution, then extract the objective and optimal solution
     # create the data structures to get the number of vehicles as well as the routes
-    helper = Helper(parameters)
+    helper = InstanceContext(parameters).helper
 
     binary_arcs = {}
     for i in all_nodes:
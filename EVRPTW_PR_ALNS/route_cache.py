@@ -0,0 +1,86 @@
+from collections import OrderedDict
+
+"""
+This file contains the bounded route cache shared by the checkers and operators of one instance
+"""
+
+
+class RouteCache:
+    def __init__(self, maxsize=200000):
+        """
+        Least recently used cache keyed by immutable route fingerprints
+        :param maxsize: maximum number of entries kept, the least recently used entries are evicted beyond it
+        """
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def fingerprint(route):
+        """
+        This is the function to get the immutable key of a route
+        :param route: list of nodes
+        :return: tuple of nodes
+        """
+        return tuple(route)
+
+    def get(self, key, default=None):
+        """
+        This is the function to look up a key and refresh its recency
+        :param key: the cache key
+        :param default: the value returned on a miss
+        :return: the cached value or the default
+        """
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Void function, store a value and evict the least recently used entries beyond the cap
+        :param key: the cache key
+        :param value: the value to store
+        """
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def lookup(self, key, compute):
+        """
+        This is the function to get the cached value or compute and store it
+        :param key: the cache key
+        :param compute: function without argument computing the value on a miss
+        :return: the value
+        """
+        value = self.get(key, self)
+        if value is self:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """
+        Void function, drop all the entries, used when the data behind the cached values changes
+        """
+        self.entries.clear()
+
+    def stats(self):
+        """
+        This is the function to get the counters of the cache
+        :return: dict of size, hits, misses, evictions and hit rate
+        """
+        calls = self.hits + self.misses
+        return {"size": len(self.entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hits / calls if calls else 0.0}
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,271 @@
+from collections.abc import MutableSequence
+
+"""
+This file contains the solution type of ALNS, the routes together with their cached distance, load and feasibility
+"""
+
+
+def node_positions(routes):
+    """
+    This is the function to index where the nodes of the routes are
+    :param routes: list of routes, or a Solution which keeps the index of its clients up to date
+    :return: dict from the node to (route index, position), a node visited more than once keeps its last visit
+    """
+    if isinstance(routes, Solution):
+        return routes.positions()
+    return {node: (i, j) for i, route in enumerate(routes) for j, node in enumerate(route)}
+
+
+def copy_routes(routes):
+    """
+    This is the function to copy the routes an operator edits, the argument is not changed
+    :param routes: list of routes, or a Solution
+    :return: the copy, a Solution keeps its records and its position index
+    """
+    if isinstance(routes, Solution):
+        return routes.copy()
+    return list(routes)
+
+
+def remove_nodes(routes, i, positions):
+    """
+    Void function, remove the nodes at some positions of a route
+    :param routes: list of routes, or a Solution which shifts the positions of the rest of the route in its index
+    :param i: index of the route
+    :param positions: set of the positions to be removed
+    """
+    if isinstance(routes, Solution):
+        routes.remove_nodes(i, positions)
+    else:
+        routes[i] = [node for j, node in enumerate(routes[i]) if j not in positions]
+
+
+def insert_node(routes, i, j, node):
+    """
+    Void function, insert a node in a route
+    :param routes: list of routes, or a Solution which shifts the positions of the rest of the route in its index
+    :param i: index of the route
+    :param j: position of the node in the new route
+    :param node: name of the node
+    """
+    if isinstance(routes, Solution):
+        routes.insert_node(i, j, node)
+    else:
+        routes[i] = routes[i][:j] + [node] + routes[i][j:]
+
+
+class RouteRecord:
+    __slots__ = ("route", "distance", "load", "feasible")
+
+    def __init__(self, route, distance, load, feasible=None):
+        """
+        Cached values of one route, the feasibility is only checked when asked
+        :param route: tuple of nodes, the fingerprint of the route
+        :param distance: distance of the route
+        :param load: total demand of the route
+        :param feasible: true or false once checked, None before
+        """
+        self.route = route
+        self.distance = distance
+        self.load = load
+        self.feasible = feasible
+
+
+class Solution(MutableSequence):
+    def __init__(self, routes, helper, parent=None):
+        """
+        List of routes with a record per route, the records of the routes equal to a route of the parent are shared
+        The routes are treated as immutable, a changed route has to be assigned again, solution[i] = new_route, or
+        edited with remove_nodes and insert_node
+        :param routes: list of routes, each a list of nodes
+        :param helper: Helper of the instance, computes the distance, load and feasibility of the new routes
+        :param parent: the solution the routes were derived from, for example the one given to the operators
+        """
+        self.helper = helper
+        self.routes = list(routes)
+        shared = {record.route: record for record in parent.records} if parent is not None else {}
+        self.records = [shared.get(tuple(route)) or self.record(route) for route in self.routes]
+        # same summation order as Helper.total_distance_list, summed again after each edit to keep it
+        self.distance = sum(record.distance for record in self.records)
+        self.all_feasible = None
+        # client -> (route index, position), built at the first call of positions, then updated by each edit and
+        # carried by copy from the destroyed solution to the repaired one
+        self.client_positions = None
+
+    def record(self, route):
+        """
+        This is the function to compute the record of a route
+        :param route: list of nodes
+        :return: RouteRecord
+        """
+        return RouteRecord(
+            tuple(route), self.helper.distance_one_route(route), sum(self.helper.demand[node] for node in route)
+        )
+
+    def copy(self):
+        """
+        This is the function to copy the solution before an edit, the routes and the records are shared
+        :return: Solution
+        """
+        solution = Solution.__new__(Solution)
+        solution.helper = self.helper
+        solution.routes = list(self.routes)
+        solution.records = list(self.records)
+        solution.distance = self.distance
+        solution.all_feasible = self.all_feasible
+        solution.client_positions = dict(self.client_positions) if self.client_positions is not None else None
+        return solution
+
+    def positions(self):
+        """
+        This is the function to get where the clients are, the clients are visited once unlike depots and stations
+        :return: dict from the client to (route index, position)
+        """
+        if self.client_positions is None:
+            self.client_positions = {}
+            self.locate(0, len(self.routes))
+        return self.client_positions
+
+    def locate(self, start, stop, position=0):
+        """
+        Void function, index the clients of the routes from start to stop, after an edit moved them
+        :param start: index of the first route to index
+        :param stop: index after the last route to index
+        :param position: first position to index in the route start, the positions before it did not move
+        """
+        if self.client_positions is None:
+            return
+        client_set = self.helper.client_set
+        for i in range(start, stop):
+            route = self.routes[i]
+            for j in range(position if i == start else 0, len(route)):
+                if route[j] in client_set:
+                    self.client_positions[route[j]] = (i, j)
+
+    def forget(self, nodes):
+        """
+        Void function, drop the clients leaving the solution from the index
+        :param nodes: nodes removed from the routes
+        """
+        if self.client_positions is None:
+            return
+        for node in nodes:
+            if node in self.helper.client_set:
+                self.client_positions.pop(node, None)
+
+    def update(self, index, route, position):
+        """
+        Void function, replace a route whose nodes before a position did not change
+        :param index: index of the route
+        :param route: the new route
+        :param position: first position which changed, its clients and the ones after it are indexed again
+        """
+        self.routes[index] = route
+        self.records[index] = self.record(route)
+        self.distance = sum(record.distance for record in self.records)
+        self.all_feasible = None
+        self.locate(index, index + 1, position)
+
+    def remove_nodes(self, index, positions):
+        """
+        Void function, remove the nodes at some positions of a route
+        :param index: index of the route
+        :param positions: set of the positions to be removed
+        """
+        route = self.routes[index]
+        self.forget(route[j] for j in positions)
+        self.update(index, [node for j, node in enumerate(route) if j not in positions], min(positions))
+
+    def insert_node(self, index, position, node):
+        """
+        Void function, insert a node in a route
+        :param index: index of the route
+        :param position: position of the node in the new route
+        :param node: name of the node
+        """
+        route = self.routes[index]
+        self.update(index, route[:position] + [node] + route[position:], position)
+
+    def apply(self, repair):
+        """
+        This is the function to repair each route, only the changed routes get a new record and are indexed again
+        :param repair: function from a route to the repaired route
+        :return: the solution itself
+        """
+        for index, route in enumerate(self.routes):
+            self[index] = repair(route)
+        return self
+
+    def feasible(self) -> bool:
+        """
+        This is the function to check if all the routes are feasible, each route is checked at most once
+        :return: true if all the routes are feasible and false otherwise
+        """
+        if self.all_feasible is None:
+            self.all_feasible = True
+            for record in self.records:
+                if record.feasible is None:
+                    record.feasible = self.helper.feasible_route(list(record.route))
+                if not record.feasible:
+                    self.all_feasible = False
+                    break
+        return self.all_feasible
+
+    def vehicles(self) -> int:
+        """
+        This is the function to get the number of vehicles, one per route
+        :return: the number of routes
+        """
+        return len(self.routes)
+
+    def loads(self):
+        """
+        This is the function to get the cargo load of each route
+        :return: list of loads
+        """
+        return [record.load for record in self.records]
+
+    def __getitem__(self, index):
+        return self.routes[index]
+
+    def __iter__(self):
+        return iter(self.routes)
+
+    def __setitem__(self, index, route):
+        if isinstance(index, slice):
+            raise TypeError("Routes of a solution are replaced one by one")
+        index = range(len(self.routes))[index]
+        # an unchanged route keeps its record and its positions
+        if route == self.routes[index]:
+            self.routes[index] = route
+            return
+        self.forget(self.routes[index])
+        self.update(index, route, 0)
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            raise TypeError("Routes of a solution are removed one by one")
+        index = range(len(self.routes))[index]
+        self.forget(self.routes[index])
+        del self.routes[index]
+        del self.records[index]
+        self.distance = sum(record.distance for record in self.records)
+        if self.all_feasible is False:
+            self.all_feasible = None
+        # the routes after the removed one move up by one
+        self.locate(index, len(self.routes))
+
+    def __len__(self):
+        return len(self.routes)
+
+    def insert(self, index, route):
+        # same clamping as list.insert, the new route and the ones after it are indexed again, none for an append
+        index = min(max(index + len(self.routes) if index < 0 else index, 0), len(self.routes))
+        self.routes.insert(index, route)
+        self.records.insert(index, self.record(route))
+        self.distance = sum(record.distance for record in self.records)
+        self.all_feasible = None
+        self.locate(index, len(self.routes))
+
+    def __repr__(self):
+        return f"Solution({self.routes!r})"
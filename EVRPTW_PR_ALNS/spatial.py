@@ -0,0 +1,72 @@
+from math import ceil, floor
+
+"""
+This file contains the spatial index of an instance, the zones of the plane and the clients located in each of them
+"""
+
+
+class ZoneGrid:
+    def __init__(self, parameters, increment=5):
+        """
+        Split the bounding box of all the nodes (not only the clients) into increment x increment zones, and bucket the
+        clients of each zone, built once per instance
+        :param parameters: parameter dict of a graph instance
+        :param increment: number of zones along each axis
+
+        The zones are closed boxes stepped by the ceiling of their width, as in the zone removal of the paper, so a
+        client on a common border is in both zones
+        """
+        self.increment = increment
+        self.locations = parameters["locations"]
+
+        # find the bound of the all the graph
+        x_lower = min(values[0] for values in self.locations.values())
+        x_upper = max(values[0] for values in self.locations.values())
+        y_lower = min(values[1] for values in self.locations.values())
+        y_upper = max(values[1] for values in self.locations.values())
+
+        # first decide the increments, then the zones as (x lower, x upper, y lower, y upper)
+        x_increment = (ceil(x_upper) - floor(x_lower)) / increment
+        y_increment = (ceil(y_upper) - floor(y_lower)) / increment
+        self.zones = []
+        for i in range(floor(x_lower), ceil(x_upper), ceil(x_increment)):
+            for j in range(floor(y_lower), ceil(y_upper), ceil(y_increment)):
+                self.zones.append((i, i + x_increment, j, j + y_increment))
+
+        # the clients of each zone, in the order of the client list, and the zones of each client
+        self.buckets = []
+        self.client_zones = {client: [] for client in parameters["clients"]}
+        for index, zone in enumerate(self.zones):
+            bucket = tuple(client for client in parameters["clients"] if self.contains(zone, client))
+            for client in bucket:
+                self.client_zones[client].append(index)
+            self.buckets.append(bucket)
+
+        # indices of the zones with at least one client, the only ones worth sampling
+        self.occupied = [index for index, bucket in enumerate(self.buckets) if bucket]
+
+    def contains(self, zone, node):
+        """
+        This is the function to check if a node is located in a zone, borders included
+        :param zone: (x lower, x upper, y lower, y upper)
+        :param node: name of the node
+        :return: true if the node is in the zone and false otherwise
+        """
+        x, y = self.locations[node]
+        return zone[0] <= x <= zone[1] and zone[2] <= y <= zone[3]
+
+    def clients(self, index):
+        """
+        This is the function to get the clients of a zone
+        :param index: index of the zone in zones
+        :return: tuple of the clients located in the zone
+        """
+        return self.buckets[index]
+
+    def zones_of(self, client):
+        """
+        This is the function to get the zones of a client
+        :param client: name of the client
+        :return: list of the indices of the zones containing the client, more than one on a border
+        """
+        return self.client_zones[client]
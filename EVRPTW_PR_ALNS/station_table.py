@@ -0,0 +1,103 @@
+import numpy as np
+
+"""
+This file contains the station table, the charging stations of every arc ranked by the detour of their insertion
+"""
+
+
+class StationTable:
+    def __init__(self, parameters, m=8):
+        """
+        Rank the original stations of every arc (i, j) by the detour arcs[i, s] + arcs[s, j] - arcs[i, j], only the m
+        least detour ones are kept per arc, the others are ranked on demand
+        :param parameters: parameter dict of a graph instance
+        :param m: number of stations kept per arc
+
+        The table is built at the first lookup, so an instance solved without station insertion never pays for it
+        """
+        self.node_index = parameters["node_index"]
+        self.stations = parameters["original_stations"]
+        self.m = min(m, len(self.stations))
+        self.distances = np.asarray(parameters["distance_matrix"], dtype=float)
+        columns = np.array([self.node_index[station] for station in self.stations], dtype=int)
+        self.to_station = self.distances[:, columns]
+        self.from_station = self.distances[columns, :].T
+        # the same detours in lists, a short ranking on demand is faster without numpy
+        self.to_rows, self.from_rows = self.to_station.tolist(), self.from_station.tolist()
+
+        # a station which cannot be reached from i or cannot reach j with a full battery makes no feasible insertion
+        self.reach_from = (parameters["h"] * self.to_station <= parameters["Q"]).tolist()
+        self.reach_to = (parameters["h"] * self.from_station <= parameters["Q"]).tolist()
+        self.index = None
+
+    def build(self):
+        """
+        This is the function to build the (n, n, m) index of the m least detour stations of every arc, one row of
+        tails at a time, ties in the order of original_stations as the min over the list
+        :return: the index array
+        """
+        n, m = len(self.distances), self.m
+        index = np.empty((n, n, m), dtype=np.int32)
+        for i in range(n):
+            # detour[j, s] of the insertion of station s on the arc (i, j)
+            detour = self.to_station[i][None, :] + self.from_station - self.distances[i][:, None]
+            if m == detour.shape[1]:
+                index[i] = np.argsort(detour, axis=1, kind="stable")
+                continue
+            kept = np.argpartition(detour, m - 1, axis=1)[:, :m]
+            values = np.take_along_axis(detour, kept, axis=1)
+            kept = np.take_along_axis(kept, np.lexsort((kept, values), axis=1), axis=1)
+            index[i] = kept
+            # a tie at the m-th detour may have left out a station which comes first in the list, rank those rows fully
+            threshold = np.take_along_axis(detour, kept[:, -1:], axis=1)
+            for j in np.flatnonzero((detour <= threshold).sum(axis=1) > m):
+                index[i, j] = np.argsort(detour[j], kind="stable")[:m]
+        return index
+
+    def ranked(self, i, j, start=0):
+        """
+        This is the function to get the stations of an arc by increasing detour
+        :param i: integer id of the tail node
+        :param j: integer id of the head node
+        :param start: rank of the first station returned, from m the stations out of the index are ranked on demand
+        :return: list of the station positions in original_stations
+        """
+        if start < self.m:
+            if self.index is None:
+                self.index = self.build()
+            return self.index[i, j, start:].tolist()
+        direct = self.distances[i, j]
+        detour = [to + back - direct for to, back in zip(self.to_rows[i], self.from_rows[j])]
+        return sorted(range(len(detour)), key=detour.__getitem__)[start:]
+
+    def candidates(self, i, j):
+        """
+        This is the function to get the stations of an arc, the least detour first
+        :param i: tail node of the arc
+        :param j: head node of the arc
+        :return: generator of the reachable stations, empty if none
+        """
+        i, j = self.node_index[i], self.node_index[j]
+        reach_from, reach_to = self.reach_from[i], self.reach_to[j]
+        for s in self.ranked(i, j):
+            if reach_from[s] and reach_to[s]:
+                yield self.stations[s]
+        # the first m stations did not do, rank the others only now
+        if self.m < len(self.stations):
+            for s in self.ranked(i, j, self.m):
+                if reach_from[s] and reach_to[s]:
+                    yield self.stations[s]
+
+    def nearest(self, i, j, exclude=()):
+        """
+        This is the function to get the station of least detour of an arc, reachable or not
+        :param i: tail node of the arc
+        :param j: head node of the arc
+        :param exclude: stations not to return
+        :return: the first station not excluded
+        """
+        i, j = self.node_index[i], self.node_index[j]
+        for start in (0, self.m):
+            for s in self.ranked(i, j, start):
+                if self.stations[s] not in exclude:
+                    return self.stations[s]
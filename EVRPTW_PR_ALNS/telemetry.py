@@ -0,0 +1,127 @@
+import json
+from collections import namedtuple
+from time import perf_counter
+import numpy as np
+
+"""
+This file contains the run result of ALNS and the profiler of the destroy and repair operators
+"""
+
+
+class RunResult(namedtuple(
+        "RunResult", ["distance", "vehicles", "initial_distance", "initial_vehicles", "duration", "best_solution"])):
+    """
+    Result of ALNS.run, the same 6 values as before, the profiling report in the report attribute and the
+    termination criterion which fired in the stop_reason attribute
+    """
+
+    def __new__(
+            cls, distance, vehicles, initial_distance, initial_vehicles, duration, best_solution, report=None,
+            stop_reason=None
+    ):
+        result = super().__new__(cls, distance, vehicles, initial_distance, initial_vehicles, duration, best_solution)
+        result.report = report
+        result.stop_reason = stop_reason
+        return result
+
+    def __getnewargs__(self):
+        return (*self, self.report, self.stop_reason)
+
+    def _replace(self, **changes):
+        """
+        This is the function to copy the result with some values changed, the report and the stop reason included
+        :param changes: the new values by name, for example duration
+        :return: RunResult
+        """
+        values = {**self._asdict(), "report": self.report, "stop_reason": self.stop_reason, **changes}
+        return RunResult(**values)
+
+
+class OperatorProfiler:
+    # operator families, in the order of the function dicts of ALNS
+    families = ("normal_cr", "route_cr", "ci", "sr", "si")
+
+    def __init__(self, solve_counts, operators=None):
+        """
+        Collect the latency, outcome and feasibility solves of every operator call of one run
+        :param solve_counts: Counter of the backend solves shared by the checkers, see MIPCheck.solves
+        :param operators: dict from the family to the operator names, for example the function dicts of ALNS, so
+        that the operators never selected are reported with zero counts
+        """
+        self.solve_counts = solve_counts
+        # the counter is shared by the runs on the same parameters, only the solves of this run are reported
+        self.solve_offsets = dict(solve_counts)
+        self.latencies = {}
+        self.counts = {}
+        for family, names in (operators or {}).items():
+            for name in names:
+                self.operator(family, name)
+
+    def operator(self, family, name):
+        """
+        This is the function to get the counters of an operator, created on first use
+        :param family: operator family, one of families
+        :param name: key of the operator in its function dict
+        :return: dict of the counters
+        """
+        key = (family, name)
+        if key not in self.counts:
+            self.latencies[key] = []
+            self.counts[key] = {"calls": 0, "accepted": 0, "improved": 0, "solves": 0}
+        return self.counts[key]
+
+    def call(self, family, name, function, *args):
+        """
+        This is the function to call an operator and record its latency and the backend solves it triggered
+        :param family: operator family, one of families
+        :param name: key of the operator in its function dict
+        :param function: the operator
+        :param args: arguments of the operator
+        :return: the result of the operator
+        """
+        counts = self.operator(family, name)
+        solves = sum(self.solve_counts.values())
+        start = perf_counter()
+        result = function(*args)
+        self.latencies[family, name].append(perf_counter() - start)
+        counts["calls"] += 1
+        counts["solves"] += sum(self.solve_counts.values()) - solves
+        return result
+
+    def outcome(self, operators, accepted, improved):
+        """
+        Void function, record the acceptance of the solution built by a destroy and repair pair
+        :param operators: list of (family, name) of the operators which built the solution
+        :param accepted: true if the solution became the current one
+        :param improved: true if the solution became the best one
+        """
+        for family, name in operators:
+            counts = self.operator(family, name)
+            counts["accepted"] += accepted
+            counts["improved"] += improved
+
+    def report(self, **summary):
+        """
+        This is the function to get the structured report of the run
+        :param summary: values of the whole run added to the report, for example iterations and duration
+        :return: dict with the summary, the solves of the run by check name and the statistics of the operators
+        """
+        operators = {family: {} for family in self.families}
+        for (family, name), counts in self.counts.items():
+            latencies = np.array(self.latencies[family, name]) if self.latencies[family, name] else np.zeros(1)
+            operators.setdefault(family, {})[name] = {
+                **counts, "total": float(latencies.sum()), "mean": float(latencies.mean()),
+                "p50": float(np.percentile(latencies, 50)), "p95": float(np.percentile(latencies, 95))
+            }
+        solves = {name: count - self.solve_offsets.get(name, 0) for name, count in self.solve_counts.items()}
+        return {**summary, "solves": solves, "operators": operators}
+
+    @staticmethod
+    def write(report, file):
+        """
+        Void function, write a report to a JSON file
+        :param report: dict of the report
+        :param file: path of the JSON file
+        """
+        with open(file, 'w') as handle:
+            json.dump(report, handle, indent=2)
@@ -19,4 +19,11 @@ setup(
         'Programming Language :: Python :: 3',
     ],
     python_requires='>=3.8',
+    entry_points={
+        'console_scripts': [
+            'evrptw-batch=EVRPTW_PR_ALNS.batch:main',
+            'evrptw-benchmark=EVRPTW_PR_ALNS.benchmark:main',
+            'evrptw-microbenchmark=EVRPTW_PR_ALNS.microbenchmark:main',
+        ],
+    },
 )
\ No newline at end of file
@@ -0,0 +1,40 @@
+import unittest
+from pathlib import Path
+from EVRPTW_PR_ALNS.ALNS import ALNS
+from EVRPTW_PR_ALNS.telemetry import RunResult
+
+INSTANCES = Path(__file__).resolve().parents[1] / "EVRPTW_PR_ALNS" / "_instances"
+RUN = dict(N=20, NSR=5, NRR=10, nRR=2, Nc=10, Ns=10)
+
+
+class TestRunParallel(unittest.TestCase):
+    def check_result(self, result, statistics, seeds):
+        self.assertIsInstance(result, RunResult)
+        self.assertEqual(result.stop_reason, "iterations")
+        self.assertIsNotNone(result.report)
+        self.assertEqual(result.report["stop_reason"], result.stop_reason)
+        self.assertEqual(len(statistics), len(seeds))
+        # the best search gives its result, only the duration is the one of the whole pool
+        best = min(statistics, key=lambda statistic: (statistic["vehicles"], statistic["distance"]))
+        self.assertEqual((result.distance, result.vehicles), (best["distance"], best["vehicles"]))
+        self.assertGreaterEqual(result.duration, best["duration"])
+
+    def test_single_worker(self):
+        seeds = [1, 2]
+        result, statistics = ALNS(str(INSTANCES / "c101C5.txt")).run_parallel(workers=1, seeds=seeds, **RUN)
+        self.check_result(result, statistics, seeds)
+
+    def test_process_pool(self):
+        seeds = [1, 2]
+        result, statistics = ALNS(str(INSTANCES / "c101C5.txt")).run_parallel(workers=2, seeds=seeds, **RUN)
+        self.check_result(result, statistics, seeds)
+
+    def test_replace(self):
+        result = RunResult(1.0, 2, 3.0, 4, 5.0, [], {"iterations": 6}, "time_limit")
+        replaced = result._replace(duration=7.0)
+        self.assertEqual(tuple(replaced), (1.0, 2, 3.0, 4, 7.0, []))
+        self.assertEqual((replaced.report, replaced.stop_reason), (result.report, result.stop_reason))
+
+
+if __name__ == "__main__":
+    unittest.main()
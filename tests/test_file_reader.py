@@ -0,0 +1,52 @@
+import pickle
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+import numpy as np
+from EVRPTW_PR_ALNS.file_reader import get_parameters
+
+INSTANCES = Path(__file__).resolve().parents[1] / "EVRPTW_PR_ALNS" / "_instances"
+
+
+class TestArcMatrixPickle(unittest.TestCase):
+    def setUp(self):
+        # a private copy of the instance, so that the cache entry is created and mapped by this test
+        self.folder = tempfile.mkdtemp()
+        self.file = shutil.copy(INSTANCES / "c101C10.txt", self.folder)
+        self.parameters = get_parameters(self.file)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_mapped_matrix_is_sent_as_its_file(self):
+        arcs = self.parameters["arcs"]
+        self.assertIsNotNone(arcs.path)
+        data = pickle.dumps(arcs)
+        # the file name and the name index, not the n x n floats
+        self.assertLess(len(data), arcs.matrix.nbytes)
+        copy = pickle.loads(data)
+        self.assertIsInstance(copy.matrix, np.memmap)
+        self.assertEqual(copy.path, arcs.path)
+        self.assertTrue(np.array_equal(copy.matrix, arcs.matrix))
+        client = self.parameters["clients"][0]
+        self.assertEqual(copy["D0", client], arcs["D0", client])
+
+    def test_updated_matrix_is_sent_as_a_copy(self):
+        times = self.parameters["times"]
+        client = self.parameters["clients"][0]
+        times["D0", client] = 1234.5
+        copy = pickle.loads(pickle.dumps(times))
+        self.assertEqual(copy["D0", client], 1234.5)
+        # the update stays private to this process, the file is unchanged
+        self.assertNotEqual(np.load(times.path)[times.node_index["D0"], times.node_index[client]], 1234.5)
+
+    def test_matrix_in_memory(self):
+        arcs = get_parameters(self.file, cache=False)["arcs"]
+        self.assertIsNone(arcs.path)
+        copy = pickle.loads(pickle.dumps(arcs))
+        self.assertTrue(np.array_equal(copy.matrix, arcs.matrix))
+
+
+if __name__ == "__main__":
+    unittest.main()
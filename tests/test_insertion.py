@@ -0,0 +1,52 @@
+import random
+import unittest
+from pathlib import Path
+from EVRPTW_PR_ALNS.file_reader import get_parameters
+from EVRPTW_PR_ALNS.context import InstanceContext
+from EVRPTW_PR_ALNS.Initial import Heuristic
+from EVRPTW_PR_ALNS.helper_function import Helper
+
+INSTANCES = Path(__file__).resolve().parents[1] / "EVRPTW_PR_ALNS" / "_instances"
+
+
+class TestInsertionEvaluator(unittest.TestCase):
+    def check_instance(self, name, seed):
+        context = InstanceContext(get_parameters(str(INSTANCES / name), cache=False))
+        helper, labels = context.helper, context.checker.labels
+        random.seed(seed)
+        routes = Heuristic(context).initial_solution()
+        answers = set()
+        for route in routes:
+            evaluator = helper.insertion_evaluator(route)
+            self.assertTrue(evaluator.exact)
+            for client in random.sample(context.clients, min(10, len(context.clients))):
+                for position in range(1, len(route)):
+                    new_route = route[:position] + [client] + route[position:]
+                    # full re-check of the new route, without the incremental labels and without the cache
+                    expected = labels.time_energy(new_route) and helper.cargo_check(new_route)
+                    with self.subTest(route=route, position=position, client=client):
+                        self.assertEqual(evaluator.feasible(position, client), expected)
+                    answers.add(expected)
+        self.assertEqual(answers, {True, False})
+
+    def test_c101C10(self):
+        self.check_instance("c101C10.txt", seed=1)
+
+    def test_c103C15(self):
+        self.check_instance("c103C15.txt", seed=2)
+
+    def test_r101_21(self):
+        self.check_instance("r101_21.txt", seed=3)
+
+    def test_helper_from_parameters(self):
+        # a helper built from a bare parameter dict builds its own context
+        parameters = get_parameters(str(INSTANCES / "c101C10.txt"), cache=False)
+        helper = Helper(parameters)
+        self.assertIs(helper.parameters, parameters)
+        self.assertIs(helper.context.helper.parameters, parameters)
+        route = ["D0", parameters["clients"][0], "D0_end"]
+        self.assertEqual(helper.feasible_route(route), InstanceContext(parameters).helper.feasible_route(route))
+
+
+if __name__ == "__main__":
+    unittest.main()
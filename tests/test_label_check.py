@@ -0,0 +1,137 @@
+import random
+import unittest
+from pathlib import Path
+from EVRPTW_PR_ALNS.file_reader import get_parameters
+from EVRPTW_PR_ALNS.mip_check import MIPCheck
+
+try:
+    import gurobipy as gp
+    from gurobipy import GRB
+except ImportError:
+    gp = None
+
+INSTANCES = Path(__file__).resolve().parents[1] / "EVRPTW_PR_ALNS" / "_instances"
+CHECKS = ("time", "energy", "time_energy")
+
+
+def random_routes(parameters, rng, count, min_stations=0):
+    """
+    This is the function to draw random routes, a few clients and original stations between the depots
+    :param parameters: parameter dict of a graph instance
+    :param rng: random.Random
+    :param count: number of routes
+    :param min_stations: least number of station visits of a route, at most 2
+    :return: list of routes
+    """
+    clients, stations = parameters["clients"], parameters["original_stations"]
+    routes = []
+    for _ in range(count):
+        nodes = rng.sample(clients, rng.randint(1, min(6, len(clients))))
+        for _ in range(rng.randint(min_stations, 2)):
+            nodes.insert(rng.randint(0, len(nodes)), rng.choice(stations))
+        routes.append(["D0"] + nodes + ["D0_end"])
+    return routes
+
+
+def baseline_model(parameters, route, check):
+    """
+    This is the function to build the model of the original MIPCheck for a route, a new model per call
+    :param parameters: parameter dict of a graph instance
+    :param route: list of nodes
+    :param check: time, energy or time_energy
+    :return: the model and its lists of time, arrival energy and departure energy variables
+    """
+    stations, clients = parameters["stations"], parameters["clients"]
+    times, arcs = parameters["normal_times"], parameters["arcs"]
+    model = gp.Model("route_check_" + check)
+    model.setParam('OutputFlag', 0)
+    t, y, Y = [], [], []
+    for node in route:
+        t.append(model.addVar(lb=parameters["ready_time"][node], ub=parameters["due_date"][node], vtype=GRB.CONTINUOUS))
+        Y.append(model.addVar(lb=0, ub=parameters["Q"], vtype=GRB.CONTINUOUS))
+        y.append(model.addVar(lb=0, ub=parameters["Q"], vtype=GRB.CONTINUOUS))
+    model.setObjective(0, GRB.MINIMIZE)
+
+    # time constraints, the charging time only counts when the energy is checked too
+    if check != "energy":
+        for index, node in enumerate(route[:-1]):
+            if node in stations:
+                charging = parameters["g"] * (Y[index] - y[index]) if check == "time_energy" else 0
+                model.addConstr(t[index] + times[node, route[index + 1]] + charging <= t[index + 1])
+            else:
+                model.addConstr(
+                    t[index] + times[node, route[index + 1]] + parameters["service_time"][node] <= t[index + 1]
+                )
+
+    # energy constraints, departure and arrival energy at the stations and depots
+    if check != "time":
+        for index, node in enumerate(route[:-1]):
+            departure = y[index] if node in clients else Y[index]
+            model.addConstr(y[index + 1] <= departure - parameters["h"] * arcs[node, route[index + 1]])
+        for index, node in enumerate(route):
+            if node in stations + parameters["depot_start"] + parameters["depot_end"]:
+                model.addConstr(y[index] <= Y[index])
+    return model, t, y, Y
+
+
+def baseline_feasible(model):
+    """
+    This is the function to solve a model of baseline_model
+    :param model: gurobipy model
+    :return: true if the model is feasible and false otherwise
+    """
+    model.optimize()
+    return model.status == GRB.OPTIMAL
+
+
+@unittest.skipIf(gp is None, "gurobipy is not installed")
+class TestLabelAgainstLP(unittest.TestCase):
+    def check_instance(self, name, seed, count=100):
+        parameters = get_parameters(str(INSTANCES / name), cache=False)
+        label = MIPCheck(parameters, backend="label")
+        rng = random.Random(seed)
+        routes = random_routes(parameters, rng, count) + random_routes(parameters, rng, count, min_stations=1)
+        answers = set()
+        for route in routes:
+            for check in CHECKS:
+                expected = baseline_feasible(baseline_model(parameters, route, check)[0])
+                with self.subTest(check=check, route=route):
+                    self.assertEqual(getattr(label, check)(route), expected)
+                answers.add((check, expected))
+        return answers
+
+    def check_schedule(self, name, seed, count=100):
+        parameters = get_parameters(str(INSTANCES / name), cache=False)
+        label = MIPCheck(parameters, backend="label")
+        for route in random_routes(parameters, random.Random(seed), count, min_stations=1):
+            schedule = label.schedule(route)
+            model, t, y, Y = baseline_model(parameters, route, "time_energy")
+            with self.subTest(route=route):
+                self.assertEqual(schedule is None, not baseline_feasible(model))
+                if schedule is not None:
+                    # the schedule of the labels satisfies the constraints of the original model
+                    for variables, values in zip((t, y, Y), schedule):
+                        for variable, value in zip(variables, values):
+                            variable.lb = variable.ub = value
+                    self.assertTrue(baseline_feasible(model))
+
+    def test_c5(self):
+        answers = set()
+        for seed, name in enumerate(("c101C5.txt", "c103C5.txt", "r104C5.txt", "rc105C5.txt", "rc204C5.txt")):
+            answers |= self.check_instance(name, seed)
+        # the routes exercise both answers of every check
+        self.assertEqual(len(answers), 6)
+
+    def test_c101C10(self):
+        self.assertEqual(len(self.check_instance("c101C10.txt", seed=1)), 6)
+
+    def test_c103C15(self):
+        self.assertEqual(len(self.check_instance("c103C15.txt", seed=2)), 6)
+
+    def test_schedule(self):
+        for seed, name in enumerate(("c101C5.txt", "r104C5.txt", "c103C15.txt", "r102C15.txt")):
+            self.check_schedule(name, seed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import random
+import unittest
+from pathlib import Path
+from EVRPTW_PR_ALNS.file_reader import get_parameters
+from EVRPTW_PR_ALNS.context import InstanceContext
+from EVRPTW_PR_ALNS.Initial import Heuristic
+from EVRPTW_PR_ALNS.solution import Solution
+from EVRPTW_PR_ALNS._algorithms.CR import CustomerRemoval
+from EVRPTW_PR_ALNS._algorithms.CI import CustomerInsertion
+from EVRPTW_PR_ALNS._algorithms.SR import StationRemoval
+
+INSTANCES = Path(__file__).resolve().parents[1] / "EVRPTW_PR_ALNS" / "_instances"
+
+
+class TestPositionIndex(unittest.TestCase):
+    def setUp(self):
+        self.context = InstanceContext(get_parameters(str(INSTANCES / "c103C15.txt"), cache=False))
+        random.seed(4)
+        self.routes = Heuristic(self.context).initial_solution()
+
+    def assertIndexed(self, solution):
+        # the index and the totals kept along the edits against the ones of a solution built from scratch
+        rebuilt = Solution(solution.routes, self.context.helper)
+        self.assertEqual(solution.positions(), rebuilt.positions())
+        self.assertEqual(solution.distance, rebuilt.distance)
+        self.assertEqual([record.route for record in solution.records], [tuple(route) for route in solution])
+
+    def edit(self, solution, rng):
+        """
+        Void function, apply one random edit to a solution
+        """
+        clients = self.context.clients
+        i = rng.randrange(len(solution))
+        route = solution[i]
+        choice = rng.randrange(6)
+        if choice == 0 and len(route) > 2:
+            positions = set(rng.sample(range(1, len(route) - 1), rng.randint(1, len(route) - 2)))
+            solution.remove_nodes(i, positions)
+        elif choice == 1:
+            missing = [client for client in clients if client not in solution.positions()]
+            node = rng.choice(missing) if missing else rng.choice(self.context.original_stations)
+            solution.insert_node(i, rng.randint(1, len(route) - 1), node)
+        elif choice == 2 and len(solution) > 1:
+            del solution[i]
+        elif choice == 3:
+            solution.insert(rng.randint(-len(solution), len(solution)), ["D0", "D0_end"])
+        elif choice == 4:
+            solution[i] = route[:1] + route[1:-1][::-1] + route[-1:]
+        else:
+            solution.append(["D0", "D0_end"])
+
+    def test_random_edits(self):
+        rng = random.Random(5)
+        for _ in range(20):
+            solution = Solution(self.routes, self.context.helper)
+            solution.positions()
+            for _ in range(30):
+                edited = solution.copy()
+                before = list(solution.routes), dict(solution.positions())
+                self.edit(edited, rng)
+                # an edit of the copy leaves the original as it was
+                self.assertEqual((solution.routes, solution.positions()), before)
+                self.assertIndexed(edited)
+                solution = edited
+
+    def test_operators(self):
+        cr, ci, sr = CustomerRemoval(self.context), CustomerInsertion(self.context), StationRemoval(self.context)
+        random.seed(6)
+        solution = Solution(self.routes, self.context.helper)
+        for removal in (cr.random_removal, cr.shaw_removal_prev, cr.zone_removal_next, cr.random_route_removal_RRR):
+            destroy = removal(solution)
+            self.assertIsInstance(destroy, Solution)
+            self.assertIndexed(destroy)
+            repair = ci.greedy_customer_insertion(destroy, cr.removal)
+            self.assertIs(repair, destroy)
+            self.assertIndexed(repair)
+            solution = repair
+        destroy = sr.random_removal(solution)
+        self.assertIndexed(destroy)
+        self.assertIndexed(destroy.apply(lambda route: route[:]))
+
+
+if __name__ == "__main__":
+    unittest.main()